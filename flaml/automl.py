@@ -4,6 +4,8 @@
 #  * project root for license information.
 import time
 import os
+import copy
+import multiprocessing
 from typing import Callable, Optional
 from functools import partial
 import numpy as np
@@ -25,6 +27,7 @@ from .nlp.utils import _is_nlp_task
 
 from .ml import (
     compute_estimator,
+    get_batch_val_loss,
     train_estimator,
     get_estimator_class,
     get_classification_objective,
@@ -38,6 +41,8 @@ from .config import (
     SPLIT_RATIO,
     N_SPLITS,
     SAMPLE_MULTIPLY_FACTOR,
+    MIN_TRAIN_METRIC_SAMPLE,
+    TRAIN_METRIC_SAMPLE_PER_SECOND,
 )
 
 from .data import concat, CLASSIFICATION, TS_FORECAST, FORECAST, REGRESSION
@@ -55,6 +60,141 @@ except ImportError:
     mlflow = None
 
 
+class CostModel:
+    """An online cost model of the trial time of the learners.
+
+    A ridge regression of the log trial time on the logs of the learner's
+    cost_relative2lgbm, the sample size and the model size of the config,
+    shared by all the learners and updated after every trial. The number of
+    features and threads are constant in a run, so the intercept covers
+    them. The prior assumes the time to be proportional to
+    cost_relative2lgbm and the sample size, so the predictions before any
+    observation agree with the constants the learners declare. A running
+    residual per learner corrects what the shared features miss.
+    """
+
+    # intercept, cost_relative2lgbm, sample size, model size
+    PRIOR = np.array([0.0, 1.0, 1.0, 0.0])
+
+    def __init__(self, ridge=1.0):
+        self._A = ridge * np.eye(len(self.PRIOR))
+        self._b = ridge * self.PRIOR
+        self._w = self.PRIOR
+        self._residual = {}
+
+    def _features(self, learner_class, config, sample_size):
+        try:
+            size = learner_class.size(config)
+        except (KeyError, TypeError, AttributeError):
+            size = 1.0
+        return np.log(
+            [
+                np.e,
+                learner_class.cost_relative2lgbm(),
+                max(sample_size, 1),
+                max(size, 1.0),
+            ]
+        )
+
+    def update(self, learner_class, config, sample_size, trial_time):
+        """Add the observed time of a trial."""
+        if not trial_time or trial_time <= 0:
+            return
+        x = self._features(learner_class, config, sample_size)
+        y = np.log(trial_time)
+        name = learner_class.__name__
+        self._residual[name] = 0.5 * self._residual.get(name, 0) + 0.5 * (
+            y - x @ self._w - self._residual.get(name, 0)
+        )
+        self._A += np.outer(x, x)
+        self._b += y * x
+        self._w = np.linalg.solve(self._A, self._b)
+
+    def predict(self, learner_class, config, sample_size) -> float:
+        """Predict the trial time in seconds."""
+        x = self._features(learner_class, config, sample_size)
+        return float(
+            np.exp(x @ self._w + self._residual.get(learner_class.__name__, 0))
+        )
+
+
+class ThreadTuner:
+    """Chooses the number of threads of each trial from measured scaling.
+
+    Trials are bucketed per learner by the log4 of the amount of work, i.e.,
+    the sample size times the number of features, and of the model size of
+    the config. In a bucket, the trial times are recorded per thread count
+    and compared after normalization by the current prediction of the cost
+    model, which corrects for the differences of the configs in a bucket
+    without the bias of the earlier, less accurate predictions. The first
+    trial of a bucket
+    uses a prior thread count growing with the work, so that small trials do
+    not pay for the synchronization of many threads. Afterwards, the
+    neighboring thread counts of the best one measured so far are tried once
+    each before the best one is used, i.e., a hill climb on the measured
+    scaling curve.
+    """
+
+    # the amount of work (rows * features) worth one more thread in the prior
+    WORK_PER_THREAD = 2 ** 17
+
+    def __init__(self, max_threads, n_features, cost_model):
+        self.max_threads = max_threads
+        self.n_features = n_features
+        self.cost_model = cost_model
+        self.candidates = sorted(
+            {min(2 ** i, max_threads) for i in range(max_threads.bit_length())}
+        )
+        # bucket -> {n_threads: [(trial_time, learner_class, config, sample_size)]}
+        self._trials = {}
+
+    def _bucket(self, learner_class, config, sample_size):
+        try:
+            size = learner_class.size(config)
+        except (KeyError, TypeError, AttributeError):
+            size = 1.0
+        work = max(sample_size * self.n_features, 1)
+        return (
+            learner_class.__name__,
+            int(np.log(work) / np.log(4)),
+            int(np.log(max(size, 1.0)) / np.log(4)),
+        )
+
+    def choose(self, learner_class, config, sample_size) -> int:
+        """The number of threads for a trial."""
+        trials = self._trials.get(self._bucket(learner_class, config, sample_size))
+        if not trials:
+            work = sample_size * self.n_features / self.WORK_PER_THREAD
+            prior = 2 ** int(np.log2(max(work, 1)))
+            return max(n for n in self.candidates if n <= max(prior, 1))
+        times = {
+            n_threads: np.median(
+                [
+                    trial_time / self.cost_model.predict(*trial)
+                    for trial_time, *trial in trials[n_threads]
+                ]
+            )
+            for n_threads in trials
+        }
+        best = min(times, key=times.get)
+        i = self.candidates.index(best)
+        for j in (i + 1, i - 1):  # unexplored neighbors on the scaling curve
+            if 0 <= j < len(self.candidates) and self.candidates[j] not in times:
+                return self.candidates[j]
+        return best
+
+    def update(self, learner_class, config, sample_size, n_threads, trial_time):
+        """Add the observed time of a trial with n_threads threads."""
+        if not trial_time or n_threads not in self.candidates:
+            return
+        trials = self._trials.setdefault(
+            self._bucket(learner_class, config, sample_size), {}
+        )
+        trials.setdefault(n_threads, []).append(
+            (trial_time, learner_class, config, sample_size)
+        )
+
+
 class SearchState:
     @property
     def search_space(self):
@@ -67,8 +207,11 @@ class SearchState:
             self.total_time_used - self.time_best_found,
         )
 
-    def __init__(self, learner_class, data_size, task, starting_point=None):
+    def __init__(
+        self, learner_class, data_size, task, starting_point=None, cost_model=None
+    ):
         self.init_eci = learner_class.cost_relative2lgbm()
+        self.cost_model = cost_model
         self._search_space_domain = {}
         self.init_config = {}
         self.low_cost_partial_config = {}
@@ -106,6 +249,7 @@ class SearchState:
         self.time_best_found = self.time_best_found_old = 0
         self.time2eval_best = 0
         self.time2eval_best_old = 0
+        self.best_config_sample_size = None
         self.trained_estimator = None
         self.sample_size = None
         self.trial_time = 0
@@ -170,7 +314,22 @@ class SearchState:
         assert (
             self.best_config_sample_size is not None
         ), "need to first get best_config_sample_size"
-        return self.time2eval_best * retrain_sample_size / self.best_config_sample_size
+        if self.cost_model is None:
+            return (
+                self.time2eval_best
+                * retrain_sample_size
+                / self.best_config_sample_size
+            )
+        # scale the observed time by the modeled growth with the sample size
+        return (
+            self.time2eval_best
+            * self.cost_model.predict(
+                self.learner_class, self.best_config, retrain_sample_size
+            )
+            / self.cost_model.predict(
+                self.learner_class, self.best_config, self.best_config_sample_size
+            )
+        )
 
 
 class AutoMLState:
@@ -214,6 +373,14 @@ class AutoMLState:
             weight = None
         if groups is not None:
             self.fit_kwargs["groups"] = groups
+        train_metric_index = self.train_metric_index
+        if train_metric_index is not None:
+            # positions of the training metric sample within the sampled data
+            train_metric_index = (
+                train_metric_index[train_metric_index < sample_size]
+                if sample_size <= self.data_size
+                else None
+            )
         config = config_w_resource.copy()
         if "FLAML_sample_size" in config:
             del config["FLAML_sample_size"]
@@ -231,6 +398,13 @@ class AutoMLState:
         if _is_nlp_task(self.task):
             self.fit_kwargs["X_val"] = self.X_val
             self.fit_kwargs["y_val"] = self.y_val
+        n_jobs = (
+            self.thread_tuner.choose(
+                self.learner_classes.get(estimator), config, sample_size
+            )
+            if self.thread_tuner
+            else self.n_jobs
+        )
 
         (
             trained_estimator,
@@ -255,10 +429,27 @@ class AutoMLState:
             self.eval_method,
             self.metric,
             self.best_loss,
-            self.n_jobs,
+            n_jobs,
             self.learner_classes.get(estimator),
             self.log_training_metric,
             self.fit_kwargs,
+            train_metric_index,
+            self.auc_sample_size,
+        )
+        batch_val_loss = (
+            get_batch_val_loss(
+                trained_estimator,
+                self.X_val,
+                self.y_val,
+                self.weight_val,
+                self.groups_val,
+                self.metric,
+                self.task,
+                config_w_resource,
+                auc_sample_size=self.auc_sample_size,
+            )
+            if self.eval_method == "holdout"
+            else []
         )
         if self.retrain_final and not self.model_history:
             trained_estimator.cleanup()
@@ -273,7 +464,10 @@ class AutoMLState:
             "metric_for_logging": metric_for_logging,
             "val_loss": val_loss,
             "trained_estimator": trained_estimator,
+            "n_jobs": n_jobs,
         }
+        if batch_val_loss:
+            result["batch_val_loss"] = batch_val_loss
         if sampled_weight is not None:
             self.fit_kwargs["sample_weight"] = weight
         return result
@@ -374,6 +568,58 @@ def size(state: AutoMLState, config: dict) -> float:
     return learner_class.size(config)
 
 
+def _train_config(state: AutoMLState, mem_thres: float, config: dict) -> dict:
+    """Evaluate a config of the search space of all the learners."""
+    sample_size = config.get("FLAML_sample_size")
+    config = config.get("ml", config).copy()
+    if sample_size:
+        config["FLAML_sample_size"] = sample_size
+    estimator = config["learner"]
+    # check memory constraints before training
+    if state.learner_classes[estimator].size(config) <= mem_thres:
+        del config["learner"]
+        return state._compute_with_config_base(estimator, config)
+    return {
+        "pred_time": 0,
+        "wall_clock_time": None,
+        "metric_for_logging": np.inf,
+        "val_loss": np.inf,
+        "trained_estimator": None,
+    }
+
+
+# the training function and state of a local trial worker process
+_worker_train = _worker_state = None
+
+
+def _init_trial_worker(state: AutoMLState, mem_thres: float, num_threads: int):
+    global _worker_train, _worker_state
+    _worker_train = partial(_train_config, state, mem_thres)
+    _worker_state = state
+    try:
+        import torch
+
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+
+def _run_trial_in_worker(
+    config: dict, time_from_start: float, num_threads: Optional[int] = None
+) -> dict:
+    _worker_state.time_from_start = time_from_start
+    if num_threads:
+        # the threads are chosen by the thread tuner of the main process
+        _worker_state.n_jobs = num_threads
+        try:
+            import torch
+
+            torch.set_num_threads(num_threads)
+        except ImportError:
+            pass
+    return _worker_train(config)
+
+
 class AutoML:
     """The AutoML class.
 
@@ -424,7 +670,11 @@ class AutoML:
             task: A string of the task type, e.g.,
                 'classification', 'regression', 'ts_forecast', 'rank',
                 'seq-classification', 'seq-regression'.
-            n_jobs: An integer of the number of threads for training.
+            n_jobs: An integer of the number of threads for training. Use all
+                available resources when n_jobs == -1. When n_jobs == "auto",
+                the number of threads of each trial is tuned from the data
+                size, the config and the measured scaling, up to all the
+                available cores.
             gpu_per_trial: A float of the number of gpus per trial, only used by TransformersEstimator.
             log_file_name: A string of the log file name. To disable logging,
                 set it to be an empty string "".
@@ -456,6 +706,15 @@ class AutoML:
                 model per estimator. Make sure memory is large enough if setting to True.
             log_training_metric: A boolean of whether to log the training
                 metric for each model.
+            train_metric_sample_size: None, int or 'auto', default=None | The
+                size of the fixed, stratified for classification, subsample of
+                the training data on which the training metric, including the
+                customized metric's training part, is computed. None uses all
+                the training data; 'auto' caps it by the size of the validation
+                data and the time budget.
+            auc_sample_size: None or an integer, default=None | If set,
+                roc_auc_ovr and roc_auc_ovo on more instances are estimated on
+                a stratified sample of this many instances.
             mem_thres: A float of the memory size constraint in bytes.
             pred_time_limit: A float of the prediction latency constraint in seconds.
             train_time_limit: A float of the training time constraint in seconds.
@@ -473,6 +732,11 @@ class AutoML:
                     "auto" -> uniform.
                 For ts_forecast tasks, must be "auto" or 'time'.
                 For ranking task, must be "auto" or 'group'.
+                For classification and regression tasks, it can also be a
+                splitter object with split() and get_n_splits(), e.g.,
+                flaml.forecast.RollingOriginSplit, which is used for cv and
+                whose last split is used for holdout. The data are not
+                shuffled.
             hpo_method: str, default="auto" | The hyperparameter
                 optimization method. By default, CFO is used for sequential
                 search and BlendSearch is used for parallel search.
@@ -506,7 +770,10 @@ class AutoML:
             seed: int or None, default=None | The random seed for np.random.
             n_concurrent_trials: [Experimental] int, default=1 | The number of
                 concurrent trials. For n_concurrent_trials > 1, installation of
-                ray is required: `pip install flaml[ray]`.
+                ray is required: `pip install flaml[ray]`, except for NLP tasks,
+                whose trials can run in local worker processes which partition
+                the cpu cores among them. The workers are spawned, so a custom
+                metric or learner must be importable, e.g., not a lambda.
             keep_search_state: boolean, default=False | Whether to keep search
                 state after fit(). By default the state is deleted for space
                 saving.
@@ -547,6 +814,8 @@ class AutoML:
             "model_history", False
         )
         settings["log_training_metric"] = settings.get("log_training_metric", False)
+        settings["train_metric_sample_size"] = settings.get("train_metric_sample_size")
+        settings["auc_sample_size"] = settings.get("auc_sample_size")
         settings["mem_thres"] = settings.get("mem_thres", MEM_THRES)
         settings["pred_time_limit"] = settings.get("pred_time_limit", np.inf)
         settings["train_time_limit"] = settings.get("train_time_limit", np.inf)
@@ -890,7 +1159,7 @@ class AutoML:
             self._state.groups_val = groups_val
             self._state.groups = groups
 
-    def _prepare_data(self, eval_method, split_ratio, n_splits):
+    def _prepare_data(self, eval_method, split_ratio, n_splits, time_budget=None):
 
         X_val, y_val = self._state.X_val, self._state.y_val
         if issparse(X_val):
@@ -903,6 +1172,7 @@ class AutoML:
             and self._auto_augment
             and self._state.fit_kwargs.get("sample_weight") is None
             and self._split_type not in ["time", "group"]
+            and isinstance(self._split_type, str)
         ):
             # logger.info(f"label {pd.unique(y_train_all)}")
             label_set, counts = np.unique(y_train_all, return_counts=True)
@@ -956,7 +1226,24 @@ class AutoML:
         self._state.groups_all = self._state.groups
         if X_val is None and eval_method == "holdout":
             # if eval_method = holdout, make holdout data
-            if self._split_type == "time":
+            if not isinstance(self._split_type, str):
+                # the last split of the splitter, e.g., the latest rolling origin
+                train_idx, val_idx = list(
+                    self._split_type.split(
+                        X_train_all, y_train_all, self._state.groups_all
+                    )
+                )[-1]
+                if self._df:
+                    X_train = X_train_all.iloc[train_idx]
+                    X_val = X_train_all.iloc[val_idx]
+                else:
+                    X_train, X_val = X_train_all[train_idx], X_train_all[val_idx]
+                y_train, y_val = y_train_all[train_idx], y_train_all[val_idx]
+                if "sample_weight" in self._state.fit_kwargs:
+                    weight = self._state.fit_kwargs["sample_weight"]
+                    self._state.fit_kwargs["sample_weight"] = weight[train_idx]
+                    self._state.weight_val = weight[val_idx]
+            elif self._split_type == "time":
                 if self._state.task == TS_FORECAST:
                     num_samples = X_train_all.shape[0]
                     period = self._state.fit_kwargs["period"]
@@ -1090,7 +1377,9 @@ class AutoML:
         self._state.X_val, self._state.y_val = X_val, y_val
         self._state.X_train_all = X_train_all
         self._state.y_train_all = y_train_all
-        if self._split_type == "group":
+        if not isinstance(self._split_type, str):
+            self._state.kf = self._split_type
+        elif self._split_type == "group":
             # logger.info("Using GroupKFold")
             assert (
                 len(self._state.groups_all) == y_train_all.size
@@ -1132,6 +1421,55 @@ class AutoML:
             self._state.kf = RepeatedKFold(
                 n_splits=n_splits, n_repeats=1, random_state=RANDOM_SEED
             )
+        self._state.train_metric_index = self._sample_train_metric_index(
+            eval_method, n_splits, time_budget
+        )
+
+    def _sample_train_metric_index(self, eval_method, n_splits, time_budget=None):
+        """Choose the fixed subsample of the training data for computing the
+        training metric.
+
+        Returns:
+            None to use all the training data, or a sorted numpy array of the
+            positions of the subsample in X_train for holdout and in
+            X_train_all for cv.
+        """
+        size = self._state.train_metric_sample_size
+        if eval_method == "holdout":
+            y, n_val = self._state.y_train, len(self._state.y_val)
+        else:
+            y = self._state.y_train_all
+            n_val = len(y) // n_splits
+        if (
+            size is None
+            or self._state.task in ("rank", TS_FORECAST)
+            or _is_nlp_task(self._state.task)
+            or "groups" in self._state.fit_kwargs
+        ):
+            return None
+        if size == "auto":
+            # predicting on the subsample costs no more than on the validation data
+            size = n_val
+            if time_budget and time_budget > 0:
+                size = min(size, int(time_budget * TRAIN_METRIC_SAMPLE_PER_SECOND))
+            size = max(size, MIN_TRAIN_METRIC_SAMPLE)
+        n = len(y)
+        if size >= n:
+            return None
+        index = np.arange(n)
+        try:
+            index, _ = train_test_split(
+                index,
+                train_size=size,
+                random_state=RANDOM_SEED,
+                stratify=y if self._state.task in CLASSIFICATION else None,
+            )
+        except ValueError:
+            # too few instances of a class to stratify
+            index, _ = train_test_split(
+                index, train_size=size, random_state=RANDOM_SEED
+            )
+        return np.sort(index)
 
     def add_learner(self, learner_name, learner_class):
         """Add a customized learner.
@@ -1228,6 +1566,11 @@ class AutoML:
                     "auto" -> uniform.
                 For ts_forecast tasks, must be "auto" or 'time'.
                 For ranking task, must be "auto" or 'group'.
+                For classification and regression tasks, it can also be a
+                splitter object with split() and get_n_splits(), e.g.,
+                flaml.forecast.RollingOriginSplit, which is used for cv and
+                whose last split is used for holdout. The data are not
+                shuffled.
             groups: None or array-like | Group labels (with matching length to
                 y_train) or groups counts (with sum equal to length of y_train)
                 for training data.
@@ -1319,6 +1662,7 @@ class AutoML:
             eval_method = self._decide_eval_method(time_budget)
         self.modelcount = 0
         self._auto_augment = auto_augment
+        self._state.train_metric_sample_size = None
         self._prepare_data(eval_method, split_ratio, n_splits)
         self._state.time_budget = None
         self._state.n_jobs = n_jobs
@@ -1342,7 +1686,15 @@ class AutoML:
             self._state.task = get_classification_objective(
                 len(np.unique(self._y_train_all))
             )
-        if self._state.task in CLASSIFICATION:
+        if not isinstance(split_type, str):
+            assert hasattr(split_type, "split") and hasattr(
+                split_type, "get_n_splits"
+            ), "split_type must be a string or a splitter object."
+            assert (
+                self._state.task in CLASSIFICATION or self._state.task in REGRESSION
+            ), "a splitter object is only supported for classification and regression."
+            self._split_type = split_type
+        elif self._state.task in CLASSIFICATION:
             assert split_type in ["auto", "stratified", "uniform", "time", "group"]
             self._split_type = (
                 split_type
@@ -1529,29 +1881,11 @@ class AutoML:
                 search_state.training_function = partial(
                     AutoMLState._compute_with_config_base, self._state, estimator
                 )
-        states = self._search_states
+        state = self._state
         mem_res = self._mem_thres
 
         def train(config: dict):
-
-            sample_size = config.get("FLAML_sample_size")
-            config = config.get("ml", config).copy()
-            if sample_size:
-                config["FLAML_sample_size"] = sample_size
-            estimator = config["learner"]
-            # check memory constraints before training
-            if states[estimator].learner_class.size(config) <= mem_res:
-                del config["learner"]
-                result = states[estimator].training_function(config)
-                return result
-            else:
-                return {
-                    "pred_time": 0,
-                    "wall_clock_time": None,
-                    "metric_for_logging": np.inf,
-                    "val_loss": np.inf,
-                    "trained_estimator": None,
-                }
+            return _train_config(state, mem_res, config)
 
         return train
 
@@ -1611,6 +1945,8 @@ class AutoML:
         auto_augment=None,
         min_sample_size=None,
         use_ray=None,
+        train_metric_sample_size=None,
+        auc_sample_size=None,
         **fit_kwargs,
     ):
         """Find a model for a given task.
@@ -1651,7 +1987,11 @@ class AutoML:
             task: A string of the task type, e.g.,
                 'classification', 'regression', 'ts_forecast', 'rank',
                 'seq-classification', 'seq-regression'.
-            n_jobs: An integer of the number of threads for training.
+            n_jobs: An integer of the number of threads for training. Use all
+                available resources when n_jobs == -1. When n_jobs == "auto",
+                the number of threads of each trial is tuned from the data
+                size, the config and the measured scaling, up to all the
+                available cores.
             gpu_per_trial: A float of the number of gpus per trial, only used by TransformersEstimator.
             log_file_name: A string of the log file name. To disable logging,
                 set it to be an empty string "".
@@ -1683,6 +2023,15 @@ class AutoML:
                 model per estimator. Make sure memory is large enough if setting to True.
             log_training_metric: A boolean of whether to log the training
                 metric for each model.
+            train_metric_sample_size: None, int or 'auto', default=None | The
+                size of the fixed, stratified for classification, subsample of
+                the training data on which the training metric, including the
+                customized metric's training part, is computed. None uses all
+                the training data; 'auto' caps it by the size of the validation
+                data and the time budget.
+            auc_sample_size: None or an integer, default=None | If set,
+                roc_auc_ovr and roc_auc_ovo on more instances are estimated on
+                a stratified sample of this many instances.
             mem_thres: A float of the memory size constraint in bytes.
             pred_time_limit: A float of the prediction latency constraint in seconds.
             train_time_limit: A float of the training time constraint in seconds.
@@ -1710,6 +2059,11 @@ class AutoML:
                     "auto" -> uniform.
                 For ts_forecast tasks, must be "auto" or 'time'.
                 For ranking task, must be "auto" or 'group'.
+                For classification and regression tasks, it can also be a
+                splitter object with split() and get_n_splits(), e.g.,
+                flaml.forecast.RollingOriginSplit, which is used for cv and
+                whose last split is used for holdout. The data are not
+                shuffled.
             hpo_method: str, default="auto" | The hyperparameter
                 optimization method. By default, CFO is used for sequential
                 search and BlendSearch is used for parallel search.
@@ -1743,7 +2097,10 @@ class AutoML:
             seed: int or None, default=None | The random seed for np.random.
             n_concurrent_trials: [Experimental] int, default=1 | The number of
                 concurrent trials. For n_concurrent_trials > 1, installation of
-                ray is required: `pip install flaml[ray]`.
+                ray is required: `pip install flaml[ray]`, except for NLP tasks,
+                whose trials can run in local worker processes which partition
+                the cpu cores among them. The workers are spawned, so a custom
+                metric or learner must be importable, e.g., not a lambda.
             keep_search_state: boolean, default=False | Whether to keep search
                 state after fit(). By default the state is deleted for space
                 saving.
@@ -1768,6 +2125,9 @@ class AutoML:
         task = task or self._settings.get("task")
         time_budget = time_budget or self._settings.get("time_budget")
         n_jobs = n_jobs or self._settings.get("n_jobs")
+        tune_threads = n_jobs == "auto"
+        if tune_threads:
+            n_jobs = -1
         gpu_per_trial = (
             self._settings.get("gpu_per_trial")
             if gpu_per_trial is None
@@ -1831,9 +2191,15 @@ class AutoML:
         )
         min_sample_size = min_sample_size or self._settings.get("min_sample_size")
         use_ray = self._settings.get("use_ray") if use_ray is None else use_ray
+        train_metric_sample_size = train_metric_sample_size or self._settings.get(
+            "train_metric_sample_size"
+        )
+        auc_sample_size = auc_sample_size or self._settings.get("auc_sample_size")
 
         self._state.task = TS_FORECAST if task == FORECAST else task
         self._state.log_training_metric = log_training_metric
+        self._state.train_metric_sample_size = train_metric_sample_size
+        self._state.auc_sample_size = auc_sample_size
 
         self._state.fit_kwargs = fit_kwargs
         self._state.weight_val = sample_weight_val
@@ -1866,6 +2232,7 @@ class AutoML:
         self._state.n_jobs = n_jobs
         self._n_concurrent_trials = n_concurrent_trials
         self._early_stop = early_stop
+        self._ray_required = use_ray
         self._use_ray = use_ray or n_concurrent_trials > 1
         # use the following condition if we have an estimation of average_trial_time and average_trial_overhead
         # self._use_ray = use_ray or n_concurrent_trials > ( average_trail_time + average_trial_overhead) / (average_trial_time)
@@ -1887,7 +2254,7 @@ class AutoML:
         )
         self._auto_augment = auto_augment
         self._min_sample_size = min_sample_size
-        self._prepare_data(eval_method, split_ratio, n_splits)
+        self._prepare_data(eval_method, split_ratio, n_splits, time_budget)
 
         if _is_nlp_task(self._state.task):
             self._state.fit_kwargs["metric"] = metric
@@ -1921,6 +2288,8 @@ class AutoML:
             "micro_f1",
             "macro_f1",
             "ndcg",
+            "map",
+            "mrr",
         ]:
             error_metric = f"1-{metric}"
         elif isinstance(metric, str):
@@ -1957,6 +2326,7 @@ class AutoML:
                     get_estimator_class(self._state.task, estimator_name),
                 )
         # set up learner search space
+        self._cost_model = CostModel()
         for estimator_name in estimator_list:
             estimator_class = self._state.learner_classes[estimator_name]
             estimator_class.init()
@@ -1965,7 +2335,19 @@ class AutoML:
                 data_size=self._state.data_size,
                 task=self._state.task,
                 starting_point=starting_points.get(estimator_name),
+                cost_model=self._cost_model,
+            )
+        self._state.thread_tuner = (
+            ThreadTuner(
+                os.cpu_count() or 1,
+                self._state.X_train.shape[1]
+                if len(self._state.X_train.shape) > 1
+                else 1,
+                self._cost_model,
             )
+            if tune_threads
+            else None
+        )
         logger.info("List of ML learners in AutoML Run: {}".format(estimator_list))
         self.estimator_list = estimator_list
         self._state.time_budget = time_budget if time_budget > 0 else 1e10
@@ -2022,6 +2404,9 @@ class AutoML:
             del self._state.y_train, self._state.y_train_all, self._state.y_val
             del self._sample_weight_full, self._state.fit_kwargs
             del self._state.groups, self._state.groups_all, self._state.groups_val
+            # release the class-level caches of the learners, e.g., fitted models
+            for estimator_class in self._state.learner_classes.values():
+                estimator_class.init()
         # if verbose == 0:
         logger.setLevel(old_level)
 
@@ -2033,6 +2418,11 @@ class AutoML:
             import ray
             from ray.tune.suggest import ConcurrencyLimiter
         except (ImportError, AssertionError):
+            if (
+                not self._ray_required
+                and _is_nlp_task(self._state.task)
+            ):
+                return self._search_parallel_local()
             raise ImportError(
                 "n_concurrent_trial>1 or use_ray=True requires installation of ray. "
                 "Please run pip install flaml[ray]"
@@ -2069,24 +2459,7 @@ class AutoML:
                 points_to_evaluate=points_to_evaluate,
             )
         else:
-            self._state.time_from_start = time.time() - self._start_time_flag
-            time_left = self._state.time_budget - self._state.time_from_start
-            search_alg = SearchAlgo(
-                metric="val_loss",
-                space=space,
-                low_cost_partial_config=self.low_cost_partial_config,
-                points_to_evaluate=self.points_to_evaluate,
-                cat_hp_cost=self.cat_hp_cost,
-                prune_attr=self.prune_attr,
-                min_resource=self.min_resource,
-                max_resource=self.max_resource,
-                config_constraints=[
-                    (partial(size, self._state), "<=", self._mem_thres)
-                ],
-                metric_constraints=self.metric_constraints,
-                seed=self._seed,
-                time_budget_s=time_left,
-            )
+            search_alg = self._create_parallel_search_alg(SearchAlgo)
             search_alg = ConcurrencyLimiter(search_alg, self._n_concurrent_trials)
         resources_per_trial = self._state.resources_per_trial
         analysis = ray.tune.run(
@@ -2102,23 +2475,146 @@ class AutoML:
             raise_on_failed_trial=False,
         )
         # logger.info([trial.last_result for trial in analysis.trials])
-        trials = sorted(
+        self._update_parallel_results(trial.last_result for trial in analysis.trials)
+
+    def _create_parallel_search_alg(self, SearchAlgo):
+        self._state.time_from_start = time.time() - self._start_time_flag
+        time_left = self._state.time_budget - self._state.time_from_start
+        return SearchAlgo(
+            metric="val_loss",
+            mode="min",
+            space=self.search_space,
+            low_cost_partial_config=self.low_cost_partial_config,
+            points_to_evaluate=self.points_to_evaluate,
+            cat_hp_cost=self.cat_hp_cost,
+            prune_attr=self.prune_attr,
+            min_resource=self.min_resource,
+            max_resource=self.max_resource,
+            config_constraints=[(partial(size, self._state), "<=", self._mem_thres)],
+            metric_constraints=self.metric_constraints,
+            seed=self._seed,
+            time_budget_s=time_left,
+        )
+
+    def _search_parallel_local(self):
+        """Run concurrent trials in local worker processes without ray.
+
+        The cores are partitioned among the workers: each worker limits the
+        intra-op threads of torch to resources_per_trial["cpu"]. With the
+        thread tuner, each trial takes its tuned number of threads out of the
+        free cores instead, so that small trials are packed together and large
+        trials get more cores.
+        """
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+        if self._hpo_method in ("cfo", "grid"):
+            from flaml import CFO as SearchAlgo
+        elif "bs" == self._hpo_method:
+            from flaml import BlendSearch as SearchAlgo
+        else:
+            raise NotImplementedError(
+                f"hpo_method={self._hpo_method} is not supported for concurrent "
+                "trials without ray. 'auto', 'cfo' and 'bs' are supported."
+            )
+        search_alg = self._create_parallel_search_alg(SearchAlgo)
+        logger.info(
+            f"Running {self._n_concurrent_trials} concurrent trials locally "
+            f"with {self._state.resources_per_trial['cpu']} threads each"
+        )
+        results, running, num_trials = [], {}, 0
+        thread_tuner = self._state.thread_tuner
+        free_cores = thread_tuner.max_threads if thread_tuner else 0
+        # the state is pickled to every worker: the threads are chosen here,
+        # and the data beyond data_size is never sampled during the search
+        worker_state = copy.copy(self._state)
+        worker_state.thread_tuner = None
+        worker_state.X_train_all = worker_state.y_train_all = None
+        worker_state.sample_weight_all = worker_state.groups_all = None
+        # spawned rather than forked workers, as the threads of torch,
+        # tokenizers or openmp started in this process do not survive a fork
+        with ProcessPoolExecutor(
+            self._n_concurrent_trials,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_trial_worker,
+            initargs=(
+                worker_state,
+                self._mem_thres,
+                self._state.resources_per_trial["cpu"],
+            ),
+        ) as executor:
+            while True:
+                while (
+                    len(running) < self._n_concurrent_trials
+                    and num_trials < self._max_iter
+                    and (not thread_tuner or free_cores > 0)
+                ):
+                    time_used = time.time() - self._start_time_flag
+                    if time_used >= self._state.time_budget:
+                        break
+                    trial_id = str(num_trials)
+                    config = search_alg.suggest(trial_id)
+                    if config is None:
+                        break
+                    num_trials += 1
+                    num_threads = None
+                    if thread_tuner:
+                        trial_config = config.get("ml", config)
+                        num_threads = min(
+                            free_cores,
+                            thread_tuner.choose(
+                                self._state.learner_classes[trial_config["learner"]],
+                                trial_config,
+                                trial_config.get(
+                                    "FLAML_sample_size", self._state.data_size
+                                ),
+                            ),
+                        )
+                        free_cores -= num_threads
+                    future = executor.submit(
+                        _run_trial_in_worker, config, time_used, num_threads
+                    )
+                    running[future] = (trial_id, config, time.time(), num_threads)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial_id, config, start_time, num_threads = running.pop(future)
+                    free_cores += num_threads or 0
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"trial {trial_id} failed: {e}")
+                        search_alg.on_trial_complete(trial_id, None, error=True)
+                        continue
+                    # the result as reported by tune.report()
+                    result["config"] = config
+                    for key, value in config.items():
+                        result["config/" + key] = value
+                    result["time_total_s"] = time.time() - start_time
+                    search_alg.on_trial_complete(
+                        trial_id,
+                        {k: v for k, v in result.items() if k != "trained_estimator"},
+                    )
+                    results.append(result)
+        self._update_parallel_results(results)
+
+    def _update_parallel_results(self, results):
+        results = sorted(
             (
-                trial
-                for trial in analysis.trials
-                if trial.last_result
-                and trial.last_result["wall_clock_time"] is not None
+                result
+                for result in results
+                if result and result["wall_clock_time"] is not None
             ),
-            key=lambda x: x.last_result["wall_clock_time"],
+            key=lambda x: x["wall_clock_time"],
         )
-        for _track_iter, trial in enumerate(trials):
-            result = trial.last_result
+        for _track_iter, result in enumerate(results):
             better = False
             if result:
                 config = result["config"]
                 estimator = config.get("ml", config)["learner"]
                 search_state = self._search_states[estimator]
                 search_state.update(result, 0)
+                self._update_cost_model(search_state, result.get("n_jobs"))
                 if result["wall_clock_time"] is not None:
                     self._state.time_from_start = result["wall_clock_time"]
                 if search_state.sample_size == self._state.data_size:
@@ -2150,6 +2646,27 @@ class AutoML:
                         search_state.sample_size,
                     )
 
+    def _add_batch_results(self, search_state, result):
+        """Report the validation losses evaluated together with a trial to the
+        searcher of the estimator."""
+        batch_val_loss = result.get("batch_val_loss")
+        searcher = getattr(search_state.search_alg, "searcher", None)
+        if not batch_val_loss or not hasattr(searcher, "add_evaluated_result"):
+            return
+        best_config = min(batch_val_loss, key=lambda x: x[1])[0]
+        for config, val_loss in batch_val_loss:
+            if config is best_config and val_loss < result["val_loss"]:
+                # run it as a trial to obtain the model; cheap with shared index
+                searcher.add_evaluated_result(config, rerun=True)
+            else:
+                searcher.add_evaluated_result(
+                    config,
+                    {
+                        "val_loss": val_loss,
+                        "time_total_s": result.get("time_total_s", 1),
+                    },
+                )
+
     def _search_sequential(self):
         try:
             from ray import __version__ as ray_version
@@ -2302,14 +2819,13 @@ class AutoML:
             if analysis.trials:
                 result = analysis.trials[-1].last_result
                 search_state.update(result, time_used=time_used)
+                self._update_cost_model(search_state, result.get("n_jobs"))
+                self._add_batch_results(search_state, result)
                 if self._estimator_index is None:
                     # update init eci estimate
-                    eci_base = search_state.init_eci
                     self._eci.append(search_state.estimated_cost4improvement)
                     for e in self.estimator_list[1:]:
-                        self._eci.append(
-                            self._search_states[e].init_eci / eci_base * self._eci[0]
-                        )
+                        self._eci.append(self._init_eci(e))
                     self._estimator_index = 0
                     min_budget = max(10 * self._eci[0], sum(self._eci))
                     max_budget = 10000 * self._eci[0]
@@ -2630,6 +3146,48 @@ class AutoML:
             self._trained_estimator.cleanup()
             del self._trained_estimator
 
+    def _update_cost_model(self, search_state, n_jobs=None):
+        metric_for_logging = search_state.metric_for_logging
+        if isinstance(metric_for_logging, dict) and (
+            "cv_folds_done" in metric_for_logging
+        ):
+            # the time of a cv stopped early is not the cost of the config
+            return
+        if search_state.config and search_state.sample_size:
+            config = search_state.config.get("ml", search_state.config)
+            if self._state.thread_tuner and n_jobs:
+                self._state.thread_tuner.update(
+                    search_state.learner_class,
+                    config,
+                    search_state.sample_size,
+                    n_jobs,
+                    search_state.trial_time,
+                )
+            self._cost_model.update(
+                search_state.learner_class,
+                config,
+                search_state.sample_size,
+                search_state.trial_time,
+            )
+
+    def _init_eci(self, estimator):
+        """The estimated cost of the first trial of an untried learner, i.e.,
+        the cost of the first learner's first trial scaled by the cost model."""
+        first = self._search_states[self.estimator_list[0]]
+        state = self._search_states[estimator]
+        sample_size = first.sample_size or self._state.data_size
+        costs = []
+        for search_state in (state, first):
+            init_config = search_state.init_config
+            if isinstance(init_config, list):  # a list of starting points
+                init_config = init_config[0] if init_config else {}
+            costs.append(
+                self._cost_model.predict(
+                    search_state.learner_class, init_config, sample_size
+                )
+            )
+        return self._eci[0] * costs[0] / costs[1]
+
     def _select_estimator(self, estimator_list):
         if self._learner_selector == "roundrobin":
             self._estimator_index += 1
@@ -2652,13 +3210,17 @@ class AutoML:
                     inv.append(0)
                     continue
                 estimated_cost = search_state.estimated_cost4improvement
-                if search_state.sample_size < self._state.data_size:
+                if (
+                    search_state.sample_size < self._state.data_size
+                    and search_state.best_config
+                ):
                     estimated_cost = min(
                         estimated_cost,
-                        search_state.time2eval_best
-                        * min(
-                            SAMPLE_MULTIPLY_FACTOR,
-                            self._state.data_size / search_state.sample_size,
+                        search_state.est_retrain_time(
+                            min(
+                                search_state.sample_size * SAMPLE_MULTIPLY_FACTOR,
+                                self._state.data_size,
+                            )
                         ),
                     )
                 gap = search_state.best_loss - self._state.best_loss
@@ -2675,7 +3237,7 @@ class AutoML:
                 estimated_cost = estimated_cost or 1e-9
                 inv.append(1 / estimated_cost)
             else:
-                estimated_cost = self._eci[i]
+                estimated_cost = self._init_eci(estimator)
                 inv.append(0)
                 untried_exists = True
             if estimated_cost < min_estimated_cost:
@@ -11,3 +11,6 @@ SMALL_LARGE_THRES = 10000000
 MIN_SAMPLE_TRAIN = 10000
 CV_HOLDOUT_THRESHOLD = 100000
 SAMPLE_MULTIPLY_FACTOR = 4
+MIN_TRAIN_METRIC_SAMPLE = 1000
+TRAIN_METRIC_SAMPLE_PER_SECOND = 1000
+CV_RACING_CONFIDENCE = 0.95
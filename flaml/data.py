@@ -303,6 +303,7 @@ class DataTransformer:
                 X.insert(0, TS_TIMESTAMP_COL, ds_col)
             if cat_columns:
                 X[cat_columns] = X[cat_columns].astype("category")
+                _stringify_float_categories(X, cat_columns)
             if num_columns:
                 X_num = X[num_columns]
                 if np.issubdtype(X_num.columns.dtype, np.integer) and (
@@ -407,6 +408,7 @@ class DataTransformer:
                         )
             if cat_columns:
                 X[cat_columns] = X[cat_columns].astype("category")
+                _stringify_float_categories(X, cat_columns)
             if num_columns:
                 X_num = X[num_columns].fillna(np.nan)
                 if self._drop:
@@ -415,6 +417,16 @@ class DataTransformer:
         return X
 
 
+def _stringify_float_categories(X, cat_columns):
+    """Rename float categories to strings in place, as required by catboost."""
+    for column in cat_columns:
+        categories = X[column].cat.categories
+        if any(isinstance(c, float) for c in categories):
+            X[column] = X[column].cat.rename_categories(
+                [str(c) if isinstance(c, float) else c for c in categories]
+            )
+
+
 def group_counts(groups):
     _, i, c = np.unique(groups, return_counts=True, return_index=True)
     return c[np.argsort(i)]
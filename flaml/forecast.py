@@ -0,0 +1,311 @@
+"""Global forecasting of many series with one tabular model.
+
+A long-format frame of (series id, timestamp, value) rows is turned into lag,
+rolling-window and calendar features, on which a single regression model,
+e.g., LightGBM or XGBoost, is searched by AutoML for all the series. The lags
+are at least the forecast horizon, so the features of every step up to the
+horizon are known at the forecast origin, and one model forecasts all the
+steps.
+"""
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from sklearn.model_selection import TimeSeriesSplit
+
+from .automl import AutoML
+from .data import TS_TIMESTAMP_COL, TS_VALUE_COL
+
+TS_ID_COL = "unique_id"
+
+
+class RollingOriginSplit(TimeSeriesSplit):
+    """TimeSeriesSplit over the distinct timestamps of a long-format frame.
+
+    Every fold trains on the rows up to a cutoff timestamp and validates on
+    the rows of the next test_size timestamps of all the series, so the
+    rows of a timestamp are never split across training and validation.
+    """
+
+    def __init__(
+        self, timestamps, n_splits=5, test_size=None, max_train_size=None, gap=0
+    ):
+        """Constructor.
+
+        Args:
+            timestamps: A 1d array-like of the timestamp of every row of the
+                data to split.
+            n_splits: An integer of the number of folds.
+            test_size: An integer of the number of timestamps to validate on
+                in every fold, e.g., the forecast horizon.
+            max_train_size: None or an integer of the maximal number of
+                timestamps to train on in every fold.
+            gap: An integer of the number of timestamps to skip between the
+                training and validation timestamps.
+        """
+        super().__init__(
+            n_splits=n_splits,
+            max_train_size=max_train_size,
+            test_size=test_size,
+            gap=gap,
+        )
+        self.timestamps = np.asarray(timestamps)
+
+    def split(self, X=None, y=None, groups=None):
+        if X is not None:
+            assert len(X) == len(
+                self.timestamps
+            ), "the number of rows must match the number of timestamps."
+        unique, inverse = np.unique(self.timestamps, return_inverse=True)
+        for train_t, test_t in super().split(unique):
+            yield (
+                np.flatnonzero((inverse >= train_t[0]) & (inverse <= train_t[-1])),
+                np.flatnonzero((inverse >= test_t[0]) & (inverse <= test_t[-1])),
+            )
+
+
+class LagFeatureBuilder:
+    """Build the features of a global forecasting model.
+
+    The series must be regular, i.e., without missing timestamps in between,
+    but may start and end at different times. All the features are computed
+    at once over the frame sorted by series and timestamp, where the position
+    of a row within its series tells whether a lag or window is available.
+    """
+
+    def __init__(
+        self,
+        horizon,
+        lags=None,
+        windows=(7, 28),
+        id_col=TS_ID_COL,
+        time_col=TS_TIMESTAMP_COL,
+        value_col=TS_VALUE_COL,
+        freq=None,
+        normalize=True,
+    ):
+        """Constructor.
+
+        Args:
+            horizon: An integer of the number of steps to forecast.
+            lags: None or a list of integers of the lags, each at least
+                horizon. None means horizon, horizon + 1, ..., horizon + 6.
+            windows: A list of integers of the sizes of the rolling windows
+                ending at lag horizon, whose mean and standard deviation are
+                features.
+            id_col: A string of the column name of the series id.
+            time_col: A string of the column name of the timestamp.
+            value_col: A string of the column name of the value.
+            freq: None or a string of the pandas frequency of the timestamps.
+                None means to infer it from the data.
+            normalize: A boolean of whether to divide the values of every
+                series by its mean absolute value, so that series of
+                different scales share one model.
+        """
+        self.horizon = horizon
+        self.lags = sorted(lags) if lags else list(range(horizon, horizon + 7))
+        if self.lags[0] < horizon:
+            raise ValueError(
+                f"lags must be at least horizon={horizon} to be known when "
+                "forecasting."
+            )
+        self.windows = list(windows)
+        self.id_col, self.time_col, self.value_col = id_col, time_col, value_col
+        self.freq = freq
+        self.normalize = normalize
+
+    def _features(self, df: DataFrame) -> DataFrame:
+        ids = df[self.id_col].to_numpy()
+        n = len(df)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        pos = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+        value = df[self.value_col].to_numpy(dtype=float)
+        if self.normalize:
+            value = value / self.scale_.reindex(ids).to_numpy()
+        features = {
+            self.id_col: pd.Categorical(ids, categories=self.scale_.index),
+            self.time_col: df[self.time_col].to_numpy(),
+        }
+        for lag in self.lags:
+            shifted = np.full(n, np.nan)
+            shifted[lag:] = value[:-lag]
+            shifted[pos < lag] = np.nan
+            features[f"lag_{lag}"] = shifted
+        # the windows end at lag horizon; the rows to forecast are never in a
+        # window, so their missing values count as 0 in the prefix sums
+        known = np.nan_to_num(value)
+        prefix = np.r_[0, np.cumsum(known)]
+        prefix2 = np.r_[0, np.cumsum(known ** 2)]
+        end = np.arange(n) - self.horizon + 1
+        for window in self.windows:
+            start = np.maximum(end - window, 0)
+            valid = pos >= self.horizon + window - 1
+            safe_end = np.maximum(end, 0)
+            mean = (prefix[safe_end] - prefix[start]) / window
+            square = (prefix2[safe_end] - prefix2[start]) / window
+            features[f"rolling_mean_{window}"] = np.where(valid, mean, np.nan)
+            features[f"rolling_std_{window}"] = np.where(
+                valid, np.sqrt(np.maximum(square - mean ** 2, 0)), np.nan
+            )
+        return DataFrame(features, index=df.index)
+
+    def _sorted(self, df: DataFrame) -> DataFrame:
+        df = df[[self.id_col, self.time_col, self.value_col]]
+        df = df.assign(**{self.time_col: pd.to_datetime(df[self.time_col])})
+        return df.sort_values([self.id_col, self.time_col], kind="mergesort")
+
+    def fit_transform(self, df: DataFrame, scale_until=None):
+        """Learn the scales and frequency of the series and build the features.
+
+        Args:
+            df: A dataframe of the history in long format, with the id,
+                timestamp and value columns.
+            scale_until: None or a timestamp before which the rows are used
+                to learn the scales, e.g., the earliest validation timestamp,
+                so that the scales do not leak the validation values. The
+                first lags of every series, which are never forecast, are
+                used too. None means all the rows.
+
+        Returns:
+            X: A dataframe of the features, sorted by timestamp and series.
+                The timestamp column is kept for the calendar features, which
+                AutoML derives from datetime columns.
+            y: A series of the (normalized) values to forecast.
+        """
+        df = self._sorted(df)
+        if self.freq is None:
+            first = df[self.id_col].iloc[0]
+            times = df.loc[df[self.id_col] == first, self.time_col]
+            self.freq = pd.infer_freq(times) if len(times) >= 3 else None
+            if self.freq is None:
+                raise ValueError("cannot infer the frequency; please specify freq.")
+        rows = df.groupby(self.id_col, sort=False).cumcount() < self.lags[0]
+        if scale_until is not None:
+            rows |= df[self.time_col] < pd.Timestamp(scale_until)
+        scale = df[self.value_col][rows].abs().groupby(df[self.id_col][rows]).mean()
+        self.scale_ = scale.where(scale > 0, 1.0)
+        X = self._features(df)
+        # rows without any lag carry no information about the history
+        keep = X[f"lag_{self.lags[0]}"].notna().to_numpy()
+        X, y = X[keep], df[self.value_col][keep]
+        if self.normalize:
+            y = y / self.scale_.reindex(X[self.id_col]).to_numpy()
+        order = np.lexsort((X[self.id_col].cat.codes, X[self.time_col]))
+        return (
+            X.iloc[order].reset_index(drop=True),
+            y.iloc[order].reset_index(drop=True),
+        )
+
+    def transform_future(self, df: DataFrame) -> DataFrame:
+        """Build the features of the next horizon steps of every series.
+
+        Args:
+            df: A dataframe of the history in long format of the series seen
+                in fit_transform().
+
+        Returns:
+            A dataframe of the features of the future rows, with the id and
+            timestamp columns identifying them.
+        """
+        df = self._sorted(df)
+        last = df.groupby(self.id_col, sort=False)[self.time_col].last()
+        offset = pd.tseries.frequencies.to_offset(self.freq)
+        future = pd.concat(
+            [
+                DataFrame(
+                    {
+                        self.id_col: last.index,
+                        self.time_col: pd.DatetimeIndex(last) + step * offset,
+                        self.value_col: np.nan,
+                    }
+                )
+                for step in range(1, self.horizon + 1)
+            ]
+        )
+        df = pd.concat([df, future], ignore_index=True).sort_values(
+            [self.id_col, self.time_col], kind="mergesort"
+        )
+        X = self._features(df)
+        return X[df[self.value_col].isna().to_numpy()].reset_index(drop=True)
+
+
+class GlobalForecaster:
+    """Search one regression model which forecasts all the series.
+
+    Example:
+
+    .. code-block:: python
+
+        forecaster = GlobalForecaster(horizon=7)
+        forecaster.fit(df, time_budget=60)
+        forecast = forecaster.predict(df)
+    """
+
+    def __init__(self, horizon, **feature_args):
+        """Constructor.
+
+        Args:
+            horizon: An integer of the number of steps to forecast.
+            **feature_args: Other keyword arguments of LagFeatureBuilder,
+                e.g., lags, windows, id_col, time_col, value_col.
+        """
+        self.features = LagFeatureBuilder(horizon, **feature_args)
+        self.automl = AutoML()
+
+    def fit(self, df: DataFrame, n_splits=3, **settings):
+        """Build the features and search a model with rolling-origin
+        evaluation, whose folds validate on horizon timestamps each.
+
+        Args:
+            df: A dataframe of the history in long format, with the id,
+                timestamp and value columns.
+            n_splits: An integer of the number of rolling origins for cv;
+                for holdout, the latest one is used.
+            **settings: Other keyword arguments of AutoML.fit(). By default,
+                estimator_list is ['lgbm', 'xgboost'] and metric is 'mae'.
+
+        Returns:
+            self
+        """
+        # the scales are learned from the rows before the earliest validation
+        # timestamp
+        times = np.unique(pd.to_datetime(df[self.features.time_col]))
+        n_val = n_splits * self.features.horizon
+        X, y = self.features.fit_transform(
+            df, scale_until=times[-n_val] if len(times) > n_val else None
+        )
+        settings.setdefault("estimator_list", ["lgbm", "xgboost"])
+        settings.setdefault("metric", "mae")
+        split = RollingOriginSplit(
+            X[self.features.time_col],
+            n_splits=n_splits,
+            test_size=self.features.horizon,
+        )
+        self.automl.fit(
+            X_train=X, y_train=y, task="regression", split_type=split, **settings
+        )
+        return self
+
+    def predict(self, df: DataFrame) -> DataFrame:
+        """Forecast the next horizon steps of every series.
+
+        Args:
+            df: A dataframe of the history in long format of the series seen
+                in fit().
+
+        Returns:
+            A dataframe with the id, timestamp and forecast value columns.
+        """
+        features = self.features
+        X = features.transform_future(df)
+        pred = self.automl.predict(X)
+        if features.normalize:
+            pred = pred * features.scale_.reindex(X[features.id_col]).to_numpy()
+        return DataFrame(
+            {
+                features.id_col: X[features.id_col].astype(
+                    features.scale_.index.dtype
+                ),
+                features.time_col: X[features.time_col],
+                features.value_col: pred,
+            }
+        )
@@ -3,21 +3,27 @@
 #  * Licensed under the MIT License. See LICENSE file in the
 #  * project root for license information.
 import time
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
+from scipy.stats import t as student_t
 from sklearn.metrics import (
+    accuracy_score,
     mean_squared_error,
     r2_score,
     roc_auc_score,
-    accuracy_score,
     mean_absolute_error,
     log_loss,
     average_precision_score,
     f1_score,
     mean_absolute_percentage_error,
-    ndcg_score,
 )
-from sklearn.model_selection import RepeatedStratifiedKFold, GroupKFold, TimeSeriesSplit
+from sklearn.model_selection import (
+    RepeatedStratifiedKFold,
+    GroupKFold,
+    TimeSeriesSplit,
+    train_test_split,
+)
 from .model import (
     XGBoostSklearnEstimator,
     RandomForestEstimator,
@@ -32,7 +38,9 @@ from .model import (
     SARIMAX,
     TransformersEstimator,
 )
-from .data import CLASSIFICATION, group_counts, TS_FORECAST, TS_VALUE_COL
+from .data import CLASSIFICATION, TS_FORECAST, TS_VALUE_COL
+from .config import RANDOM_SEED, CV_RACING_CONFIDENCE
+from .rank_metrics import RANK_METRICS, rank_metric_score
 import logging
 
 logger = logging.getLogger(__name__)
@@ -72,6 +80,204 @@ def get_estimator_class(task, estimator_name):
     return estimator_class
 
 
+def _accuracy(y_true, y_pred, sample_weight=None) -> float:
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    if y_true.ndim != 1 or y_pred.ndim != 1:
+        # e.g., catboost predicts a column of shape (n, 1) for multiclass
+        return accuracy_score(y_true, y_pred, sample_weight=sample_weight)
+    return float(np.average(y_true == y_pred, weights=sample_weight))
+
+
+def _roc_auc_binary(y_true, y_score, sample_weight=None) -> float:
+    """ROC AUC with one sort, as the weighted Mann-Whitney statistic in which
+    tied scores count half, which equals the area under the ROC curve."""
+    classes = np.unique(y_true)
+    if len(classes) != 2:
+        # let sklearn raise the error
+        return roc_auc_score(y_true, y_score, sample_weight=sample_weight)
+    positive = np.asarray(y_true) == classes[1]
+    weight = np.ones(len(positive)) if sample_weight is None else sample_weight
+    order = np.argsort(y_score, kind="mergesort")
+    score = np.asarray(y_score)[order]
+    starts = np.flatnonzero(np.r_[True, score[1:] != score[:-1]])
+    # the weights of the positive and negative instances of every tied score
+    pos = np.add.reduceat(np.where(positive, weight, 0)[order], starts)
+    neg = np.add.reduceat(np.where(positive, 0, weight)[order], starts)
+    neg_below = np.cumsum(neg) - neg
+    return float(np.sum(pos * (neg_below + 0.5 * neg)) / (pos.sum() * neg.sum()))
+
+
+def _positives_above(score, positive_weight, y_index, weight, n_classes):
+    """Sort a column of scores once, and sum per class the weight of the
+    positive instances scored above each instance, with ties counting half.
+
+    Returns:
+        A 1d numpy array of the sums of the instances of every class, each
+        weighted by its weight.
+    """
+    order = np.argsort(score, kind="mergesort")
+    score = score[order]
+    starts = np.flatnonzero(np.r_[True, score[1:] != score[:-1]])
+    pos = np.add.reduceat(positive_weight[order], starts)
+    above = pos.sum() - np.cumsum(pos) + 0.5 * pos
+    above = np.repeat(above, np.diff(np.r_[starts, len(score)]))
+    return np.bincount(y_index[order], weight[order] * above, minlength=n_classes)
+
+
+def _is_multiclass_proba(y_score, n_classes) -> bool:
+    return (
+        n_classes > 2
+        and np.ndim(y_score) == 2
+        and y_score.shape[1] == n_classes
+        and np.isfinite(y_score).all()
+        and np.allclose(1, y_score.sum(axis=1))
+    )
+
+
+def _roc_auc_multiclass(y_true, y_score, multi_class="ovr", sample_weight=None):
+    """Macro-averaged multiclass ROC AUC as sklearn.metrics.roc_auc_score,
+    with one sort per class for both 'ovr' and 'ovo'.
+
+    For class k, the positives of k scored above every instance give, grouped
+    by the class of the instance, the AUC of k against all the other classes
+    and against every single class at once.
+    """
+    classes, y_index = np.unique(y_true, return_inverse=True)
+    y_score = np.asarray(y_score)
+    n_classes = len(classes)
+    if not _is_multiclass_proba(y_score, n_classes) or (
+        multi_class == "ovo" and sample_weight is not None
+    ):
+        # let sklearn compute or raise the error
+        return roc_auc_score(
+            y_true, y_score, sample_weight=sample_weight, multi_class=multi_class
+        )
+    weight = (
+        np.ones(len(y_index))
+        if sample_weight is None
+        else np.asarray(sample_weight, dtype=float)
+    )
+    class_weight = np.bincount(y_index, weight, minlength=n_classes)
+    auc = np.empty((n_classes, n_classes))
+    for k in range(n_classes):
+        auc[k] = _positives_above(
+            np.ascontiguousarray(y_score[:, k]),
+            np.where(y_index == k, weight, 0),
+            y_index,
+            weight,
+            n_classes,
+        )
+    if multi_class == "ovr":
+        rest = auc.sum(axis=1) - auc.diagonal()
+        return float(
+            np.mean(rest / (class_weight * (class_weight.sum() - class_weight)))
+        )
+    # auc[k, j] / (n_k * n_j) is the AUC of k against j on the scores of k
+    auc /= np.outer(class_weight, class_weight)
+    np.fill_diagonal(auc, 0)
+    return float(auc.sum() / (n_classes * (n_classes - 1)))
+
+
+def sampled_roc_auc(
+    y_true,
+    y_score,
+    multi_class="ovr",
+    sample_size=100000,
+    sample_weight=None,
+    delta=0.05,
+    random_state=RANDOM_SEED,
+):
+    """ROC AUC estimated on a stratified sample of the instances.
+
+    Args:
+        y_true: A 1d numpy array of the true labels.
+        y_score: A 1d numpy array of the scores for binary labels, or a 2d
+            numpy array of the class probabilities for multiclass labels.
+        multi_class: A string of 'ovr' or 'ovo' for multiclass labels.
+        sample_size: An integer of the number of instances to sample.
+        sample_weight: None or a 1d numpy array of the sample weight.
+        delta: A float of the probability that the error exceeds the bound.
+        random_state: An integer of the random seed of the sample.
+
+    Returns:
+        A tuple of the estimated AUC and a bound of its absolute error which
+        holds with probability at least 1 - delta. The bound is Hoeffding's
+        for two-sample U-statistics, 2 * exp(-2 * m * t ** 2) for the AUC of
+        two classes with at least m sampled instances each, taken over all
+        the AUCs averaged by the union bound.
+    """
+    y_true = np.asarray(y_true)
+    n = len(y_true)
+    if n > sample_size:
+        try:
+            index, _ = train_test_split(
+                np.arange(n),
+                train_size=sample_size,
+                stratify=y_true,
+                random_state=random_state,
+            )
+        except ValueError:
+            # too few instances of a class to stratify
+            index, _ = train_test_split(
+                np.arange(n), train_size=sample_size, random_state=random_state
+            )
+        y_true, y_score = y_true[index], np.asarray(y_score)[index]
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight)[index]
+    counts = np.unique(y_true, return_counts=True)[1]
+    if np.ndim(y_score) == 1:
+        auc = _roc_auc_binary(y_true, y_score, sample_weight)
+        n_aucs, m = 1, counts.min()
+    else:
+        auc = _roc_auc_multiclass(y_true, y_score, multi_class, sample_weight)
+        if multi_class == "ovr":
+            n_aucs, m = len(counts), np.minimum(counts, n - counts).min()
+        else:
+            n_aucs, m = len(counts) * (len(counts) - 1), counts.min()
+    bound = np.sqrt(np.log(2 * n_aucs / delta) / (2 * m))
+    return auc, float(min(bound, 1.0))
+
+
+def _log_loss(y_true, y_pred, labels=None, sample_weight=None) -> float:
+    """Log loss by gathering the probability of the true label only, with the
+    same clipping and normalization as sklearn.metrics.log_loss.
+
+    The normalization divides the probability of the true label only by the
+    sum of the clipped row, which is reduced in blocks of rows without
+    copying the whole matrix.
+    """
+    y_pred = np.asarray(y_pred)
+    if y_pred.dtype not in (np.float64, np.float32, np.float16):
+        y_pred = y_pred.astype(np.float64)
+    classes = np.unique(y_true if labels is None else labels)
+    n_columns = 2 if y_pred.ndim == 1 else y_pred.shape[1]
+    index = np.searchsorted(classes, y_true)
+    if (
+        len(classes) < 2
+        or y_pred.ndim > 2
+        or n_columns != len(classes)
+        or (index >= len(classes)).any()
+        or (classes[np.minimum(index, len(classes) - 1)] != y_true).any()
+    ):
+        # let sklearn raise the error
+        return log_loss(y_true, y_pred, labels=labels, sample_weight=sample_weight)
+    eps = np.finfo(y_pred.dtype).eps
+    if y_pred.ndim == 1:
+        proba = np.clip(y_pred, eps, 1 - eps)
+        proba = np.where(index == 1, proba, 1 - proba)
+        row_sum = 1
+    else:
+        proba = np.clip(y_pred[np.arange(len(index)), index], eps, 1 - eps)
+        row_sum = np.empty(len(index), dtype=y_pred.dtype)
+        block = max(1, 2 ** 20 // n_columns)
+        for start in range(0, len(index), block):
+            row_sum[start : start + block] = np.clip(
+                y_pred[start : start + block], eps, 1 - eps
+            ).sum(axis=1)
+    loss = -np.log((proba / row_sum).astype(np.float64))
+    return float(np.average(loss, weights=sample_weight))
+
+
 def sklearn_metric_loss_score(
     metric_name,
     y_predict,
@@ -79,6 +285,7 @@ def sklearn_metric_loss_score(
     labels=None,
     sample_weight=None,
     groups=None,
+    auc_sample_size=None,
 ):
     """Loss using the specified metric.
 
@@ -86,7 +293,8 @@ def sklearn_metric_loss_score(
         metric_name: A string of the metric name, one of
             'r2', 'rmse', 'mae', 'mse', 'accuracy', 'roc_auc', 'roc_auc_ovr',
             'roc_auc_ovo', 'log_loss', 'mape', 'f1', 'ap', 'ndcg',
-            'micro_f1', 'macro_f1'.
+            'micro_f1', 'macro_f1', 'map', 'mrr', or a ranking metric with a
+            cutoff like 'ndcg@5'.
         y_predict: A 1d or 2d numpy array of the predictions which can be
             used to calculate the metric. E.g., 2d for log_loss and 1d
             for others.
@@ -94,6 +302,9 @@ def sklearn_metric_loss_score(
         labels: A 1d numpy array of the unique labels.
         sample_weight: A 1d numpy array of the sample weight.
         groups: A 1d numpy array of the group labels.
+        auc_sample_size: None or an integer. If set, roc_auc_ovr and roc_auc_ovo
+            on more instances are estimated on a stratified sample of this
+            many instances, see sampled_roc_auc.
 
     Returns:
         score: A float number of the loss, the lower the better.
@@ -110,19 +321,25 @@ def sklearn_metric_loss_score(
     elif metric_name == "mse":
         score = mean_squared_error(y_true, y_predict, sample_weight=sample_weight)
     elif metric_name == "accuracy":
-        score = 1.0 - accuracy_score(y_true, y_predict, sample_weight=sample_weight)
+        score = 1.0 - _accuracy(y_true, y_predict, sample_weight)
     elif metric_name == "roc_auc":
-        score = 1.0 - roc_auc_score(y_true, y_predict, sample_weight=sample_weight)
-    elif metric_name == "roc_auc_ovr":
-        score = 1.0 - roc_auc_score(
-            y_true, y_predict, sample_weight=sample_weight, multi_class="ovr"
-        )
-    elif metric_name == "roc_auc_ovo":
-        score = 1.0 - roc_auc_score(
-            y_true, y_predict, sample_weight=sample_weight, multi_class="ovo"
+        score = 1.0 - (
+            _roc_auc_binary(y_true, y_predict, sample_weight)
+            if np.ndim(y_predict) == 1 and np.isfinite(y_predict).all()
+            else roc_auc_score(y_true, y_predict, sample_weight=sample_weight)
         )
+    elif metric_name in ("roc_auc_ovr", "roc_auc_ovo"):
+        multi_class = metric_name[-3:]
+        if auc_sample_size and len(y_true) > auc_sample_size:
+            auc, bound = sampled_roc_auc(
+                y_true, y_predict, multi_class, auc_sample_size, sample_weight
+            )
+            logger.debug(f"sampled {metric_name}={auc:.4f}, error bound={bound:.4f}")
+        else:
+            auc = _roc_auc_multiclass(y_true, y_predict, multi_class, sample_weight)
+        score = 1.0 - auc
     elif "log_loss" == metric_name:
-        score = log_loss(y_true, y_predict, labels=labels, sample_weight=sample_weight)
+        score = _log_loss(y_true, y_predict, labels, sample_weight)
     elif "mape" == metric_name:
         try:
             score = mean_absolute_percentage_error(y_true, y_predict)
@@ -142,45 +359,154 @@ def sklearn_metric_loss_score(
         score = 1 - average_precision_score(
             y_true, y_predict, sample_weight=sample_weight
         )
-    elif "ndcg" in metric_name:
-        if "@" in metric_name:
-            k = int(metric_name.split("@", 1)[-1])
-            counts = group_counts(groups)
-            score = 0
-            psum = 0
-            for c in counts:
-                score -= ndcg_score(
-                    np.asarray([y_true[psum : psum + c]]),
-                    np.asarray([y_predict[psum : psum + c]]),
-                    k=k,
-                )
-                psum += c
-            score /= len(counts)
-            score += 1
-        else:
-            score = 1 - ndcg_score([y_true], [y_predict])
+    elif metric_name.partition("@")[0] in RANK_METRICS:
+        # 'ndcg' without a cutoff ranks all the instances as a single list
+        score = 1 - rank_metric_score(
+            metric_name,
+            y_true,
+            y_predict,
+            None if metric_name == "ndcg" else groups,
+        )
     else:
         raise ValueError(
             metric_name + " is not a built-in metric, "
             "currently built-in metrics are: "
             "r2, rmse, mae, mse, accuracy, roc_auc, roc_auc_ovr, roc_auc_ovo,"
-            "log_loss, mape, f1, micro_f1, macro_f1, ap. "
+            "log_loss, mape, f1, micro_f1, macro_f1, ap, ndcg, map, mrr. "
             "please pass a customized metric function to AutoML.fit(metric=func)"
         )
     return score
 
 
+@contextmanager
+def shared_predictions(estimator):
+    """Share the predictions of an estimator on the same data in the context.
+
+    predict_proba is computed once per dataset, and the class predictions are
+    derived from it by argmax and classes_ instead of predicting again. The
+    methods are replaced on the instance only, so that metric functions still
+    receive the estimator itself.
+    """
+    predict, predict_proba = estimator.predict, estimator.predict_proba
+    # methods already replaced on the instance are restored afterwards
+    overridden = {
+        name: method
+        for name, method in vars(estimator).items()
+        if name in ("predict", "predict_proba")
+    }
+    entries = []  # (X, predictions), holding X so that the identity is unique
+
+    def get_entry(X):
+        for data, entry in entries:
+            if data is X:
+                return entry
+        entries.append((X, {}))
+        return entries[-1][1]
+
+    def shared_predict_proba(X):
+        entry = get_entry(X)
+        if "proba" not in entry:
+            entry["proba"] = predict_proba(X)
+        return entry["proba"]
+
+    def shared_predict(X):
+        entry = get_entry(X)
+        if "pred" not in entry:
+            proba = entry.get("proba")
+            classes = getattr(getattr(estimator, "_model", None), "classes_", None)
+            if (
+                classes is not None
+                and getattr(proba, "ndim", 0) == 2
+                and proba.shape[1] == len(classes)
+            ):
+                entry["pred"] = np.asarray(classes).take(proba.argmax(axis=1))
+            else:
+                entry["pred"] = predict(X)
+        return entry["pred"]
+
+    estimator.predict, estimator.predict_proba = shared_predict, shared_predict_proba
+    try:
+        yield estimator
+    finally:
+        del estimator.predict, estimator.predict_proba
+        vars(estimator).update(overridden)
+
+
+def evaluate_metrics(
+    metrics,
+    estimator,
+    X,
+    y,
+    obj,
+    labels=None,
+    sample_weight=None,
+    groups=None,
+    auc_sample_size=None,
+):
+    """Evaluate a list of built-in metrics with shared predictions.
+
+    Args:
+        metrics: A list of the metric names, see sklearn_metric_loss_score.
+        estimator: A trained estimator.
+        X: The data to predict on.
+        y: The true labels.
+        obj: A string of the task.
+        labels: A 1d numpy array of the unique labels.
+        sample_weight: A 1d numpy array of the sample weight.
+        groups: A 1d numpy array of the group labels.
+        auc_sample_size: None or an integer, see sklearn_metric_loss_score.
+
+    Returns:
+        A dict of the loss of every metric.
+    """
+    return {
+        metric: sklearn_metric_loss_score(
+            metric, y_pred, y, labels, sample_weight, groups, auc_sample_size
+        )
+        for metric, y_pred in metric_predictions(metrics, estimator, X, obj).items()
+    }
+
+
+PROBA_METRICS = ["log_loss", "roc_auc", "roc_auc_ovr", "roc_auc_ovo"]
+
+
+def metric_predictions(metrics, estimator, X, obj):
+    """Predict for a list of built-in metrics in one pass.
+
+    If any metric needs class probabilities, predict_proba runs once first
+    and the class predictions of the other metrics are derived from it.
+
+    Returns:
+        A dict of the predictions for every metric, see get_y_pred.
+    """
+    with shared_predictions(estimator):
+        if any(
+            metric in PROBA_METRICS or metric == "ap" and "binary" in obj
+            for metric in metrics
+        ):
+            estimator.predict_proba(X)
+        return {metric: get_y_pred(estimator, X, metric, obj) for metric in metrics}
+
+
 def get_y_pred(estimator, X, eval_metric, obj):
     if eval_metric in ["roc_auc", "ap"] and "binary" in obj:
         y_pred_classes = estimator.predict_proba(X)
         y_pred = y_pred_classes[:, 1] if y_pred_classes.ndim > 1 else y_pred_classes
-    elif eval_metric in ["log_loss", "roc_auc", "roc_auc_ovr", "roc_auc_ovo"]:
+    elif eval_metric in PROBA_METRICS:
         y_pred = estimator.predict_proba(X)
     else:
         y_pred = estimator.predict(X)
     return y_pred
 
 
+def _take(data, index):
+    if data is None:
+        return None
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return data.iloc[index]
+    return data[index]
+
+
 def _eval_estimator(
     config,
     estimator,
@@ -195,39 +521,63 @@ def _eval_estimator(
     labels=None,
     log_training_metric=False,
     fit_kwargs={},
+    train_metric_index=None,
+    auc_sample_size=None,
 ):
+    if train_metric_index is not None:
+        # the training metric is computed on a subsample of the training data
+        X_train = _take(X_train, train_metric_index)
+        y_train = _take(y_train, train_metric_index)
+        fit_kwargs = {
+            key: _take(fit_kwargs[key], train_metric_index)
+            for key in ("sample_weight", "groups")
+            if key in fit_kwargs
+        }
     if isinstance(eval_metric, str):
         pred_start = time.time()
-        test_pred_y = get_y_pred(estimator, X_test, eval_metric, obj)
+        test_pred_y = metric_predictions([eval_metric], estimator, X_test, obj)[
+            eval_metric
+        ]
         pred_time = (time.time() - pred_start) / X_test.shape[0]
         test_loss = sklearn_metric_loss_score(
-            eval_metric, test_pred_y, y_test, labels, weight_test, groups_test
+            eval_metric,
+            test_pred_y,
+            y_test,
+            labels,
+            weight_test,
+            groups_test,
+            auc_sample_size,
         )
         metric_for_logging = {}
         if log_training_metric:
-            train_pred_y = get_y_pred(estimator, X_train, eval_metric, obj)
-            metric_for_logging["train_loss"] = sklearn_metric_loss_score(
-                eval_metric,
-                train_pred_y,
+            metric_for_logging["train_loss"] = evaluate_metrics(
+                [eval_metric],
+                estimator,
+                X_train,
                 y_train,
+                obj,
                 labels,
                 fit_kwargs.get("sample_weight"),
                 fit_kwargs.get("groups"),
-            )
+                auc_sample_size,
+            )[eval_metric]
     else:  # customized metric function
-        test_loss, metric_for_logging = eval_metric(
-            X_test,
-            y_test,
-            estimator,
-            labels,
-            X_train,
-            y_train,
-            weight_test,
-            fit_kwargs.get("sample_weight"),
-            config,
-            groups_test,
-            fit_kwargs.get("groups"),
-        )
+        # repeated predictions of the metric function on the same data are
+        # served from the shared predictions
+        with shared_predictions(estimator):
+            test_loss, metric_for_logging = eval_metric(
+                X_test,
+                y_test,
+                estimator,
+                labels,
+                X_train,
+                y_train,
+                weight_test,
+                fit_kwargs.get("sample_weight"),
+                config,
+                groups_test,
+                fit_kwargs.get("groups"),
+            )
         pred_time = metric_for_logging.get("pred_time", 0)
         test_pred_y = None
         # eval_metric may return test_pred_y but not necessarily. Setting None for now.
@@ -249,6 +599,8 @@ def get_test_loss(
     budget=None,
     log_training_metric=False,
     fit_kwargs={},
+    train_metric_index=None,
+    auc_sample_size=None,
 ):
 
     start = time.time()
@@ -271,11 +623,89 @@ def get_test_loss(
         labels,
         log_training_metric,
         fit_kwargs,
+        train_metric_index,
+        auc_sample_size,
     )
     train_time = time.time() - start
     return test_loss, metric_for_logging, train_time, pred_time
 
 
+def get_batch_val_loss(
+    estimator,
+    X_val,
+    y_val,
+    weight_val,
+    groups_val,
+    eval_metric,
+    obj,
+    config,
+    labels=None,
+    auc_sample_size=None,
+):
+    """Validation losses of the configs an estimator can evaluate in the same
+    pass as its own, e.g., smaller n_neighbors from one neighbor query.
+
+    Returns:
+        A list of (config, val_loss) tuples.
+    """
+    if not isinstance(eval_metric, str) or not hasattr(estimator, "batch_predict"):
+        return []
+    # same predictions as get_y_pred
+    binary_proba = eval_metric in ["roc_auc", "ap"] and "binary" in obj
+    proba = binary_proba or eval_metric in PROBA_METRICS
+    batch_val_loss = []
+    for batch_config, y_pred in estimator.batch_predict(config, X_val, proba):
+        if binary_proba and y_pred.ndim > 1:
+            y_pred = y_pred[:, 1]
+        batch_val_loss.append(
+            (
+                batch_config,
+                sklearn_metric_loss_score(
+                    eval_metric,
+                    y_pred,
+                    y_val,
+                    labels,
+                    weight_val,
+                    groups_val,
+                    auc_sample_size,
+                ),
+            )
+        )
+    return batch_val_loss
+
+
+def _cannot_beat(
+    fold_losses, n_folds, best_val_loss, loss_lower_bound=None, racing=True
+):
+    """Whether the mean loss over all the n_folds folds cannot, or is very
+    unlikely to, beat best_val_loss given the losses of the first folds.
+
+    It cannot if the mean is no better than best_val_loss even with the
+    remaining folds at loss_lower_bound. Otherwise if racing, as the folds are a sample of the
+    n_folds folds without replacement, the one-sided Student's t bound of the
+    mean at CV_RACING_CONFIDENCE with the finite population correction is
+    used.
+    """
+    done = len(fold_losses)
+    if best_val_loss == np.inf or done >= n_folds:
+        return False
+    if (
+        loss_lower_bound is not None
+        and (sum(fold_losses) + (n_folds - done) * loss_lower_bound) / n_folds
+        >= best_val_loss
+    ):
+        return True
+    if not racing or done < 2:
+        return False
+    margin = (
+        student_t.ppf(CV_RACING_CONFIDENCE, done - 1)
+        * np.std(fold_losses, ddof=1)
+        / np.sqrt(done)
+        * np.sqrt((n_folds - done) / (n_folds - 1))
+    )
+    return np.mean(fold_losses) - margin > best_val_loss
+
+
 def evaluate_model_CV(
     config,
     estimator,
@@ -288,6 +718,8 @@ def evaluate_model_CV(
     best_val_loss,
     log_training_metric=False,
     fit_kwargs={},
+    train_metric_index=None,
+    auc_sample_size=None,
 ):
     start_time = time.time()
     total_val_loss = 0
@@ -303,6 +735,10 @@ def evaluate_model_CV(
         labels = None
     groups = None
     shuffle = True
+    # the built-in losses are nonnegative
+    loss_lower_bound = 0 if isinstance(eval_metric, str) else None
+    # the folds of a time series are not exchangeable
+    racing = not isinstance(kf, TimeSeriesSplit)
     if isinstance(kf, RepeatedStratifiedKFold):
         kf = kf.split(X_train_split, y_train_split)
     elif isinstance(kf, GroupKFold):
@@ -320,6 +756,8 @@ def evaluate_model_CV(
         kf = kf.split(X_train_split)
     rng = np.random.RandomState(2020)
     val_loss_list = []
+    fold_losses = []
+    stopped = False
     budget_per_train = budget / n
     if "sample_weight" in fit_kwargs:
         weight = fit_kwargs["sample_weight"]
@@ -361,12 +799,17 @@ def evaluate_model_CV(
             budget_per_train,
             log_training_metric=log_training_metric,
             fit_kwargs=fit_kwargs,
+            train_metric_index=None
+            if train_metric_index is None
+            else np.flatnonzero(np.isin(train_index, train_metric_index)),
+            auc_sample_size=auc_sample_size,
         )
         if weight is not None:
             fit_kwargs["sample_weight"] = weight
         valid_fold_num += 1
         total_fold_num += 1
         total_val_loss += val_loss_i
+        fold_losses.append(val_loss_i)
         if log_training_metric or not isinstance(eval_metric, str):
             if isinstance(total_metric, dict):
                 total_metric = {k: total_metric[k] + v for k, v in metric_i.items()}
@@ -379,16 +822,33 @@ def evaluate_model_CV(
         if valid_fold_num == n:
             val_loss_list.append(total_val_loss / valid_fold_num)
             total_val_loss = valid_fold_num = 0
+            fold_losses = []
         elif time.time() - start_time >= budget:
             val_loss_list.append(total_val_loss / valid_fold_num)
             break
+        elif _cannot_beat(fold_losses, n, best_val_loss, loss_lower_bound, racing):
+            # the mean of the done folds is reported, which is inferior to
+            # best_val_loss
+            logger.debug(
+                f"stop cv after {valid_fold_num} folds, loss "
+                f"{total_val_loss / valid_fold_num} vs best {best_val_loss}"
+            )
+            val_loss_list.append(total_val_loss / valid_fold_num)
+            stopped = True
+            break
     val_loss = np.max(val_loss_list)
-    n = total_fold_num
+    if stopped:
+        # the time of the full cv, to be comparable with the other trials
+        train_time *= n / total_fold_num
+    n_splits, n = n, total_fold_num
     if log_training_metric or not isinstance(eval_metric, str):
         if isinstance(total_metric, dict):
             metric = {k: v / n for k, v in total_metric.items()}
         else:
             metric = total_metric / n
+    if stopped and (metric is None or isinstance(metric, dict)):
+        # mark the loss as the mean of the done folds only
+        metric = dict(metric or {}, cv_folds_done=n, cv_n_splits=n_splits)
     pred_time /= n
     # budget -= time.time() - start_time
     # if val_loss < best_val_loss and budget > budget_per_train:
@@ -416,6 +876,8 @@ def compute_estimator(
     estimator_class=None,
     log_training_metric=False,
     fit_kwargs={},
+    train_metric_index=None,
+    auc_sample_size=None,
 ):
     estimator_class = estimator_class or get_estimator_class(task, estimator_name)
     estimator = estimator_class(
@@ -438,6 +900,8 @@ def compute_estimator(
             budget=budget,
             log_training_metric=log_training_metric,
             fit_kwargs=fit_kwargs,
+            train_metric_index=train_metric_index,
+            auc_sample_size=auc_sample_size,
         )
     else:
         val_loss, metric_for_logging, train_time, pred_time = evaluate_model_CV(
@@ -452,6 +916,8 @@ def compute_estimator(
             best_val_loss,
             log_training_metric=log_training_metric,
             fit_kwargs=fit_kwargs,
+            train_metric_index=train_metric_index,
+            auc_sample_size=auc_sample_size,
         )
     return estimator, val_loss, metric_for_logging, train_time, pred_time
 
@@ -4,6 +4,7 @@
 #  * project root for license information.
 from contextlib import contextmanager
 from functools import partial
+import copy
 import signal
 import os
 from typing import Callable, List
@@ -44,6 +45,43 @@ def TimeoutHandler(sig, frame):
     raise TimeoutError(sig, frame)
 
 
+def _data_fingerprint(*data) -> str:
+    """A hash of the content of arrays, dataframes or sparse matrices."""
+    import hashlib
+
+    digest = hashlib.md5()
+    for d in data:
+        if d is None:
+            digest.update(b"None")
+            continue
+        if isinstance(d, (DataFrame, Series)):
+            digest.update(pd.util.hash_pandas_object(d, index=False).values)
+            if isinstance(d, DataFrame):
+                digest.update(str(list(d.columns)).encode())
+        elif issparse(d):
+            d = d.tocsr()
+            for part in (d.data, d.indices, d.indptr):
+                digest.update(np.ascontiguousarray(part))
+        else:
+            digest.update(np.ascontiguousarray(d))
+        digest.update(str(d.shape).encode())
+    return digest.hexdigest()
+
+
+class _BoundedCache(dict):
+    """A dict which keeps only its maxsize most recently set entries."""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __setitem__(self, key, value):
+        self.pop(key, None)
+        super().__setitem__(key, value)
+        while len(self) > self.maxsize:
+            del self[next(iter(self))]
+
+
 @contextmanager
 def limit_resource(memory_limit, time_limit):
     if memory_limit > 0:
@@ -288,6 +326,12 @@ class TransformersEstimator(BaseEstimator):
     def __init__(self, task="seq-classification", **config):
         super().__init__(task, **config)
 
+    @classmethod
+    def init(cls):
+        from .nlp.utils import clear_cache
+
+        clear_cache()
+
     def _join(self, X_train, y_train):
         y_train = DataFrame(y_train, columns=["label"], index=X_train.index)
         train_df = X_train.join(y_train)
@@ -366,7 +410,7 @@ class TransformersEstimator(BaseEstimator):
                     or state.global_step >= this_params[TransformersEstimator.ITER_HP]
                 ):
                     control.should_training_stop = True
-                    control.should_save = True
+                    control.should_save = save_checkpoints
                     control.should_evaluate = True
                 return control
 
@@ -375,24 +419,31 @@ class TransformersEstimator(BaseEstimator):
                     control.should_training_stop
                     or state.epoch + 1 >= this_params["num_train_epochs"]
                 ):
-                    control.should_save = True
+                    control.should_save = save_checkpoints
                     control.should_evaluate = True
 
+        import sys
         import transformers
         from transformers import TrainingArguments
+        from transformers import DataCollatorWithPadding
         from transformers.trainer_utils import set_seed
-        from transformers import AutoTokenizer
         from .nlp.utils import (
+            get_tokenizer,
             separate_config,
             load_model,
             get_num_labels,
             compute_checkpoint_freq,
         )
         from .nlp.huggingface.trainer import TrainerForAuto
+        from .nlp.checkpoint import get_checkpoint_manager
         from datasets import Dataset
 
         self._init_hpo_args(kwargs)
         self._metric_name = kwargs["metric"]
+        # keep the best model state in memory instead of saving checkpoints
+        save_checkpoints = not self.custom_hpo_args.ckpt_in_memory
+        ckpt_manager = get_checkpoint_manager(self.custom_hpo_args)
+        trial_dir = ckpt_manager.new_trial_dir()
 
         X_val = kwargs.get("X_val")
         y_val = kwargs.get("y_val")
@@ -405,20 +456,15 @@ class TransformersEstimator(BaseEstimator):
         else:
             eval_dataset = None
 
-        tokenizer = AutoTokenizer.from_pretrained(
-            self.custom_hpo_args.model_path, use_fast=True
+        tokenizer = get_tokenizer(self.custom_hpo_args.model_path)
+        data_collator = DataCollatorWithPadding(
+            tokenizer, pad_to_multiple_of=8 if self.custom_hpo_args.fp16 else None
         )
         set_seed(self.params["seed"])
 
         num_labels = get_num_labels(self._task, y_train)
 
         training_args_config, per_model_config = separate_config(self.params)
-        this_model = load_model(
-            checkpoint_path=self.custom_hpo_args.model_path,
-            task=self._task,
-            num_labels=num_labels,
-            per_model_config=per_model_config,
-        )
         ckpt_freq = compute_checkpoint_freq(
             train_data_size=len(X_train),
             custom_hpo_args=self.custom_hpo_args,
@@ -428,31 +474,35 @@ class TransformersEstimator(BaseEstimator):
 
         if transformers.__version__.startswith("3"):
             training_args = TrainingArguments(
-                output_dir=self.custom_hpo_args.output_dir,
+                output_dir=trial_dir,
                 do_train=True,
                 do_eval=True,
                 eval_steps=ckpt_freq,
                 evaluate_during_training=True,
-                save_steps=ckpt_freq,
+                save_steps=ckpt_freq if save_checkpoints else sys.maxsize,
                 save_total_limit=0,
                 fp16=self.custom_hpo_args.fp16,
-                load_best_model_at_end=True,
+                load_best_model_at_end=save_checkpoints,
                 **training_args_config,
             )
         else:
             from transformers import IntervalStrategy
 
             training_args = TrainingArguments(
-                output_dir=self.custom_hpo_args.output_dir,
+                output_dir=trial_dir,
                 do_train=True,
                 do_eval=True,
-                per_device_eval_batch_size=1,
+                per_device_eval_batch_size=self.custom_hpo_args.eval_batch_size,
                 eval_steps=ckpt_freq,
                 evaluation_strategy=IntervalStrategy.STEPS,
+                save_strategy=IntervalStrategy.STEPS
+                if save_checkpoints
+                else IntervalStrategy.NO,
                 save_steps=ckpt_freq,
                 save_total_limit=0,
                 fp16=self.custom_hpo_args.fp16,
-                load_best_model_at_end=True,
+                group_by_length=self.custom_hpo_args.group_by_length,
+                load_best_model_at_end=save_checkpoints,
                 **training_args_config,
             )
 
@@ -462,28 +512,71 @@ class TransformersEstimator(BaseEstimator):
                 task=self._task,
                 num_labels=num_labels,
                 per_model_config=per_model_config,
+                use_cache=True,
             )
 
         trainer = TrainerForAuto(
-            model=this_model,
             args=training_args,
             model_init=_model_init,
             train_dataset=train_dataset,
             eval_dataset=eval_dataset,
             tokenizer=tokenizer,
+            data_collator=data_collator,
             compute_metrics=self._compute_metrics_by_dataset_name,
             callbacks=[EarlyStoppingCallbackForAuto],
+            metric_name=self._metric_name,
+            keep_best_state=not save_checkpoints,
         )
 
-        trainer.train()
-
-        self.params[self.ITER_HP] = trainer.state.global_step
-        self._checkpoint_path = self._select_checkpoint(trainer)
+        try:
+            trainer.train()
+        except BaseException:
+            ckpt_manager.remove(trial_dir)
+            raise
 
         self._kwargs = kwargs
         self._num_labels = num_labels
         self._per_model_config = per_model_config
 
+        self.params[self.ITER_HP] = trainer.state.global_step
+        if save_checkpoints:
+            self._checkpoint_path = self._select_checkpoint(trainer)
+            # keep the trained model resident if it is the selected checkpoint
+            from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
+
+            resident_ckpt = trainer.state.best_model_checkpoint or os.path.join(
+                trainer.args.output_dir,
+                f"{PREFIX_CHECKPOINT_DIR}-{trainer.state.global_step}",
+            )
+            # otherwise the selected checkpoint is loaded on the first predict
+            self._model = (
+                trainer.model if resident_ckpt == self._checkpoint_path else None
+            )
+            ckpt_manager.prune_trial(
+                trial_dir,
+                trainer.ckpt_to_metric,
+                self._metric_name,
+                self._checkpoint_path,
+            )
+            best_metrics = trainer.ckpt_to_metric.get(self._checkpoint_path, {})
+            loss = best_metrics.get(self._metric_name, np.inf)
+            if not ckpt_manager.retains(loss):
+                # load the model before its trial directory is removed
+                self._load_best_model()
+            ckpt_manager.register(trial_dir, loss)
+            if self._model is None:
+                # retained until this estimator is released
+                ckpt_manager.pin(trial_dir, self)
+        else:
+            if trainer.best_state is not None:
+                trainer.model.load_state_dict(trainer.best_state)
+                self.params[self.ITER_HP] = trainer.ckpt_to_global_step[
+                    trainer.best_ckpt
+                ]
+            self._checkpoint_path = None
+            self._model = trainer.model
+            ckpt_manager.remove(trial_dir)
+
     def _select_checkpoint(self, trainer):
         if trainer.ckpt_to_metric:
             best_ckpt, _ = min(
@@ -519,30 +612,70 @@ class TransformersEstimator(BaseEstimator):
             )
         }
 
-    def predict(self, X_test):
-        from datasets import Dataset
-        from .nlp.utils import load_model
-        from transformers import TrainingArguments
-        from .nlp.huggingface.trainer import TrainerForAuto
+    def _load_best_model(self):
+        """Load the selected checkpoint once, unless the trained model is the
+        selected one, and keep it resident for predict."""
+        if self._model is None:
+            from .nlp.utils import load_model
+
+            if not os.path.isdir(self._checkpoint_path):
+                raise FileNotFoundError(
+                    f"The checkpoint {self._checkpoint_path} of the estimator has "
+                    "been removed from custom_hpo_args.output_dir."
+                )
+            self._model = load_model(
+                checkpoint_path=self._checkpoint_path,
+                task=self._task,
+                num_labels=self._num_labels,
+                per_model_config=self._per_model_config,
+            )
+        return self._model
+
+    def _predict_logits(self, X_test, batch_size=None):
+        import torch
+        from transformers import DataCollatorWithPadding
+        from .nlp.utils import get_tokenizer
 
         if X_test.dtypes[0] == "string":
             X_test = self._preprocess(X_test, self._task, **self._kwargs)
-            test_dataset = Dataset.from_pandas(X_test)
-
-        best_model = load_model(
-            checkpoint_path=self._checkpoint_path,
-            task=self._task,
-            num_labels=self._num_labels,
-            per_model_config=self._per_model_config,
-        )
-        training_args = TrainingArguments(
-            per_device_eval_batch_size=1,
-            output_dir=self.custom_hpo_args.output_dir,
+        batch_size = batch_size or self.custom_hpo_args.eval_batch_size
+        model = self._load_best_model()
+        model.eval()
+        data_collator = DataCollatorWithPadding(
+            get_tokenizer(self.custom_hpo_args.model_path)
         )
-        test_trainer = TrainerForAuto(model=best_model, args=training_args)
-        predictions = test_trainer.predict(test_dataset)
+        features = X_test.to_dict("records")
+        # batches of similar lengths need little padding
+        order = np.argsort([len(ids) for ids in X_test["input_ids"]], kind="stable")
+        logits = None
+        with torch.no_grad():
+            for start in range(0, len(order), batch_size):
+                index = order[start : start + batch_size]
+                batch = data_collator([features[i] for i in index])
+                batch = {key: value.to(model.device) for key, value in batch.items()}
+                output = model(**batch)[0].cpu().numpy()
+                if logits is None:
+                    logits = np.empty((len(order),) + output.shape[1:], output.dtype)
+                logits[index] = output
+        return logits
+
+    def predict(self, X_test, batch_size=None):
+        """Predict label from features.
 
-        return np.argmax(predictions.predictions, axis=1)
+        Args:
+            X_test: A pandas dataframe of text or tokenized features.
+            batch_size: An integer of the inference batch size; defaults to
+                custom_hpo_args.eval_batch_size.
+
+        Returns:
+            A numpy array of shape n * 1.
+        """
+        from .data import SEQREGRESSION
+
+        logits = self._predict_logits(X_test, batch_size)
+        if self._task == SEQREGRESSION:
+            return np.squeeze(logits, axis=-1)
+        return np.argmax(logits, axis=1)
 
 
 class SKLearnEstimator(BaseEstimator):
@@ -572,6 +705,14 @@ class LGBMEstimator(BaseEstimator):
 
     ITER_HP = "n_estimators"
     HAS_CALLBACK = True
+    # seconds per iteration by (learner, training data fingerprint, log4 bucket
+    # of the size of one iteration's model), shared across trials to bound the
+    # training without callbacks; cleared by init()
+    _time_per_iter_by_size = _BoundedCache(64)
+
+    @classmethod
+    def init(cls):
+        LGBMEstimator._time_per_iter_by_size.clear()
 
     @classmethod
     def search_space(cls, data_size, **params):
@@ -646,8 +787,6 @@ class LGBMEstimator(BaseEstimator):
 
             self.estimator_class = LGBMClassifier
         self._time_per_iter = None
-        self._train_size = 0
-        self._mem_per_iter = 1
         self.HAS_CALLBACK = self.HAS_CALLBACK and self._callbacks(0, 0) is not None
 
     def _preprocess(self, X):
@@ -669,97 +808,75 @@ class LGBMEstimator(BaseEstimator):
     def fit(self, X_train, y_train, budget=None, **kwargs):
         start_time = time.time()
         deadline = start_time + budget if budget else np.inf
-        n_iter = self.params[self.ITER_HP]
-        trained = False
         if not self.HAS_CALLBACK:
-            mem0 = psutil.virtual_memory().available if psutil is not None else 1
-            if (
-                (
-                    not self._time_per_iter
-                    or abs(self._train_size - X_train.shape[0]) > 4
-                )
-                and budget is not None
-                or self._mem_per_iter <= 1
-                and psutil is not None
-            ) and n_iter > 1:
-                self.params[self.ITER_HP] = 1
-                self._t1 = self._fit(X_train, y_train, **kwargs)
-                if budget is not None and self._t1 >= budget or n_iter == 1:
-                    # self.params[self.ITER_HP] = n_iter
-                    return self._t1
-                mem1 = psutil.virtual_memory().available if psutil is not None else 1
-                self._mem1 = mem0 - mem1
-                self.params[self.ITER_HP] = min(n_iter, 4)
-                self._t2 = self._fit(X_train, y_train, **kwargs)
-                mem2 = psutil.virtual_memory().available if psutil is not None else 1
-                self._mem2 = max(mem0 - mem2, self._mem1)
-                # if self._mem1 <= 0:
-                #     self._mem_per_iter = self._mem2 / (self.params[self.ITER_HP] + 1)
-                # elif self._mem2 <= 0:
-                #     self._mem_per_iter = self._mem1
-                # else:
-                self._mem_per_iter = min(
-                    self._mem1, self._mem2 / self.params[self.ITER_HP]
-                )
-                if self._mem_per_iter <= 1 and psutil is not None:
-                    n_iter = self.params[self.ITER_HP]
-                self._time_per_iter = (
-                    (self._t2 - self._t1) / (self.params[self.ITER_HP] - 1)
-                    if self._t2 > self._t1
-                    else self._t1
-                    if self._t1
-                    else 0.001
-                )
-                self._train_size = X_train.shape[0]
-                if (
-                    budget is not None
-                    and self._t1 + self._t2 >= budget
-                    or n_iter == self.params[self.ITER_HP]
-                ):
-                    # self.params[self.ITER_HP] = n_iter
-                    return time.time() - start_time
-                trained = True
-            # logger.debug(mem0)
-            # logger.debug(self._mem_per_iter)
-            if n_iter > 1:
-                max_iter = min(
-                    n_iter,
-                    int(
-                        (budget - time.time() + start_time - self._t1)
-                        / self._time_per_iter
-                        + 1
-                    )
-                    if budget is not None
-                    else n_iter,
-                    int((1 - FREE_MEM_RATIO) * mem0 / self._mem_per_iter)
-                    if psutil is not None
-                    else n_iter,
-                )
-                if trained and max_iter <= self.params[self.ITER_HP]:
-                    return time.time() - start_time
-                self.params[self.ITER_HP] = max_iter
-        if self.params[self.ITER_HP] > 0:
-            if self.HAS_CALLBACK:
-                self._fit(
-                    X_train,
-                    y_train,
-                    callbacks=self._callbacks(start_time, deadline),
-                    **kwargs,
-                )
-                best_iteration = (
-                    self._model.get_booster().best_iteration
-                    if isinstance(self, XGBoostSklearnEstimator)
-                    else self._model.best_iteration_
-                )
-                if best_iteration is not None:
-                    self._model.set_params(n_estimators=best_iteration + 1)
-            else:
-                self._fit(X_train, y_train, **kwargs)
-        else:
-            self.params[self.ITER_HP] = self._model.n_estimators
+            self._fit_in_chunks(X_train, y_train, deadline, **kwargs)
+        elif self.params[self.ITER_HP] > 0:
+            self._fit(
+                X_train,
+                y_train,
+                callbacks=self._callbacks(start_time, deadline),
+                **kwargs,
+            )
+            best_iteration = (
+                self._model.get_booster().best_iteration
+                if isinstance(self, XGBoostSklearnEstimator)
+                else self._model.best_iteration_
+            )
+            if best_iteration is not None:
+                self._model.set_params(n_estimators=best_iteration + 1)
         train_time = time.time() - start_time
         return train_time
 
+    def _fit_in_chunks(self, X_train, y_train, deadline, **kwargs):
+        """Train without per-iteration callbacks by continued training.
+
+        The number of iterations of the next chunk is bounded by the time left,
+        according to the time per iteration shared across trials with the same
+        training data and a similar model size per iteration, e.g., the
+        number of leaves of a tree. Training stops early when the available
+        memory is low, like in _callback.
+        """
+        n_iter = self.params[self.ITER_HP]
+        try:
+            iter_size = self.size({**self.params, self.ITER_HP: 1})
+        except (KeyError, TypeError, ValueError):
+            iter_size = 1.0
+        key = (
+            self.__class__.__name__,
+            _data_fingerprint(X_train, y_train),
+            int(np.log(max(iter_size, 1.0)) / np.log(4)),
+        )
+        time_per_iter = LGBMEstimator._time_per_iter_by_size.get(key)
+        n_trained = 0
+        while n_trained < n_iter:
+            now = time.time()
+            if time_per_iter is None:
+                # the first chunk measures the time per iteration
+                chunk = min(4, n_iter)
+            elif n_trained and now + time_per_iter > deadline:
+                break
+            else:
+                chunk = n_iter - n_trained
+                if deadline < np.inf:
+                    chunk = max(1, min(chunk, int((deadline - now) / time_per_iter)))
+            self.params[self.ITER_HP] = chunk
+            fit_kwargs = (
+                {**kwargs, **self._continued_training_kwargs()} if n_trained else kwargs
+            )
+            time_per_iter = self._fit(X_train, y_train, **fit_kwargs) / chunk
+            LGBMEstimator._time_per_iter_by_size[key] = time_per_iter
+            n_trained += chunk
+            if psutil is not None:
+                mem = psutil.virtual_memory()
+                if mem.available / mem.total < FREE_MEM_RATIO:
+                    break
+        self.params[self.ITER_HP] = n_trained
+        if n_trained:
+            self._model.set_params(n_estimators=n_trained)
+
+    def _continued_training_kwargs(self) -> dict:
+        return {"init_model": self._model.booster_}
+
     def _callbacks(self, start_time, deadline) -> List[Callable]:
         return [partial(self._callback, start_time, deadline)]
 
@@ -967,11 +1084,23 @@ class XGBoostSklearnEstimator(SKLearnEstimator, LGBMEstimator):
     def _callbacks(self, start_time, deadline) -> List[Callable]:
         return XGBoostEstimator._callbacks(start_time, deadline)
 
+    def _continued_training_kwargs(self) -> dict:
+        return {"xgb_model": self._model.get_booster()}
+
 
 class RandomForestEstimator(SKLearnEstimator, LGBMEstimator):
     """The class for tuning Random Forest."""
 
     HAS_CALLBACK = False
+    MIN_N_ESTIMATORS = 4
+    # fitted forests of recent training data, grown further by later trials
+    # which only differ in n_estimators; cleared by init() at the start and
+    # end of every AutoML run
+    _forest_cache = _BoundedCache(2)
+
+    @classmethod
+    def init(cls):
+        RandomForestEstimator._forest_cache.clear()
 
     @classmethod
     def search_space(cls, data_size, task, **params):
@@ -979,7 +1108,7 @@ class RandomForestEstimator(SKLearnEstimator, LGBMEstimator):
         upper = min(2048, data_size)
         space = {
             "n_estimators": {
-                "domain": tune.lograndint(lower=4, upper=upper),
+                "domain": tune.lograndint(lower=cls.MIN_N_ESTIMATORS, upper=upper),
                 "init_value": 4,
                 "low_cost_init_value": 4,
             },
@@ -1023,6 +1152,114 @@ class RandomForestEstimator(SKLearnEstimator, LGBMEstimator):
         if task in CLASSIFICATION:
             self.estimator_class = RandomForestClassifier
 
+    def fit(self, X_train, y_train, budget=None, **kwargs):
+        """Grow the forest with warm start, from the forest of a previous trial
+        which only differs in n_estimators if there is one.
+
+        Trees are added in growing chunks until n_estimators is reached, the
+        next chunk is not expected to finish before the deadline, or the
+        available memory is low.
+        """
+        start_time = time.time()
+        deadline = start_time + budget if budget else np.inf
+        X_train = self._preprocess(X_train)
+        n_iter = self.params[self.ITER_HP]
+        params = {
+            key: value
+            for key, value in self.params.items()
+            if key not in (self.ITER_HP, "n_jobs", "warm_start")
+        }
+        key = (
+            self.estimator_class.__name__,
+            _data_fingerprint(X_train, y_train, kwargs.get("sample_weight")),
+            str(sorted(params.items())),
+        )
+        cache = RandomForestEstimator._forest_cache
+        cached = cache.get(key)
+        if cached is not None:
+            # a shallow copy with its own list of trees leaves the cache intact
+            model = copy.copy(cached)
+            model.estimators_ = model.estimators_[:n_iter]
+            model.set_params(n_jobs=self.params.get("n_jobs"))
+            n_trees = len(model.estimators_)
+        else:
+            model = self.estimator_class(**self.params)
+            n_trees = 0
+        time_per_tree = None
+        while n_trees < n_iter:
+            now = time.time()
+            if time_per_tree is None:
+                chunk = min(4, n_iter - n_trees)
+            else:
+                if now + time_per_tree > deadline:
+                    break
+                chunk = min(
+                    max(n_trees, 4),
+                    int((deadline - now) / time_per_tree) if budget else n_iter,
+                    n_iter - n_trees,
+                )
+            model.set_params(n_estimators=n_trees + chunk, warm_start=True)
+            model.fit(X_train, y_train, **kwargs)
+            n_trees += chunk
+            time_per_tree = (time.time() - now) / chunk
+            if psutil is not None:
+                mem = psutil.virtual_memory()
+                if mem.available / mem.total < FREE_MEM_RATIO:
+                    break
+        model.set_params(n_estimators=n_trees, warm_start=False)
+        self._model = model
+        self.params[self.ITER_HP] = n_trees
+        if cached is None or len(cached.estimators_) < n_trees:
+            cache[key] = model
+        return time.time() - start_time
+
+    def batch_predict(self, config: dict, X, proba: bool = False, max_batch=16):
+        """Predict with fewer trees in one more pass over the trial's trees.
+
+        The predictions of the first k trees for any k are the cumulative
+        means of the per-tree predictions, so the batch costs about as much
+        as one prediction of the trial's forest.
+
+        Args:
+            config: A dictionary of the trial's config.
+            X: A numpy array or a dataframe of featurized instances.
+            proba: A bool of whether to predict class probabilities.
+            max_batch: An integer of the maximal number of n_estimators values,
+                which are spaced geometrically.
+
+        Returns:
+            A list of (config, prediction) tuples.
+        """
+        model = self._model
+        if not isinstance(model, self.estimator_class):
+            return []
+        n_trees = len(model.estimators_)
+        lower = self.MIN_N_ESTIMATORS
+        if n_trees <= lower:
+            return []
+        grid = set(np.geomspace(lower, n_trees - 1, max_batch).astype(int))
+        from sklearn.utils import check_array
+
+        # the input of tree.predict with check_input=False
+        X = check_array(self._preprocess(X), dtype=np.float32, accept_sparse="csr")
+        classification = self._task in CLASSIFICATION
+        total = None
+        batch = []
+        for k, tree in enumerate(model.estimators_[: max(grid)], 1):
+            pred = (
+                tree.predict_proba(X, check_input=False)
+                if classification
+                else tree.predict(X, check_input=False)
+            )
+            total = pred if total is None else total + pred
+            if k not in grid:
+                continue
+            pred = total / k
+            if classification and not proba:
+                pred = model.classes_.take(np.argmax(pred, axis=1), axis=0)
+            batch.append(({**config, self.ITER_HP: k}, pred))
+        return batch
+
 
 class ExtraTreesEstimator(RandomForestEstimator):
     """The class for tuning Extra Trees."""
@@ -1098,6 +1335,15 @@ class CatBoostEstimator(BaseEstimator):
     """The class for tuning CatBoost."""
 
     ITER_HP = "n_estimators"
+    # pools of recently used training data, keyed by data fingerprint and split
+    _pool_cache = _BoundedCache(4)
+    # quantization would differ from the cached pools under these params
+    _QUANTIZATION_PARAMS = (
+        "border_count",
+        "max_bin",
+        "feature_border_type",
+        "per_float_feature_quantization",
+    )
 
     @classmethod
     def search_space(cls, data_size, **params):
@@ -1128,12 +1374,21 @@ class CatBoostEstimator(BaseEstimator):
     def cost_relative2lgbm(cls):
         return 15
 
+    @classmethod
+    def init(cls):
+        CatBoostEstimator._pool_cache.clear()
+
     def _preprocess(self, X):
         if isinstance(X, DataFrame):
-            cat_columns = X.select_dtypes(include=["category"]).columns
-            if not cat_columns.empty:
+            # DataTransformer already renames float categories; copy only if needed
+            float_cat_columns = [
+                column
+                for column in X.select_dtypes(include=["category"]).columns
+                if any(isinstance(c, float) for c in X[column].cat.categories)
+            ]
+            if float_cat_columns:
                 X = X.copy()
-                X[cat_columns] = X[cat_columns].apply(
+                X[float_cat_columns] = X[float_cat_columns].apply(
                     lambda x: x.cat.rename_categories(
                         [
                             str(c) if isinstance(c, float) else c
@@ -1167,6 +1422,8 @@ class CatBoostEstimator(BaseEstimator):
             {
                 "verbose": config.get("verbose", False),
                 "random_seed": config.get("random_seed", 10242048),
+                # no training directory is written to disk
+                "allow_writing_files": config.get("allow_writing_files", False),
             }
         )
         from catboost import CatBoostRegressor
@@ -1177,52 +1434,62 @@ class CatBoostEstimator(BaseEstimator):
 
             self.estimator_class = CatBoostClassifier
 
-    def fit(self, X_train, y_train, budget=None, **kwargs):
-        import shutil
+    def _pools(self, X_train, y_train, weight, cat_features, n):
+        """Get the train and eval pools, reusing them across trials on the same data."""
+        from catboost import Pool
+
+        cls = CatBoostEstimator
+        cacheable = not any(param in self.params for param in cls._QUANTIZATION_PARAMS)
+        if cacheable:
+            key = (
+                _data_fingerprint(X_train, y_train, weight),
+                n,
+                tuple(cat_features),
+            )
+            pools = cls._pool_cache.get(key)
+            if pools is not None:
+                return pools
+        train_pool = Pool(
+            data=X_train[:n],
+            label=y_train[:n],
+            weight=None if weight is None else weight[:n],
+            cat_features=cat_features,
+        )
+        eval_pool = Pool(data=X_train[n:], label=y_train[n:], cat_features=cat_features)
+        pools = train_pool, eval_pool
+        if cacheable:
+            try:
+                # binarize the features once instead of in every fit
+                train_pool.quantize()
+            except AttributeError:  # catboost<0.24 has no Pool.quantize
+                pass
+            cls._pool_cache[key] = pools
+        return pools
 
+    def fit(self, X_train, y_train, budget=None, **kwargs):
         start_time = time.time()
         deadline = start_time + budget if budget else np.inf
-        train_dir = f"catboost_{str(start_time)}"
         X_train = self._preprocess(X_train)
         if isinstance(X_train, DataFrame):
             cat_features = list(X_train.select_dtypes(include="category").columns)
         else:
             cat_features = []
         n = max(int(len(y_train) * 0.9), len(y_train) - 1000)
-        X_tr, y_tr = X_train[:n], y_train[:n]
-        if "sample_weight" in kwargs:
-            weight = kwargs["sample_weight"]
-            if weight is not None:
-                kwargs["sample_weight"] = weight[:n]
-        else:
-            weight = None
-        from catboost import Pool, __version__
+        kwargs = kwargs.copy()
+        weight = kwargs.pop("sample_weight", None)
+        from catboost import __version__
 
-        model = self.estimator_class(train_dir=train_dir, **self.params)
+        model = self.estimator_class(**self.params)
+        train_pool, eval_pool = self._pools(X_train, y_train, weight, cat_features, n)
         if __version__ >= "0.26":
             model.fit(
-                X_tr,
-                y_tr,
-                cat_features=cat_features,
-                eval_set=Pool(
-                    data=X_train[n:], label=y_train[n:], cat_features=cat_features
-                ),
+                train_pool,
+                eval_set=eval_pool,
                 callbacks=CatBoostEstimator._callbacks(start_time, deadline),
                 **kwargs,
             )
         else:
-            model.fit(
-                X_tr,
-                y_tr,
-                cat_features=cat_features,
-                eval_set=Pool(
-                    data=X_train[n:], label=y_train[n:], cat_features=cat_features
-                ),
-                **kwargs,
-            )
-        shutil.rmtree(train_dir, ignore_errors=True)
-        if weight is not None:
-            kwargs["sample_weight"] = weight
+            model.fit(train_pool, eval_set=eval_pool, **kwargs)
         self._model = model
         self.params[self.ITER_HP] = self._model.tree_count_
         train_time = time.time() - start_time
@@ -1247,6 +1514,11 @@ class CatBoostEstimator(BaseEstimator):
 
 
 class KNeighborsEstimator(BaseEstimator):
+    # fitted neighbor indexes of recent training data, shared across n_neighbors
+    _index_cache = _BoundedCache(2)
+    # batch queries per index, whose prefixes serve any smaller n_neighbors
+    _QUERY_CACHE_SIZE = 4
+
     @classmethod
     def search_space(cls, data_size, **params):
         upper = min(512, int(data_size / 2))
@@ -1262,6 +1534,10 @@ class KNeighborsEstimator(BaseEstimator):
     def cost_relative2lgbm(cls):
         return 30
 
+    @classmethod
+    def init(cls):
+        KNeighborsEstimator._index_cache.clear()
+
     def config2params(cls, config: dict) -> dict:
         params = config.copy()
         params["weights"] = params.get("weights", "distance")
@@ -1277,6 +1553,183 @@ class KNeighborsEstimator(BaseEstimator):
             from sklearn.neighbors import KNeighborsRegressor
 
             self.estimator_class = KNeighborsRegressor
+        self._index_key = None
+
+    @staticmethod
+    def _algorithm(X) -> str:
+        """Choose the neighbor search structure by sparsity and dimension."""
+        if issparse(X):
+            return "brute"
+        if X.shape[1] <= 15:
+            return "kd_tree"
+        if X.shape[1] <= 64:
+            return "ball_tree"
+        return "brute"
+
+    def _fit(self, X_train, y_train, **kwargs):
+        current_time = time.time()
+        X_train = self._preprocess(X_train)
+        params = self.params.copy()
+        params["algorithm"] = params.get("algorithm") or self._algorithm(X_train)
+        # the index depends on neither n_neighbors nor weights nor n_jobs
+        index_params = sorted(
+            (key, value)
+            for key, value in params.items()
+            if key not in ("n_neighbors", "weights", "n_jobs")
+        )
+        self._index_key = key = (
+            self.estimator_class.__name__,
+            _data_fingerprint(X_train, y_train),
+            str(index_params),
+        )
+        cache = KNeighborsEstimator._index_cache
+        entry = cache.get(key)
+        if entry is None:
+            model = self.estimator_class(**params)
+            model.fit(X_train, y_train, **kwargs)
+            y = np.asarray(y_train)
+            if self._task in CLASSIFICATION:
+                y = np.searchsorted(model.classes_, y)
+            entry = cache[key] = {
+                "model": model,
+                "y": y,
+                "queries": _BoundedCache(self._QUERY_CACHE_SIZE),
+            }
+        # a shallow copy shares the fitted index
+        self._model = copy.copy(entry["model"]).set_params(**params)
+        self._y = entry["y"]
+        return time.time() - current_time
+
+    def _kneighbors(self, X, n_neighbors, key=None):
+        """Query the neighbors of X. With the key of X, e.g., its fingerprint,
+        a previous query of the same X with at least n_neighbors neighbors is
+        reused."""
+        entry = KNeighborsEstimator._index_cache.get(self._index_key)
+        if key is None or entry is None:
+            return self._model.kneighbors(X, n_neighbors=n_neighbors)
+        queries = entry["queries"]
+        cached = queries.get(key)
+        if cached is None or cached[0].shape[1] < n_neighbors:
+            cached = queries[key] = self._model.kneighbors(X, n_neighbors=n_neighbors)
+        dist, ind = cached
+        return dist[:, :n_neighbors], ind[:, :n_neighbors]
+
+    def _neighbor_weights(self, dist):
+        weights = self._model.weights
+        if weights == "distance":
+            # same as sklearn: exact matches take all the weight
+            with np.errstate(divide="ignore"):
+                weights = 1.0 / dist
+            inf_mask = np.isinf(weights)
+            inf_row = np.any(inf_mask, axis=1)
+            weights[inf_row] = inf_mask[inf_row]
+            return weights
+        if callable(weights):
+            return weights(dist)
+        return np.ones_like(dist)
+
+    def _predict_from_neighbors(self, dist, ind, proba=False):
+        """Predict from the neighbors of each instance."""
+        weights = self._neighbor_weights(dist)
+        y = self._y[ind]
+        if self._task not in CLASSIFICATION:
+            return (y * weights).sum(axis=1) / weights.sum(axis=1)
+        n, n_classes = ind.shape[0], len(self._model.classes_)
+        votes = np.bincount(
+            (np.arange(n)[:, None] * n_classes + y).ravel(),
+            weights=weights.ravel(),
+            minlength=n * n_classes,
+        ).reshape(n, n_classes)
+        if not proba:
+            return self._model.classes_[votes.argmax(axis=1)]
+        normalizer = votes.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        return votes / normalizer
+
+    def batch_predict(self, config: dict, X, proba: bool = False, max_batch=64):
+        """Predict with other n_neighbors in the same pass as the trial's.
+
+        Neighbors are queried once for the largest n_neighbors, up to twice the
+        trial's value, and the votes are accumulated over the sorted neighbors,
+        so the predictions for every smaller n_neighbors are prefix results.
+
+        Args:
+            config: A dictionary of the trial's config.
+            X: A numpy array or a dataframe of featurized instances.
+            proba: A bool of whether to predict class probabilities.
+            max_batch: An integer of the maximal number of n_neighbors values,
+                beyond which they are spaced geometrically.
+
+        Returns:
+            A list of (config, prediction) tuples.
+        """
+        if self._index_key is None or not isinstance(
+            self._model, self.estimator_class
+        ):
+            return []
+        n_neighbors = self._model.n_neighbors
+        upper = min(2 * n_neighbors, 512, len(self._y) // 2)
+        if upper <= max_batch:
+            grid = set(range(1, upper + 1))
+        else:
+            grid = set(np.geomspace(1, upper, max_batch).astype(int))
+        grid.discard(n_neighbors)
+        if not grid:
+            return []
+        X = self._preprocess(X)
+        # the validation data of later trials is usually the same
+        dist, ind = self._kneighbors(X, max(grid), _data_fingerprint(X))
+        weights = self._neighbor_weights(dist)
+        y = self._y[ind]
+        classification = self._task in CLASSIFICATION
+        if classification:
+            n, n_classes = ind.shape[0], len(self._model.classes_)
+            rows = np.arange(n)
+            votes = np.zeros((n, n_classes))
+        else:
+            votes = np.zeros(ind.shape[0])
+        weight_sum = np.zeros(ind.shape[0])
+        batch = []
+        for k in range(1, max(grid) + 1):
+            # add the k-th nearest neighbor's vote
+            if classification:
+                votes[rows, y[:, k - 1]] += weights[:, k - 1]
+            else:
+                votes += y[:, k - 1] * weights[:, k - 1]
+            weight_sum += weights[:, k - 1]
+            if k not in grid:
+                continue
+            if not classification:
+                pred = votes / weight_sum
+            elif proba:
+                normalizer = votes.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                pred = votes / normalizer
+            else:
+                pred = self._model.classes_[votes.argmax(axis=1)]
+            batch.append(({**config, "n_neighbors": k}, pred))
+        return batch
+
+    def predict(self, X_test):
+        if self._index_key is None or not isinstance(
+            self._model, self.estimator_class
+        ):
+            return super().predict(X_test)
+        X_test = self._preprocess(X_test)
+        dist, ind = self._kneighbors(X_test, self._model.n_neighbors)
+        return self._predict_from_neighbors(dist, ind)
+
+    def predict_proba(self, X_test):
+        assert (
+            self._task in CLASSIFICATION
+        ), "predict_prob() only for classification task."
+        if self._index_key is None or not isinstance(
+            self._model, self.estimator_class
+        ):
+            return super().predict_proba(X_test)
+        X_test = self._preprocess(X_test)
+        dist, ind = self._kneighbors(X_test, self._model.n_neighbors)
+        return self._predict_from_neighbors(dist, ind, proba=True)
 
     def _preprocess(self, X):
         if isinstance(X, DataFrame):
@@ -1371,9 +1824,44 @@ class Prophet(SKLearnEstimator):
             return np.ones(X_test.shape[0])
 
 
+def _fit_ts_model(model_class, endog, exog, order_kwargs):
+    """Fit a statsmodels time series model, in a worker process when called
+    by ARIMA.batch_predict."""
+    import warnings
+
+    warnings.filterwarnings("ignore")
+    model = model_class(
+        endog,
+        exog=exog,
+        enforce_stationarity=False,
+        enforce_invertibility=False,
+        **order_kwargs,
+    )
+    with suppress_stdout_stderr():
+        return model.fit()
+
+
+def _timed_fit_ts_model(model_class, endog, exog, order_kwargs):
+    """Fit a statsmodels time series model and return it with the fit time."""
+    start_time = time.time()
+    model = _fit_ts_model(model_class, endog, exog, order_kwargs)
+    return model, time.time() - start_time
+
+
 class ARIMA(Prophet):
     """The class for tuning ARIMA."""
 
+    # the orders varied by batch_predict, which keep the differencing orders
+    ORDER_HPS = ("p", "q")
+    # (fitted model, fit time) of recent orders and training data, so that
+    # rerunning an order evaluated by batch_predict is free; cleared by init()
+    # at the start and end of every AutoML run
+    _fit_cache = _BoundedCache(16)
+
+    @classmethod
+    def init(cls):
+        ARIMA._fit_cache.clear()
+
     @classmethod
     def search_space(cls, **params):
         space = {
@@ -1395,6 +1883,27 @@ class ARIMA(Prophet):
         }
         return space
 
+    def __init__(self, task=TS_FORECAST, n_jobs=1, **params):
+        super().__init__(task, **params)
+        self._n_jobs = n_jobs
+        self._endog = self._exog = None
+
+    @staticmethod
+    def _model_class():
+        from statsmodels.tsa.arima.model import ARIMA as ARIMA_estimator
+
+        return ARIMA_estimator
+
+    def _order_kwargs(self, params: dict) -> dict:
+        return {"order": (int(params["p"]), int(params["d"]), int(params["q"]))}
+
+    def _cache_key(self, params: dict):
+        return (
+            self.__class__.__name__,
+            self._data_key,
+            str(sorted(self._order_kwargs(params).items())),
+        )
+
     def _join(self, X_train, y_train):
         train_df = super()._join(X_train, y_train)
         train_df.index = pd.to_datetime(train_df[TS_TIMESTAMP_COL])
@@ -1402,37 +1911,130 @@ class ARIMA(Prophet):
         return train_df
 
     def fit(self, X_train, y_train, budget=None, **kwargs):
-        import warnings
-
-        warnings.filterwarnings("ignore")
-        from statsmodels.tsa.arima.model import ARIMA as ARIMA_estimator
-
         current_time = time.time()
         train_df = self._join(X_train, y_train)
         train_df = self._preprocess(train_df)
         regressors = list(train_df)
         regressors.remove(TS_VALUE_COL)
-        if regressors:
-            model = ARIMA_estimator(
-                train_df[[TS_VALUE_COL]],
-                exog=train_df[regressors],
-                order=(self.params["p"], self.params["d"], self.params["q"]),
-                enforce_stationarity=False,
-                enforce_invertibility=False,
+        # kept for fitting other orders on the same data in batch_predict
+        self._endog = train_df[[TS_VALUE_COL]]
+        self._exog = train_df[regressors] if regressors else None
+        self._data_key = _data_fingerprint(train_df)
+        key = self._cache_key(self.params)
+        cached = ARIMA._fit_cache.get(key)
+        if cached is None:
+            model = _fit_ts_model(
+                self._model_class(),
+                self._endog,
+                self._exog,
+                self._order_kwargs(self.params),
             )
+            train_time = time.time() - current_time
+            ARIMA._fit_cache[key] = model, train_time
         else:
-            model = ARIMA_estimator(
-                train_df,
-                order=(self.params["p"], self.params["d"], self.params["q"]),
-                enforce_stationarity=False,
-                enforce_invertibility=False,
-            )
-        with suppress_stdout_stderr():
-            model = model.fit()
-        train_time = time.time() - current_time
+            # the cost of the order is the time of its original fit
+            model, train_time = cached
         self._model = model
+        self._fit_time = train_time
+        self._deadline = current_time + budget if budget else np.inf
         return train_time
 
+    def cleanup(self):
+        super().cleanup()
+        self._endog = self._exog = None
+
+    def batch_predict(self, config: dict, X, proba: bool = False, max_batch=8):
+        """Forecast with the neighboring orders of the trial's, fitted
+        concurrently in worker processes.
+
+        The neighbors differ by one in one of ORDER_HPS, so that they share
+        the differencing orders of the trial, and they are fitted on the
+        endogenous and exogenous data joined once in fit(). Orders already
+        fitted on the same data are skipped. The fits are capped by the
+        budget of the trial: only as many orders as the workers are expected
+        to fit in the remaining time are started, and unfinished ones are
+        terminated at the deadline.
+
+        Args:
+            config: A dictionary of the trial's config.
+            X: A dataframe of the timestamps and exogenous data to forecast.
+            proba: Unused.
+            max_batch: An integer of the maximal number of orders to fit.
+
+        Returns:
+            A list of (config, prediction) tuples.
+        """
+        import multiprocessing
+
+        endog, exog = self._endog, self._exog
+        if endog is None or self._model is None:
+            return []
+        self._endog = self._exog = None
+        space = self.search_space()
+        candidates = []
+        for name in self.ORDER_HPS:
+            domain = space[name]["domain"]
+            for step in (-1, 1):
+                candidate = {**config, name: config[name] + step}
+                if (
+                    domain.lower <= candidate[name] <= domain.upper
+                    and self._cache_key(candidate) not in ARIMA._fit_cache
+                ):
+                    candidates.append(candidate)
+        n_jobs = os.cpu_count() if self._n_jobs < 0 else max(self._n_jobs, 1)
+        # daemonic processes, e.g., the workers of parallel trials, can not
+        # have children
+        if multiprocessing.current_process().daemon:
+            n_jobs = 1
+        n_workers = min(n_jobs, len(candidates))
+        remaining = self._deadline - time.time()
+        if remaining < np.inf:
+            rounds = int(remaining / max(self._fit_time, 1e-3))
+            candidates = candidates[: rounds * n_workers]
+        candidates = candidates[:max_batch]
+        if not candidates:
+            return []
+        args = [
+            (self._model_class(), endog, exog, self._order_kwargs(candidate))
+            for candidate in candidates
+        ]
+        fitted = []
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            try:
+                pending = [pool.apply_async(_timed_fit_ts_model, arg) for arg in args]
+                for result in pending:
+                    result.wait(
+                        max(self._deadline - time.time(), 0)
+                        if self._deadline < np.inf
+                        else None
+                    )
+                    fitted.append(
+                        result.get() if result.ready() and result.successful() else None
+                    )
+            finally:
+                pool.terminate()
+        else:
+            for arg in args:
+                if time.time() + self._fit_time > self._deadline:
+                    break
+                try:
+                    fitted.append(_timed_fit_ts_model(*arg))
+                except (ValueError, np.linalg.LinAlgError):
+                    fitted.append(None)
+        batch = []
+        model = self._model
+        try:
+            for candidate, candidate_fit in zip(candidates, fitted):
+                if candidate_fit is None:
+                    continue
+                ARIMA._fit_cache[self._cache_key(candidate)] = candidate_fit
+                self._model = candidate_fit[0]
+                batch.append((candidate, self.predict(X)))
+        finally:
+            self._model = model
+        return batch
+
     def predict(self, X_test):
         if self._model is not None:
             if isinstance(X_test, int):
@@ -1443,7 +2045,6 @@ class ARIMA(Prophet):
                 if len(X_test.columns) > 1:
                     X_test = self._preprocess(X_test.drop(columns=TS_TIMESTAMP_COL))
                     regressors = list(X_test)
-                    print(start, end, X_test.shape)
                     forecast = self._model.predict(
                         start=start, end=end, exog=X_test[regressors]
                     )
@@ -1462,6 +2063,8 @@ class ARIMA(Prophet):
 class SARIMAX(ARIMA):
     """The class for tuning SARIMA."""
 
+    ORDER_HPS = ("p", "q", "P", "Q")
+
     @classmethod
     def search_space(cls, **params):
         space = {
@@ -1502,49 +2105,21 @@ class SARIMAX(ARIMA):
         }
         return space
 
-    def fit(self, X_train, y_train, budget=None, **kwargs):
-        import warnings
-
-        warnings.filterwarnings("ignore")
+    @staticmethod
+    def _model_class():
         from statsmodels.tsa.statespace.sarimax import SARIMAX as SARIMAX_estimator
 
-        current_time = time.time()
-        train_df = self._join(X_train, y_train)
-        train_df = self._preprocess(train_df)
-        regressors = list(train_df)
-        regressors.remove(TS_VALUE_COL)
-        if regressors:
-            model = SARIMAX_estimator(
-                train_df[[TS_VALUE_COL]],
-                exog=train_df[regressors],
-                order=(self.params["p"], self.params["d"], self.params["q"]),
-                seasonality_order=(
-                    self.params["P"],
-                    self.params["D"],
-                    self.params["Q"],
-                    self.params["s"],
-                ),
-                enforce_stationarity=False,
-                enforce_invertibility=False,
-            )
-        else:
-            model = SARIMAX_estimator(
-                train_df,
-                order=(self.params["p"], self.params["d"], self.params["q"]),
-                seasonality_order=(
-                    self.params["P"],
-                    self.params["D"],
-                    self.params["Q"],
-                    self.params["s"],
-                ),
-                enforce_stationarity=False,
-                enforce_invertibility=False,
-            )
-        with suppress_stdout_stderr():
-            model = model.fit()
-        train_time = time.time() - current_time
-        self._model = model
-        return train_time
+        return SARIMAX_estimator
+
+    def _order_kwargs(self, params: dict) -> dict:
+        kwargs = super()._order_kwargs(params)
+        kwargs["seasonal_order"] = (
+            int(params["P"]),
+            int(params["D"]),
+            int(params["Q"]),
+            int(params["s"]),
+        )
+        return kwargs
 
 
 class suppress_stdout_stderr(object):
@@ -0,0 +1,147 @@
+import os
+import shutil
+import uuid
+import weakref
+
+TRIAL_DIR_PREFIX = "trial_"
+_checkpoint_managers = {}
+
+
+class CheckpointManager:
+    """Retains the checkpoints of the best trials of an NLP search on disk.
+
+    Every trial writes its checkpoints to its own directory under output_dir.
+    Only the best keep_per_trial checkpoints of a trial are retained, and the
+    directories of all but the best keep_trials trials are removed, except
+    those pinned by estimators which have not loaded their checkpoint yet.
+    """
+
+    def __init__(self, output_dir, keep_per_trial=1, keep_trials=1):
+        self.output_dir = output_dir
+        self.keep_per_trial = keep_per_trial
+        self.keep_trials = keep_trials
+        self._trials = []  # (loss, -order, trial_dir)
+        self._running = set()
+        self._pinned = {}  # trial_dir -> the number of estimators pinning it
+        self._evicted = set()  # pinned directories to remove once unpinned
+        self._count = 0
+        self.cleanup_orphans()
+
+    def new_trial_dir(self) -> str:
+        """Create the output directory of a new trial."""
+        trial_dir = os.path.join(
+            self.output_dir,
+            f"{TRIAL_DIR_PREFIX}{os.getpid()}_{uuid.uuid4().hex[:8]}",
+        )
+        self._running.add(trial_dir)
+        return trial_dir
+
+    def remove(self, trial_dir: str):
+        """Remove the directory of a failed or discarded trial."""
+        self._running.discard(trial_dir)
+        shutil.rmtree(trial_dir, ignore_errors=True)
+
+    def prune_trial(
+        self, trial_dir: str, ckpt_to_metric: dict, metric_name: str, selected: str
+    ):
+        """Remove all but the selected and the best checkpoints of a trial."""
+        from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
+
+        if not os.path.isdir(trial_dir):
+            return
+        ckpts = [
+            os.path.join(trial_dir, name)
+            for name in os.listdir(trial_dir)
+            if name.startswith(PREFIX_CHECKPOINT_DIR)
+        ]
+        ckpts.sort(
+            key=lambda ckpt: ckpt_to_metric.get(ckpt, {}).get(metric_name, float("inf"))
+        )
+        keep = set(ckpts[: self.keep_per_trial])
+        keep.add(selected)
+        for ckpt in ckpts:
+            if ckpt not in keep:
+                shutil.rmtree(ckpt, ignore_errors=True)
+
+    def retains(self, loss: float) -> bool:
+        """Whether register() would retain the directory of a trial with loss."""
+        return sum(trial[0] < loss for trial in self._trials) < self.keep_trials
+
+    def register(self, trial_dir: str, loss: float):
+        """Record a finished trial and remove the worst trial beyond keep_trials.
+
+        Among trials with equal loss, the older one is removed first.
+        """
+        self._running.discard(trial_dir)
+        self._count += 1
+        self._trials.append((loss, -self._count, trial_dir))
+        while len(self._trials) > self.keep_trials:
+            worst = max(self._trials)
+            self._trials.remove(worst)
+            if worst[2] in self._pinned:
+                self._evicted.add(worst[2])
+            else:
+                shutil.rmtree(worst[2], ignore_errors=True)
+
+    def pin(self, trial_dir: str, estimator):
+        """Keep the directory of a trial while estimator, which loads its
+        checkpoint on the first predict, is referenced."""
+        self._pinned[trial_dir] = self._pinned.get(trial_dir, 0) + 1
+        weakref.finalize(estimator, self._unpin, trial_dir)
+
+    def _unpin(self, trial_dir: str):
+        self._pinned[trial_dir] -= 1
+        if not self._pinned[trial_dir]:
+            del self._pinned[trial_dir]
+            if trial_dir in self._evicted:
+                self._evicted.remove(trial_dir)
+                shutil.rmtree(trial_dir, ignore_errors=True)
+
+    def cleanup_orphans(self):
+        """Remove trial directories under output_dir which are not tracked,
+        e.g., those left by an interrupted search.
+
+        Directories of other processes which are still alive, such as concurrent
+        trial workers, are left alone.
+        """
+        if not os.path.isdir(self.output_dir):
+            return
+        tracked = self._running.union(
+            self._pinned, (trial[2] for trial in self._trials)
+        )
+        pid = os.getpid()
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if (
+                not name.startswith(TRIAL_DIR_PREFIX)
+                or path in tracked
+                or not os.path.isdir(path)
+            ):
+                continue
+            owner = name[len(TRIAL_DIR_PREFIX) :].split("_")[0]
+            if owner.isdigit() and int(owner) != pid and _pid_exists(int(owner)):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _pid_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def get_checkpoint_manager(custom_hpo_args) -> CheckpointManager:
+    """Get the checkpoint manager of an output directory, one per process."""
+    key = os.path.abspath(custom_hpo_args.output_dir)
+    manager = _checkpoint_managers.get(key)
+    if manager is None:
+        manager = _checkpoint_managers[key] = CheckpointManager(
+            custom_hpo_args.output_dir
+        )
+    manager.keep_per_trial = custom_hpo_args.ckpt_keep_per_trial
+    manager.keep_trials = custom_hpo_args.ckpt_keep_trials
+    return manager
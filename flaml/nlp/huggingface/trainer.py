@@ -7,6 +7,22 @@ except ImportError:
 
 
 class TrainerForAuto(TFTrainer):
+    def __init__(self, *args, metric_name=None, keep_best_state=False, **kwargs):
+        """Constructor.
+
+        Args:
+            metric_name: A string of the loss metric to select checkpoints by.
+            keep_best_state: A bool of whether to keep the state dict of the
+                best evaluated model in memory, so checkpoints need not be saved.
+        """
+        super().__init__(*args, **kwargs)
+        self.metric_name = metric_name
+        self.keep_best_state = keep_best_state
+        self.best_state = None
+        self.best_ckpt = None
+        self.ckpt_to_global_step = {}
+        self.ckpt_to_metric = {}
+
     def evaluate(self, eval_dataset=None, ignore_keys=None, metric_key_prefix="eval"):
         """Overriding transformers.Trainer.evaluate by saving metrics and checkpoint path"""
         from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
@@ -22,10 +38,20 @@ class TrainerForAuto(TFTrainer):
             for key in list(metrics.keys()):
                 if key.startswith("eval_"):
                     metrics[key[5:]] = metrics.pop(key)
-        if hasattr(self, "ckpt_to_global_step"):
-            self.ckpt_to_global_step[ckpt_dir] = self.state.global_step
-            if metrics:
-                self.ckpt_to_metric[ckpt_dir] = metrics
-        else:
-            self.ckpt_to_global_step = {ckpt_dir: self.state.global_step}
-            self.ckpt_to_metric = {ckpt_dir: metrics} if metrics else {}
+        self.ckpt_to_global_step[ckpt_dir] = self.state.global_step
+        if metrics:
+            self.ckpt_to_metric[ckpt_dir] = metrics
+            if self.keep_best_state and self.metric_name in metrics:
+                self._update_best_state(ckpt_dir, metrics[self.metric_name])
+
+    def _update_best_state(self, ckpt_dir, loss):
+        if (
+            self.best_ckpt is not None
+            and loss >= self.ckpt_to_metric[self.best_ckpt][self.metric_name]
+        ):
+            return
+        self.best_ckpt = ckpt_dir
+        self.best_state = {
+            name: tensor.detach().cpu().clone()
+            for name, tensor in self.model.state_dict().items()
+        }
@@ -1,6 +1,7 @@
 import argparse
 from dataclasses import dataclass, field
 from ..data import SEQCLASSIFICATION, SEQREGRESSION
+from ..model import _BoundedCache, _data_fingerprint
 
 
 def _is_nlp_task(task):
@@ -10,7 +11,16 @@ def _is_nlp_task(task):
         return False
 
 
-global tokenized_column_names
+# tokenized inputs are reused across trials and folds of one run
+_tokenizer_cache = {}
+_tokenized_cache = _BoundedCache(32)
+TOKENIZE_BATCH_SIZE = 1000
+
+
+def clear_cache():
+    """Release the tokenized inputs and the pretrained weights in memory."""
+    _tokenized_cache.clear()
+    _pretrained_state_cache.clear()
 
 
 def tokenize_text(X, task, custom_hpo_task):
@@ -20,39 +30,61 @@ def tokenize_text(X, task, custom_hpo_task):
         return tokenize_text_seqclassification(X, custom_hpo_task)
 
 
-def tokenize_text_seqclassification(X, custom_hpo_args):
-    from transformers import AutoTokenizer
-    import pandas
-
-    global tokenized_column_names
+def get_tokenizer(model_path):
+    """Get the fast tokenizer of a model, loaded once per process."""
+    tokenizer = _tokenizer_cache.get(model_path)
+    if tokenizer is None:
+        from transformers import AutoTokenizer
 
-    this_tokenizer = AutoTokenizer.from_pretrained(
-        custom_hpo_args.model_path, use_fast=True
-    )
-    d = X.apply(
-        lambda x: tokenize_glue(x, this_tokenizer, custom_hpo_args),
-        axis=1,
-        result_type="expand",
-    )
-    X_tokenized = pandas.DataFrame(columns=tokenized_column_names)
-    X_tokenized[tokenized_column_names] = d
-    return X_tokenized
+        tokenizer = _tokenizer_cache[model_path] = AutoTokenizer.from_pretrained(
+            model_path, use_fast=True
+        )
+    return tokenizer
 
 
-def tokenize_glue(this_row, this_tokenizer, custom_hpo_args):
-    global tokenized_column_names
+def tokenize_text_seqclassification(X, custom_hpo_args):
     assert (
         "max_seq_length" in custom_hpo_args.__dict__
     ), "max_seq_length must be provided for glue"
+    key = (
+        custom_hpo_args.model_path,
+        custom_hpo_args.max_seq_length,
+        custom_hpo_args.pad_to_max_length,
+        # the tokenized frame keeps the index of X
+        _data_fingerprint(X, X.index.to_series()),
+    )
+    X_tokenized = _tokenized_cache.get(key)
+    if X_tokenized is None:
+        X_tokenized = _tokenize_glue(
+            X, get_tokenizer(custom_hpo_args.model_path), custom_hpo_args
+        )
+        _tokenized_cache[key] = X_tokenized
+    return X_tokenized
+
 
-    tokenized_example = this_tokenizer(
-        *tuple(this_row),
-        padding="max_length",
-        max_length=custom_hpo_args.max_seq_length,
-        truncation=True,
+def _tokenize_glue(X, this_tokenizer, custom_hpo_args):
+    """Tokenize the text columns of X in batches with the fast tokenizer.
+
+    Unless pad_to_max_length is set, sequences are only truncated here and
+    padded per batch by the data collator during training and inference.
+    """
+    import pandas
+
+    columns = [X[column].tolist() for column in X.columns]
+    tokenized = {}
+    for start in range(0, len(X), TOKENIZE_BATCH_SIZE):
+        tokenized_batch = this_tokenizer(
+            *(column[start : start + TOKENIZE_BATCH_SIZE] for column in columns),
+            padding="max_length" if custom_hpo_args.pad_to_max_length else False,
+            max_length=custom_hpo_args.max_seq_length,
+            truncation=True,
+        )
+        for name, value in tokenized_batch.items():
+            tokenized.setdefault(name, []).extend(value)
+    tokenized_column_names = sorted(tokenized.keys())
+    return pandas.DataFrame(
+        {name: tokenized[name] for name in tokenized_column_names}, index=X.index
     )
-    tokenized_column_names = sorted(tokenized_example.keys())
-    return [tokenized_example[x] for x in tokenized_column_names]
 
 
 def separate_config(config):
@@ -77,7 +109,50 @@ def get_num_labels(task, y_train):
         return len(set(y_train))
 
 
-def load_model(checkpoint_path, task, num_labels, per_model_config=None):
+# pretrained weights, keyed by (model path, num_labels), of the last two models
+_pretrained_state_cache = _BoundedCache(2)
+
+
+def _load_pretrained(checkpoint_path, model_config, use_cache):
+    """Load a pretrained model, copying cached weights in memory if possible.
+
+    Weights which are newly initialized by from_pretrained, e.g., those of a new
+    classification head, are not cached and stay randomly initialized.
+    """
+    from transformers import AutoModelForSequenceClassification
+
+    key = (checkpoint_path, model_config.num_labels)
+    pretrained_state = _pretrained_state_cache.get(key) if use_cache else None
+    if pretrained_state is not None:
+        this_model = AutoModelForSequenceClassification.from_config(model_config)
+        this_model.load_state_dict(pretrained_state, strict=False)
+        return this_model
+    this_model, loading_info = AutoModelForSequenceClassification.from_pretrained(
+        checkpoint_path, config=model_config, output_loading_info=True
+    )
+    if use_cache:
+        missing_keys = set(loading_info["missing_keys"])
+        _pretrained_state_cache[key] = {
+            name: tensor.detach().clone()
+            for name, tensor in this_model.state_dict().items()
+            if name not in missing_keys
+        }
+    return this_model
+
+
+def load_model(
+    checkpoint_path, task, num_labels, per_model_config=None, use_cache=False
+):
+    """Load a model for sequence classification or regression.
+
+    Args:
+        checkpoint_path: A string of the pretrained model path or a checkpoint.
+        task: A string of the task type.
+        num_labels: An integer of the number of labels.
+        per_model_config: A dictionary of the model config to override.
+        use_cache: A bool of whether to cache the weights of checkpoint_path
+            in memory for loading the same pretrained model again.
+    """
     from transformers import AutoConfig
     from .huggingface.switch_head_auto import (
         AutoSeqClassificationHead,
@@ -88,11 +163,7 @@ def load_model(checkpoint_path, task, num_labels, per_model_config=None):
     this_vocab_size = AutoConfig.from_pretrained(checkpoint_path).vocab_size
 
     def get_this_model():
-        from transformers import AutoModelForSequenceClassification
-
-        return AutoModelForSequenceClassification.from_pretrained(
-            checkpoint_path, config=model_config
-        )
+        return _load_pretrained(checkpoint_path, model_config, use_cache)
 
     def is_pretrained_model_in_classification_head_list(model_type):
         return model_type in MODEL_CLASSIFICATION_HEAD_MAPPING
@@ -175,6 +246,21 @@ class HPOArgs:
             An integer, the max length of the sequence
         ckpt_per_epoch (:obj:`int`, `optional`, defaults to :obj:`1`):
             An integer, the number of checkpoints per epoch
+        pad_to_max_length (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            A bool, whether to pad all sequences to max_seq_length when tokenizing;
+            if False, each batch is padded dynamically to its longest sequence
+        group_by_length (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            A bool, whether to group training examples of similar length into
+            the same batch to reduce padding
+        eval_batch_size (:obj:`int`, `optional`, defaults to :obj:`64`):
+            An integer, the batch size for evaluation and prediction
+        ckpt_keep_per_trial (:obj:`int`, `optional`, defaults to :obj:`1`):
+            An integer, the number of best checkpoints kept on disk per trial
+        ckpt_keep_trials (:obj:`int`, `optional`, defaults to :obj:`1`):
+            An integer, the number of best trials whose checkpoints are kept on disk
+        ckpt_in_memory (:obj:`bool`, `optional`, defaults to :obj:`False`):
+            A bool, whether to track the best model state in memory instead of
+            saving checkpoints to disk
 
     """
 
@@ -193,6 +279,31 @@ class HPOArgs:
 
     ckpt_per_epoch: int = field(default=1, metadata={"help": "checkpoint per epoch"})
 
+    pad_to_max_length: bool = field(
+        default=False, metadata={"help": "whether to pad all sequences to max length"}
+    )
+
+    group_by_length: bool = field(
+        default=False,
+        metadata={"help": "whether to batch training examples of similar length"},
+    )
+
+    eval_batch_size: int = field(
+        default=64, metadata={"help": "batch size for evaluation and prediction"}
+    )
+
+    ckpt_keep_per_trial: int = field(
+        default=1, metadata={"help": "number of checkpoints kept per trial"}
+    )
+
+    ckpt_keep_trials: int = field(
+        default=1, metadata={"help": "number of best trials with checkpoints kept"}
+    )
+
+    ckpt_in_memory: bool = field(
+        default=False, metadata={"help": "whether to keep the best model in memory"}
+    )
+
     @staticmethod
     def load_args():
         from dataclasses import fields
@@ -0,0 +1,123 @@
+"""Vectorized ranking metrics over query groups.
+
+The instances of a query group are contiguous. All the groups are ranked at
+once by sorting on (group, -score), and the per-group sums are segment
+reductions over the sorted arrays, so the cost is one sort for any number of
+groups.
+"""
+import numpy as np
+
+
+def group_offsets(groups, n=None) -> np.ndarray:
+    """The offsets of the contiguous runs of equal group labels.
+
+    Args:
+        groups: None or a 1d array-like of the group labels.
+        n: An integer of the number of instances, used when groups is None
+            to make a single group.
+
+    Returns:
+        A 1d numpy array of the start of every group followed by the total
+        number of instances.
+    """
+    if groups is None:
+        return np.array([0, n])
+    groups = np.asarray(groups)
+    return np.concatenate(
+        [[0], np.flatnonzero(groups[1:] != groups[:-1]) + 1, [len(groups)]]
+    )
+
+
+def _sorted_by_score(y_score, offsets):
+    """Sort within the groups by descending score, keeping the order of ties.
+
+    Returns:
+        The sorting indices, the group of every position and the rank of every
+        position within its group, starting from 0.
+    """
+    group = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    order = np.lexsort((-np.asarray(y_score, dtype=float), group))
+    rank = np.arange(len(group)) - offsets[group]
+    return order, group, rank
+
+
+def ndcg(y_true, y_score, offsets, k=None) -> np.ndarray:
+    """NDCG@k of every group, with the gains of tied scores averaged as
+    sklearn.metrics.ndcg_score does; 0 for groups without relevant instances.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    order, group, rank = _sorted_by_score(y_score, offsets)
+    n_groups = len(offsets) - 1
+    discount = 1 / np.log2(rank + 2)
+    if k is not None:
+        discount[rank >= k] = 0
+    ideal = np.lexsort((-y_true, group))
+    ideal_dcg = np.bincount(group, y_true[ideal] * discount, minlength=n_groups)
+    # runs of tied scores within a group share their mean gain
+    score = np.asarray(y_score, dtype=float)[order]
+    new_run = np.ones(len(order), dtype=bool)
+    new_run[1:] = (score[1:] != score[:-1]) | (group[1:] != group[:-1])
+    run = np.cumsum(new_run) - 1
+    run_gain = np.bincount(run, y_true[order]) / np.bincount(run)
+    run_discount = np.bincount(run, discount)
+    dcg = np.bincount(group[new_run], run_gain * run_discount, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ideal_dcg > 0, dcg / ideal_dcg, 0.0)
+
+
+def average_precision(y_true, y_score, offsets, k=None) -> np.ndarray:
+    """AP@k of every group with positive labels as relevant, normalized by
+    min(k, #relevant); 0 for groups without relevant instances."""
+    order, group, rank = _sorted_by_score(y_score, offsets)
+    n_groups = len(offsets) - 1
+    relevant = (np.asarray(y_true)[order] > 0).astype(float)
+    cumsum = np.cumsum(relevant)
+    hits = cumsum - (cumsum - relevant)[offsets[:-1]][group]
+    precision = hits / (rank + 1) * relevant
+    n_relevant = np.bincount(group, relevant, minlength=n_groups)
+    if k is not None:
+        precision[rank >= k] = 0
+        n_relevant = np.minimum(n_relevant, k)
+    total = np.bincount(group, precision, minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(n_relevant > 0, total / n_relevant, 0.0)
+
+
+def reciprocal_rank(y_true, y_score, offsets, k=None) -> np.ndarray:
+    """The reciprocal rank of the first relevant instance in the top k of
+    every group, with positive labels as relevant; 0 if there is none."""
+    order, group, rank = _sorted_by_score(y_score, offsets)
+    relevant = np.asarray(y_true)[order] > 0
+    if k is not None:
+        relevant &= rank < k
+    return np.maximum.reduceat(np.where(relevant, 1 / (rank + 1), 0.0), offsets[:-1])
+
+
+RANK_METRICS = {
+    "ndcg": ndcg,
+    "map": average_precision,
+    "mrr": reciprocal_rank,
+}
+
+
+def rank_metric_score(metric_name, y_true, y_score, groups=None) -> float:
+    """The mean of a ranking metric over the query groups.
+
+    Args:
+        metric_name: A string of 'ndcg', 'map' or 'mrr', optionally with a
+            cutoff, e.g., 'ndcg@5'.
+        y_true: A 1d array-like of the relevance labels.
+        y_score: A 1d array-like of the predicted scores.
+        groups: None or a 1d array-like of the group labels, in which the
+            instances of a group are contiguous. None means a single group.
+
+    Returns:
+        A float of the mean metric over the groups.
+    """
+    name, _, k = metric_name.partition("@")
+    offsets = group_offsets(groups, len(y_true))
+    if offsets[-1] == 0:
+        return 0.0
+    return float(
+        np.mean(RANK_METRICS[name](y_true, y_score, offsets, int(k) if k else None))
+    )
@@ -1,2 +1,4 @@
 from .trial_scheduler import TrialScheduler
 from .online_scheduler import OnlineScheduler, OnlineSuccessiveDoublingScheduler, ChaChaScheduler
+from .async_hyperband import AsyncHyperBandScheduler, ASHAScheduler
+from .median_stopping_rule import MedianStoppingRule
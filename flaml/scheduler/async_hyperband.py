@@ -0,0 +1,179 @@
+# Copyright 2020 The Ray Authors.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This source file is adapted here because ray does not fully support Windows.
+
+# Copyright (c) Microsoft Corporation.
+from typing import Dict, Optional
+import numpy as np
+import logging
+from .trial_scheduler import TrialScheduler
+from flaml.tune.trial import Trial
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHyperBandScheduler(TrialScheduler):
+    """Implements the Async Successive Halving (ASHA) early stopping rule.
+
+    Used by `flaml.tune.run` when `report_intermediate_result=True` and
+    ray is not used as the backend.
+    """
+
+    def __init__(
+        self,
+        time_attr: Optional[str] = "training_iteration",
+        metric: Optional[str] = None,
+        mode: Optional[str] = None,
+        max_t: Optional[float] = 100,
+        grace_period: Optional[float] = 1,
+        reduction_factor: Optional[float] = 4,
+        brackets: Optional[int] = 1,
+        seed: Optional[int] = None,
+    ):
+        """Constructor.
+
+        Args:
+            time_attr: A string of the training result attribute used for
+                comparing time, e.g., 'training_iteration', or the prune_attr.
+            metric: A string of the metric name to optimize for.
+            mode: A string in ['min', 'max'] to specify the objective as
+                minimization or maximization.
+            max_t: A float of the maximal time units per trial. Trials will
+                be stopped after max_t time units have passed.
+            grace_period: A float of the minimal time units before a trial
+                can be stopped.
+            reduction_factor: A float of the halving rate and amount.
+            brackets: An integer of the number of brackets. Each bracket has a
+                different halving rate, specified by the reduction factor.
+            seed: An integer of the random seed for bracket assignment.
+        """
+        assert max_t > 0, "Max (time_attr) not valid!"
+        assert max_t >= grace_period, "grace_period must be <= max_t!"
+        assert grace_period > 0, "grace_period must be positive!"
+        assert reduction_factor > 1, "Reduction Factor not valid!"
+        assert brackets > 0, "brackets must be positive!"
+        self._time_attr = time_attr
+        self._max_t = max_t
+        self._reduction_factor = reduction_factor
+        self._brackets = [
+            _Bracket(grace_period, max_t, reduction_factor, s)
+            for s in range(brackets)
+        ]
+        self._trial_info = {}  # trial_id: str -> bracket: _Bracket
+        self._num_stopped = 0
+        self._rs = np.random.RandomState(seed)
+        self.set_search_properties(metric, mode)
+
+    def set_search_properties(
+        self, metric: Optional[str] = None, mode: Optional[str] = None
+    ) -> bool:
+        if metric:
+            self._metric = metric
+        elif not hasattr(self, "_metric"):
+            self._metric = None
+        if mode:
+            assert mode in ["min", "max"], "`mode` must be 'min' or 'max'."
+            self._mode = mode
+        elif not hasattr(self, "_mode"):
+            self._mode = "min"
+        # rewards are maximized inside the brackets
+        self._metric_op = 1.0 if self._mode == "max" else -1.0
+        return True
+
+    @property
+    def num_stopped(self) -> int:
+        """The number of trials stopped early."""
+        return self._num_stopped
+
+    def on_trial_add(self, trial_runner, trial: Trial):
+        sizes = np.array([len(b.rungs) for b in self._brackets])
+        probs = np.e ** (sizes - sizes.max())
+        normalized = probs / probs.sum()
+        idx = self._rs.choice(len(self._brackets), p=normalized)
+        self._trial_info[trial.trial_id] = self._brackets[idx]
+
+    def on_trial_result(self, trial_runner, trial: Trial, result: Dict) -> str:
+        action = TrialScheduler.CONTINUE
+        if self._time_attr not in result or self._metric not in result:
+            return action
+        if result[self._time_attr] >= self._max_t:
+            action = TrialScheduler.STOP
+        else:
+            bracket = self._trial_info.get(trial.trial_id)
+            if bracket is None:
+                return action
+            action = bracket.on_result(
+                trial.trial_id,
+                result[self._time_attr],
+                self._metric_op * result[self._metric],
+            )
+        if action == TrialScheduler.STOP:
+            self._num_stopped += 1
+        return action
+
+    def on_trial_complete(self, trial_runner, trial: Trial, result: Dict):
+        bracket = self._trial_info.pop(trial.trial_id, None)
+        if (
+            bracket is None
+            or not result
+            or self._time_attr not in result
+            or self._metric not in result
+        ):
+            return
+        bracket.on_result(
+            trial.trial_id,
+            result[self._time_attr],
+            self._metric_op * result[self._metric],
+        )
+
+    def on_trial_remove(self, trial_runner, trial: Trial):
+        self._trial_info.pop(trial.trial_id, None)
+
+
+class _Bracket:
+    """Bookkeeping system to track the cutoffs.
+
+    Rungs are created in reversed order so that we can more easily find
+    the correct rung corresponding to the current iteration of the result.
+    """
+
+    def __init__(
+        self, min_t: float, max_t: float, reduction_factor: float, s: int
+    ):
+        self.rf = reduction_factor
+        max_rungs = int(np.log(max_t / min_t) / np.log(self.rf) - s + 1)
+        self.rungs = [
+            (min_t * self.rf ** (k + s), {}) for k in reversed(range(max_rungs))
+        ]
+
+    def cutoff(self, recorded: Dict) -> Optional[float]:
+        if not recorded:
+            return None
+        return np.nanpercentile(list(recorded.values()), (1 - 1 / self.rf) * 100)
+
+    def on_result(self, trial_id: str, cur_iter: float, cur_rew: float) -> str:
+        action = TrialScheduler.CONTINUE
+        for milestone, recorded in self.rungs:
+            if cur_iter < milestone or trial_id in recorded:
+                continue
+            cutoff = self.cutoff(recorded)
+            if cutoff is not None and cur_rew < cutoff:
+                action = TrialScheduler.STOP
+            recorded[trial_id] = cur_rew
+            break
+        return action
+
+
+ASHAScheduler = AsyncHyperBandScheduler
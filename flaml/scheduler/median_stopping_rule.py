@@ -0,0 +1,124 @@
+# Copyright 2020 The Ray Authors.
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# This source file is adapted here because ray does not fully support Windows.
+
+# Copyright (c) Microsoft Corporation.
+from typing import Dict, Optional
+import numpy as np
+import logging
+from .trial_scheduler import TrialScheduler
+from flaml.tune.trial import Trial
+
+logger = logging.getLogger(__name__)
+
+
+class MedianStoppingRule(TrialScheduler):
+    """Implements the median stopping rule.
+
+    A trial is stopped if its best result so far is worse than the median
+    of the running averages of all the other trials at the same point.
+    """
+
+    def __init__(
+        self,
+        time_attr: Optional[str] = "training_iteration",
+        metric: Optional[str] = None,
+        mode: Optional[str] = None,
+        grace_period: Optional[float] = 1,
+        min_samples_required: Optional[int] = 3,
+    ):
+        """Constructor.
+
+        Args:
+            time_attr: A string of the training result attribute used for
+                comparing time, e.g., 'training_iteration', or the prune_attr.
+            metric: A string of the metric name to optimize for.
+            mode: A string in ['min', 'max'] to specify the objective as
+                minimization or maximization.
+            grace_period: A float of the minimal time units before a trial
+                can be stopped.
+            min_samples_required: An integer of the minimal number of other
+                trials needed to compute the median.
+        """
+        self._time_attr = time_attr
+        self._grace_period = grace_period
+        self._min_samples_required = min_samples_required
+        self._results = {}  # trial_id: str -> [(time, value)]
+        self._num_stopped = 0
+        self.set_search_properties(metric, mode)
+
+    def set_search_properties(
+        self, metric: Optional[str] = None, mode: Optional[str] = None
+    ) -> bool:
+        if metric:
+            self._metric = metric
+        elif not hasattr(self, "_metric"):
+            self._metric = None
+        if mode:
+            assert mode in ["min", "max"], "`mode` must be 'min' or 'max'."
+            self._mode = mode
+        elif not hasattr(self, "_mode"):
+            self._mode = "min"
+        # values are minimized after multiplied by metric_op
+        self._metric_op = 1.0 if self._mode == "min" else -1.0
+        return True
+
+    @property
+    def num_stopped(self) -> int:
+        """The number of trials stopped early."""
+        return self._num_stopped
+
+    def on_trial_result(self, trial_runner, trial: Trial, result: Dict) -> str:
+        if self._time_attr not in result or self._metric not in result:
+            return TrialScheduler.CONTINUE
+        time = result[self._time_attr]
+        history = self._results.setdefault(trial.trial_id, [])
+        history.append((time, self._metric_op * result[self._metric]))
+        if time < self._grace_period:
+            return TrialScheduler.CONTINUE
+        running_means = [
+            self._running_mean(other, time)
+            for trial_id, other in self._results.items()
+            if trial_id != trial.trial_id and other[-1][0] >= time
+        ]
+        if len(running_means) < self._min_samples_required:
+            return TrialScheduler.CONTINUE
+        median = np.median(running_means)
+        best = min(value for _, value in history)
+        if best > median:
+            logger.debug(
+                f"MedianStoppingRule: stopping trial {trial.trial_id} "
+                f"at {self._time_attr}={time}"
+            )
+            self._num_stopped += 1
+            return TrialScheduler.STOP
+        return TrialScheduler.CONTINUE
+
+    def on_trial_complete(self, trial_runner, trial: Trial, result: Dict):
+        if not result or self._time_attr not in result or self._metric not in result:
+            return
+        history = self._results.setdefault(trial.trial_id, [])
+        entry = (result[self._time_attr], self._metric_op * result[self._metric])
+        if not history or history[-1] != entry:
+            history.append(entry)
+
+    def on_trial_remove(self, trial_runner, trial: Trial):
+        self._results.pop(trial.trial_id, None)
+
+    def _running_mean(self, history, time) -> float:
+        scoped = [
+            value for t, value in history if self._grace_period <= t <= time
+        ]
+        return np.mean(scoped) if scoped else np.inf
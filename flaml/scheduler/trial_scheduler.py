@@ -15,6 +15,7 @@
 # This source file is adapted here because ray does not fully support Windows.
 
 # Copyright (c) Microsoft Corporation.
+from typing import Dict, Optional
 from flaml.tune import trial_runner
 from flaml.tune.trial import Trial
 
@@ -26,8 +27,25 @@ class TrialScheduler:
     PAUSE = "PAUSE"  #: Status for pausing trial execution
     STOP = "STOP"  #: Status for stopping trial execution
 
+    def set_search_properties(
+        self, metric: Optional[str] = None, mode: Optional[str] = None
+    ) -> bool:
+        """Pass search properties to scheduler."""
+        return True
+
     def on_trial_add(self, trial_runner: "trial_runner.TrialRunner", trial: Trial):
         pass
 
+    def on_trial_result(
+        self, trial_runner: "trial_runner.TrialRunner", trial: Trial, result: Dict
+    ) -> str:
+        """Report intermediate result and return a decision on the trial's status."""
+        return TrialScheduler.CONTINUE
+
+    def on_trial_complete(
+        self, trial_runner: "trial_runner.TrialRunner", trial: Trial, result: Dict
+    ):
+        pass
+
     def on_trial_remove(self, trial_runner: "trial_runner.TrialRunner", trial: Trial):
         pass
@@ -1,3 +1,4 @@
 from .blendsearch import CFO, BlendSearch, BlendSearchTuner, RandomSearch
 from .flow2 import FLOW2
+from .surrogate import SurrogateSearch
 from .online_searcher import ChampionFrontierSearcher
@@ -13,10 +13,19 @@ try:
 
     assert ray_version >= "1.0.0"
     from ray.tune.suggest import Searcher
-    from ray.tune.suggest.optuna import OptunaSearch as GlobalSearch
+    from ray.tune.suggest.optuna import OptunaSearch
 except (ImportError, AssertionError):
     from .suggestion import Searcher
-    from .suggestion import OptunaSearch as GlobalSearch
+    from .suggestion import OptunaSearch
+from .surrogate import SurrogateSearch
+
+try:
+    import optuna  # noqa: F401
+
+    GlobalSearch = OptunaSearch
+except ImportError:
+    # use the built-in global search when optuna is not installed
+    GlobalSearch = SurrogateSearch
 from ..tune.trial import unflatten_dict, flatten_dict
 from .search_thread import SearchThread
 from .flow2 import FLOW2
@@ -32,6 +41,7 @@ class BlendSearch(Searcher):
     cost_attr = "time_total_s"  # cost attribute in result
     lagrange = "_lagrange"  # suffix for lagrange-modified metric
     penalty = 1e10  # penalty term for constraints
+    max_local_thread = 16  # max number of local search threads in the pool
     LocalSearch = FLOW2
 
     def __init__(
@@ -105,7 +115,8 @@ class BlendSearch(Searcher):
             reduction_factor: A float of the reduction factor used for
                 incremental pruning.
             global_search_alg: A Searcher instance as the global search
-                instance. If omitted, Optuna is used. The following algos have
+                instance. If omitted, Optuna is used when installed, otherwise
+                the built-in SurrogateSearch is used. The following algos have
                 known issues when used as global_search_alg:
                 - HyperOptSearch raises exception sometimes
                 - TuneBOHB has its own scheduler
@@ -178,7 +189,7 @@ class BlendSearch(Searcher):
             else:
                 gs_space = space
             gs_seed = seed - 10 if (seed - 10) >= 0 else seed - 11 + (1 << 32)
-            if experimental:
+            if experimental and GlobalSearch is not SurrogateSearch:
                 import optuna as ot
 
                 sampler = ot.samplers.TPESampler(
@@ -196,15 +207,21 @@ class BlendSearch(Searcher):
                     points_to_evaluate=points_to_evaluate,
                     evaluated_rewards=evaluated_rewards,
                 )
-            except ValueError:
-                self._gs = GlobalSearch(
-                    space=gs_space,
-                    metric=metric,
-                    mode=mode,
-                    seed=gs_seed,
-                    sampler=sampler,
-                )
-            self._gs.space = space
+            except ValueError as error:
+                if GlobalSearch is SurrogateSearch:
+                    # unsupported space, e.g., hierarchical; search as CFO
+                    logger.warning(f"{error} Searching without global search.")
+                    self._gs = None
+                else:
+                    self._gs = GlobalSearch(
+                        space=gs_space,
+                        metric=metric,
+                        mode=mode,
+                        seed=gs_seed,
+                        sampler=sampler,
+                    )
+            if self._gs is not None:
+                self._gs.space = space
         else:
             self._gs = None
         self._experimental = experimental
@@ -245,8 +262,14 @@ class BlendSearch(Searcher):
             # the search space can be set only once
             if self._gs is not None:
                 # define-by-run is not supported via set_search_properties
-                self._gs.set_search_properties(metric, mode, config)
-                self._gs.space = config
+                try:
+                    self._gs.set_search_properties(metric, mode, config)
+                    self._gs.space = config
+                except ValueError as error:
+                    if not isinstance(self._gs, SurrogateSearch):
+                        raise
+                    logger.warning(f"{error} Searching without global search.")
+                    self._gs = None
             if config:
                 add_cost_to_space(config, self._ls.init_config, self._cat_hp_cost)
             self._ls.set_search_properties(metric, mode, config)
@@ -385,12 +408,11 @@ class BlendSearch(Searcher):
                 # found a feasible point
                 self._metric_constraint_penalty = [1 for _ in self._metric_constraints]
             self._metric_constraint_satisfied |= metric_constraint_satisfied
-        thread_id = self._trial_proposed_by.get(trial_id)
+        thread_id = self._trial_proposed_by.pop(trial_id, None)
         if thread_id in self._search_thread_pool:
             self._search_thread_pool[thread_id].on_trial_complete(
                 trial_id, result, error
             )
-            del self._trial_proposed_by[trial_id]
         if result:
             config = result.get("config", {})
             if not config:
@@ -403,7 +425,12 @@ class BlendSearch(Searcher):
             if error:  # remove from result cache
                 del self._result[signature]
             else:  # add to result cache
-                self._result[signature] = result
+                # only keep what is needed to replay the result to a thread
+                self._result[signature] = {
+                    self._metric: result.get(self._metric),
+                    self._ls.metric: result[self._ls.metric],
+                    self.cost_attr: result.get(self.cost_attr, 1),
+                }
                 # update target metric if improved
                 objective = result[self._ls.metric]
                 if (objective - self._metric_target) * self._ls.metric_op < 0:
@@ -473,6 +500,30 @@ class BlendSearch(Searcher):
             space,
             self._ls.space,
         )
+        self._prune_threads()
+
+    def _prune_threads(self):
+        """Keep the number of local threads within max_local_thread.
+
+        Dominated threads are removed first, then the threads with the
+        worst objective.
+        """
+        local_ids = [id for id in self._search_thread_pool if id]
+        if len(local_ids) <= self.max_local_thread:
+            return
+        todelete = set()
+        for id1 in local_ids:
+            for id2 in local_ids:
+                if id1 != id2 and id2 not in todelete and self._inferior(id1, id2):
+                    todelete.add(id1)
+                    break
+        remaining = sorted(
+            (id for id in local_ids if id not in todelete),
+            key=lambda id: self._search_thread_pool[id].obj_best1,
+        )
+        todelete.update(remaining[self.max_local_thread :])
+        for id in todelete:
+            del self._search_thread_pool[id]
 
     def _update_admissible_region(
         self,
@@ -785,6 +836,34 @@ class BlendSearch(Searcher):
             return True
         return False
 
+    def add_evaluated_result(
+        self, config: Dict, result: Optional[Dict] = None, rerun: bool = False
+    ):
+        """Record the result of a config evaluated outside of the search.
+
+        Args:
+            config: A dictionary of the config.
+            result: A dictionary of the result containing the metric and
+                optionally the cost. A later proposal of the config is answered
+                from the result cache without running it.
+            rerun: A bool of whether to run the config as a trial instead, e.g.,
+                to obtain its model.
+        """
+        if rerun:
+            self._points_to_evaluate = self._points_to_evaluate + [config]
+            return
+        signature = self._ls.config_signature(config, self._ls.space)
+        if self._result.get(signature):  # finished before
+            return
+        objective = result[self._metric]
+        self._result[signature] = {
+            self._metric: objective,
+            self._ls.metric: result.get(self._ls.metric, objective),
+            self.cost_attr: result.get(self.cost_attr, 1),
+        }
+        if (objective - self._metric_target) * self._ls.metric_op < 0:
+            self._metric_target = objective
+
     def _select_thread(self) -> Tuple:
         """thread selector; use can_suggest to check LS availability"""
         # update priority
@@ -811,13 +890,14 @@ class BlendSearch(Searcher):
             thread.update_eci(self._metric_target, max_speed)
             if thread.eci < min_eci:
                 min_eci = thread.eci
-        for thread in self._search_thread_pool.values():
-            thread.update_priority(min_eci)
-
         top_thread_id = backup_thread_id = 0
-        priority1 = priority2 = self._search_thread_pool[0].priority
+        priority1 = priority2 = None
+        # thread 0 (global search) is always the first one in the pool
         for thread_id, thread in self._search_thread_pool.items():
-            if thread_id and thread.can_suggest:
+            thread.update_priority(min_eci)
+            if not thread_id:
+                priority1 = priority2 = thread.priority
+            elif thread.can_suggest:
                 priority = thread.priority
                 if priority > priority1:
                     priority1 = priority
@@ -320,13 +320,17 @@ class FLOW2(Searcher):
         If not better and num_complete >= 2*dim, num_allowed += 2.
         """
         self.trial_count_complete += 1
+        # the per-trial records are not needed after completion
+        config_step = self._configs.pop(trial_id, None)
+        proposed_by = self._proposed_by.pop(trial_id, None)
+        trial_cost = self._trial_cost.pop(trial_id, None)
         if not error and result:
             obj = result.get(self._metric)
             if obj:
                 obj *= self.metric_op
                 if self.best_obj is None or obj < self.best_obj:
                     self.best_obj = obj
-                    self.best_config, self.step = self._configs[trial_id]
+                    self.best_config, self.step = config_step
                     self.incumbent = self.normalize(self.best_config)
                     self.cost_incumbent = result.get(self.cost_attr)
                     if self._resource:
@@ -347,13 +351,10 @@ class FLOW2(Searcher):
                     return
                 elif self._trunc:
                     self._trunc = max(self._trunc >> 1, 1)
-        proposed_by = self._proposed_by.get(trial_id)
         if proposed_by == self.incumbent:
             # proposed by current incumbent and no better
             self._num_complete4incumbent += 1
-            cost = (
-                result.get(self.cost_attr) if result else self._trial_cost.get(trial_id)
-            )
+            cost = result.get(self.cost_attr) if result else trial_cost
             if cost:
                 self._cost_complete4incumbent += cost
             if (
@@ -368,7 +369,6 @@ class FLOW2(Searcher):
                 self._num_complete4incumbent -= 2
                 if self._num_allowed4incumbent < 2:
                     self._num_allowed4incumbent = 2
-        # elif proposed_by: del self._proposed_by[trial_id]
 
     def on_trial_result(self, trial_id: str, result: Dict):
         """Early update of incumbent."""
@@ -0,0 +1,347 @@
+# !
+#  * Copyright (c) Microsoft Corporation. All rights reserved.
+#  * Licensed under the MIT License. See LICENSE file in the
+#  * project root for license information.
+from typing import Dict, Optional, List
+import numpy as np
+
+try:
+    from ray import __version__ as ray_version
+
+    assert ray_version >= "1.0.0"
+    from ray.tune.suggest import Searcher
+    from ray.tune import sample
+except (ImportError, AssertionError):
+    from .suggestion import Searcher
+    from ..tune import sample
+from ..tune.trial import flatten_dict, unflatten_dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SurrogateSearch(Searcher):
+    """A dependency-light global search algorithm with a kernel density
+    surrogate, used by BlendSearch when optuna is not installed.
+
+    Each dimension of the (flattened) search space is compiled to [0, 1]
+    (log scale for log-uniform domains) or to a category index. Completed
+    trials are appended to preallocated numpy arrays. To suggest, the
+    observations are split into a good and a bad group by the objective,
+    candidates are drawn around the good points, and the candidates with the
+    largest density ratio l(x)/g(x) are proposed, as in TPE. The sizes of both
+    groups are capped so that the suggestion latency stays bounded as trials
+    accumulate. Pending trials are counted as bad points (constant liar) so
+    that concurrent proposals spread out.
+    """
+
+    _sampler = None  # for interface compatibility with OptunaSearch
+
+    def __init__(
+        self,
+        space: Optional[Dict] = None,
+        metric: Optional[str] = None,
+        mode: Optional[str] = None,
+        points_to_evaluate: Optional[List[Dict]] = None,
+        evaluated_rewards: Optional[List] = None,
+        seed: Optional[int] = None,
+        n_initial_points: Optional[int] = 10,
+        n_candidates: Optional[int] = 64,
+        batch_size: Optional[int] = 1,
+        gamma: Optional[float] = 0.1,
+        max_good: Optional[int] = 25,
+        max_bad: Optional[int] = 200,
+        **kwargs,
+    ):
+        """Constructor.
+
+        Args:
+            space: A dictionary to specify the search space. Hierarchical
+                (define-by-run) spaces are not supported.
+            metric: A string of the metric name to optimize for.
+            mode: A string in ['min', 'max'] to specify the objective as
+                minimization or maximization.
+            points_to_evaluate: Initial parameter suggestions to be run first.
+            evaluated_rewards: A list of the rewards of points_to_evaluate
+                if they have been evaluated already.
+            seed: An integer of the random seed.
+            n_initial_points: An integer of the number of random suggestions
+                before the surrogate model is used.
+            n_candidates: An integer of the number of candidates scored per
+                acquisition optimization.
+            batch_size: An integer of the number of configs proposed per
+                acquisition optimization. The proposals are queued and
+                discarded once a new result arrives.
+            gamma: A float of the fraction of observations in the good group.
+            max_good: An integer of the maximal size of the good group.
+            max_bad: An integer of the maximal size of the bad group; the most
+                recent bad observations are kept.
+            **kwargs: Ignored. E.g., `sampler` from the OptunaSearch interface.
+        """
+        super().__init__(metric=metric, mode=mode)
+        self._seed = seed
+        self._rs = np.random.RandomState(seed)
+        self._n_initial_points = n_initial_points
+        self._n_candidates = n_candidates
+        self._batch_size = batch_size
+        self._gamma = gamma
+        self._max_good = max_good
+        self._max_bad = max_bad
+        self._points_to_evaluate = list(points_to_evaluate or [])
+        self._evaluated_rewards = evaluated_rewards
+        self._space = None
+        if space:
+            self._setup(space)
+
+    def _setup(self, space: Dict):
+        if callable(space):
+            raise ValueError(
+                "SurrogateSearch does not support define-by-run search spaces. "
+                "Please install optuna: pip install flaml[blendsearch]."
+            )
+        self.space = space  # unflattened space
+        self._space = flatten_dict(space)
+        self._keys, self._domains, self._const = [], [], {}
+        for key, domain in self._space.items():
+            if not isinstance(domain, sample.Domain):
+                self._const[key] = domain
+                continue
+            if isinstance(domain, sample.Categorical):
+                if any(isinstance(c, dict) for c in domain.categories):
+                    raise ValueError(
+                        "SurrogateSearch does not support hierarchical search spaces."
+                    )
+            elif not isinstance(domain, (sample.Float, sample.Integer)):
+                raise ValueError(
+                    f"SurrogateSearch does not support parameters of type "
+                    f"`{type(domain).__name__}`"
+                )
+            self._keys.append(key)
+            self._domains.append(domain)
+        dim = len(self._keys)
+        self._is_cat = np.array(
+            [isinstance(d, sample.Categorical) for d in self._domains], dtype=bool
+        )
+        self._num_cats = np.array(
+            [
+                len(d.categories) if isinstance(d, sample.Categorical) else 0
+                for d in self._domains
+            ]
+        )
+        self._X = np.empty((16, dim))
+        self._y = np.empty(16)
+        self._n = 0
+        self._pending = {}  # trial_id: str -> encoded point: np.ndarray
+        self._queue = []  # proposals from the last acquisition optimization
+        if self._evaluated_rewards:
+            for point, reward in zip(self._points_to_evaluate, self._evaluated_rewards):
+                self.add_evaluated_point(flatten_dict(point), reward)
+            self._points_to_evaluate = []
+
+    def set_search_properties(
+        self, metric: Optional[str], mode: Optional[str], config: Dict
+    ) -> bool:
+        if self._space:
+            return False
+        if metric:
+            self._metric = metric
+        if mode:
+            self._mode = mode
+        if config:
+            self._setup(config)
+        return True
+
+    @property
+    def _metric_op(self) -> float:
+        return -1.0 if self._mode == "max" else 1.0
+
+    def _encode(self, config: Dict) -> np.ndarray:
+        """Compile a flattened config into a point in the normalized space."""
+        point = np.empty(len(self._keys))
+        for i, (key, domain) in enumerate(zip(self._keys, self._domains)):
+            value = config.get(key)
+            if self._is_cat[i]:
+                try:
+                    point[i] = domain.categories.index(value)
+                except ValueError:
+                    point[i] = self._rs.randint(self._num_cats[i])
+                continue
+            if value is None:
+                point[i] = self._rs.rand()
+                continue
+            sampler = domain.get_sampler()
+            quantize = isinstance(sampler, sample.Quantized)
+            if quantize:
+                sampler = sampler.get_sampler()
+            upper = domain.upper - (isinstance(domain, sample.Integer) & (not quantize))
+            if str(sampler) == "LogUniform":
+                u = np.log(value / domain.lower) / np.log(upper / domain.lower)
+            elif str(sampler) == "Normal":
+                u = (value - sampler.mean) / sampler.sd / 6 + 0.5
+            else:
+                u = (value - domain.lower) / (upper - domain.lower)
+            point[i] = min(max(u, 0.0), 1.0)
+        return point
+
+    def _decode(self, point: np.ndarray) -> Dict:
+        """Map a point in the normalized space back to a flattened config."""
+        config = dict(self._const)
+        for i, (key, domain) in enumerate(zip(self._keys, self._domains)):
+            u = point[i]
+            if self._is_cat[i]:
+                config[key] = domain.categories[int(u)]
+                continue
+            sampler = domain.get_sampler()
+            q = None
+            if isinstance(sampler, sample.Quantized):
+                q = sampler.q
+                sampler = sampler.get_sampler()
+            upper = domain.upper - (isinstance(domain, sample.Integer) & (q is None))
+            if str(sampler) == "LogUniform":
+                value = (upper / domain.lower) ** u * domain.lower
+            elif str(sampler) == "Normal":
+                value = ((u - 0.5) * 6) * sampler.sd + sampler.mean
+            else:
+                value = u * (upper - domain.lower) + domain.lower
+            if q is not None:
+                value = np.round(np.divide(value, q)) * q
+            if str(sampler) != "Normal":
+                value = min(max(value, domain.lower), upper)
+            if isinstance(domain, sample.Integer):
+                value = int(round(value))
+            else:
+                value = float(value)
+            config[key] = value
+        return config
+
+    def _random_points(self, num: int) -> np.ndarray:
+        points = self._rs.rand(num, len(self._keys))
+        points[:, self._is_cat] = np.floor(
+            points[:, self._is_cat] * self._num_cats[self._is_cat]
+        )
+        return points
+
+    def _bandwidth(self, points: np.ndarray) -> np.ndarray:
+        """Scott's rule on the numeric dimensions."""
+        k, dim = points.shape
+        if k < 2:
+            return np.full(dim, 0.2)
+        bw = points.std(axis=0) * k ** (-1.0 / (dim + 4))
+        return np.clip(bw, 0.03, 1.0)
+
+    def _log_density(
+        self, x: np.ndarray, centers: np.ndarray, bw: np.ndarray
+    ) -> np.ndarray:
+        """Log density of the kernel mixture at `centers` plus a uniform
+        prior component, evaluated for all rows of `x` at once.
+        """
+        m, k = len(x), len(centers)
+        prior_weight = 1.0
+        num = ~self._is_cat
+        # log of the uniform prior density
+        log_prior = -np.log(self._num_cats[self._is_cat]).sum()
+        if k == 0:
+            return np.full(m, log_prior)
+        log_kernel = np.zeros((m, k))
+        if num.any():
+            z = (x[:, None, num] - centers[None, :, num]) / bw[num]
+            log_kernel += (-0.5 * z ** 2 - np.log(bw[num] * np.sqrt(2 * np.pi))).sum(
+                axis=-1
+            )
+        if self._is_cat.any():
+            n_cats = self._num_cats[self._is_cat]
+            eps = 1.0 / (k + 1)
+            same = x[:, None, self._is_cat] == centers[None, :, self._is_cat]
+            log_kernel += np.where(
+                same, np.log(1 - eps + eps / n_cats), np.log(eps / n_cats)
+            ).sum(axis=-1)
+        top = np.maximum(log_kernel.max(axis=1), log_prior)
+        total = np.exp(log_kernel - top[:, None]).sum(axis=1) + prior_weight * np.exp(
+            log_prior - top
+        )
+        return top + np.log(total) - np.log(k + prior_weight)
+
+    def _propose(self, num: int) -> np.ndarray:
+        """Optimize the acquisition function; return `num` points."""
+        n = self._n
+        if n < self._n_initial_points:
+            return self._random_points(num)
+        X, y = self._X[:n], self._y[:n]
+        n_good = min(max(int(np.ceil(self._gamma * n)), 1), self._max_good)
+        order = np.argpartition(y, n_good - 1)
+        good = X[order[:n_good]]
+        bad_index = order[n_good:]
+        if len(bad_index) > self._max_bad:
+            # keep the most recent bad observations
+            bad_index = np.sort(bad_index)[-self._max_bad :]
+        bad = X[bad_index]
+        if self._pending:
+            bad = np.vstack([bad] + list(self._pending.values()))
+        bw_good, bw_bad = self._bandwidth(good), self._bandwidth(bad)
+        # draw candidates around the good points
+        m = max(self._n_candidates, num)
+        candidates = good[self._rs.randint(n_good, size=m)].copy()
+        num_dims = ~self._is_cat
+        noise = self._rs.normal(size=(m, num_dims.sum())) * bw_good[num_dims]
+        candidates[:, num_dims] = np.clip(candidates[:, num_dims] + noise, 0, 1)
+        if self._is_cat.any():
+            resample = self._rs.rand(m, self._is_cat.sum()) < 1.0 / (n_good + 1)
+            cats = candidates[:, self._is_cat]
+            cats[resample] = self._random_points(m)[:, self._is_cat][resample]
+            candidates[:, self._is_cat] = cats
+        score = self._log_density(candidates, good, bw_good) - self._log_density(
+            candidates, bad, bw_bad
+        )
+        return candidates[np.argsort(-score)[:num]]
+
+    def suggest(self, trial_id: str) -> Optional[Dict]:
+        if not self._space:
+            return None
+        if self._points_to_evaluate:
+            config = flatten_dict(self._points_to_evaluate.pop(0))
+            point = self._encode(config)
+            config = self._decode(point)
+        else:
+            if not self._queue:
+                self._queue = list(self._propose(self._batch_size))
+            point = self._queue.pop(0)
+            config = self._decode(point)
+        self._pending[trial_id] = point
+        return unflatten_dict(config)
+
+    def suggest_batch(self, trial_ids: List[str]) -> List[Optional[Dict]]:
+        """Suggest configs for a batch of trials with one acquisition
+        optimization."""
+        if len(self._queue) < len(trial_ids) and self._space:
+            self._queue += list(self._propose(len(trial_ids) - len(self._queue)))
+        return [self.suggest(trial_id) for trial_id in trial_ids]
+
+    def on_trial_result(self, trial_id: str, result: Dict):
+        pass
+
+    def on_trial_complete(
+        self, trial_id: str, result: Optional[Dict] = None, error: bool = False
+    ):
+        point = self._pending.pop(trial_id, None)
+        if point is None or error or not result:
+            return
+        value = result.get(self._metric)
+        if value is not None:
+            self._add(point, value)
+
+    def add_evaluated_point(self, parameters: Dict, value: float, **kwargs):
+        """Add an evaluated config (flattened) with its objective value."""
+        self._add(self._encode(parameters), value)
+
+    def _add(self, point: np.ndarray, value: float):
+        if value is None or np.isnan(value):
+            return
+        if self._n == len(self._y):
+            # amortized O(1) append
+            self._X = np.concatenate([self._X, np.empty_like(self._X)])
+            self._y = np.concatenate([self._y, np.empty_like(self._y)])
+        self._X[self._n] = point
+        self._y[self._n] = value * self._metric_op
+        self._n += 1
+        # the model has changed; drop stale proposals
+        self._queue = []
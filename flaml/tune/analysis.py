@@ -17,7 +17,7 @@
 # Copyright (c) Microsoft Corporation.
 from typing import Dict, Optional
 import numpy as np
-from .trial import Trial
+from .trial import Trial, flatten_dict
 
 import logging
 
@@ -71,6 +71,67 @@ class ExperimentAnalysis:
 
         return {trial.trial_id: trial.last_result for trial in self.trials}
 
+    @property
+    def results_df(self):
+        """Get the last result of all the trials as a pandas DataFrame
+        indexed by trial_id. Nested results are flattened with '/'.
+        """
+        import pandas as pd
+
+        return pd.DataFrame.from_records(
+            [
+                dict(flatten_dict(trial.last_result), trial_id=trial.trial_id)
+                for trial in self.trials
+            ],
+            index="trial_id",
+        )
+
+    def _column(self, metric: str, key: str) -> np.ndarray:
+        """Get the statistic `key` of `metric` for all the trials as a numpy
+        array aligned with `self.trials`; NaN for trials without the metric.
+
+        The columns form a table kept with the analysis, together with the
+        number of results of every trial when its row was filled. The rows
+        of new trials are appended, and only the rows of the trials with new
+        results are refreshed.
+        """
+        trials = self.trials
+        if self.__dict__.get("_table_trials") is not trials:
+            self._table_trials = trials
+            self._table = {}
+        num_results = np.fromiter(
+            (trial.num_results for trial in trials), dtype=np.int64, count=len(trials)
+        )
+        column, filled = self._table.get(
+            (metric, key), (np.empty(0), np.empty(0, dtype=np.int64))
+        )
+        if len(column) > len(trials):
+            column, filled = np.empty(0), np.empty(0, dtype=np.int64)
+        if len(column) < len(trials):
+            num_new = len(trials) - len(column)
+            column = np.concatenate((column, np.full(num_new, np.nan)))
+            filled = np.concatenate((filled, np.full(num_new, -1)))
+        for i in np.flatnonzero(filled != num_results):
+            stats = trials[i].metric_analysis.get(metric)
+            column[i] = np.nan if stats is None else stats[key]
+        self._table[(metric, key)] = column, num_results
+        return column
+
+    def _best_index(
+        self, metric: str, mode: str, scope: str, filter_nan_and_inf: bool
+    ) -> Optional[int]:
+        """Get the index of the best trial in `self.trials`."""
+        column = self._column(metric, mode if scope == "all" else scope)
+        valid = np.isfinite(column) if filter_nan_and_inf else ~np.isnan(column)
+        if valid.any():
+            candidates = np.flatnonzero(valid)
+            values = column[candidates]
+            best = values.argmax() if mode == "max" else values.argmin()
+            index = int(candidates[best])
+        else:
+            index = None
+        return index
+
     def _validate_metric(self, metric: str) -> str:
         if not metric and not self.default_metric:
             raise ValueError(
@@ -133,32 +194,8 @@ class ExperimentAnalysis:
                     metric, scope
                 )
             )
-        best_trial = None
-        best_metric_score = None
-        for trial in self.trials:
-            if metric not in trial.metric_analysis:
-                continue
-
-            if scope in ["last", "avg", "last-5-avg", "last-10-avg"]:
-                metric_score = trial.metric_analysis[metric][scope]
-            else:
-                metric_score = trial.metric_analysis[metric][mode]
-
-            if filter_nan_and_inf and is_nan_or_inf(metric_score):
-                continue
-
-            if best_metric_score is None:
-                best_metric_score = metric_score
-                best_trial = trial
-                continue
-
-            if (mode == "max") and (best_metric_score < metric_score):
-                best_metric_score = metric_score
-                best_trial = trial
-            elif (mode == "min") and (best_metric_score > metric_score):
-                best_metric_score = metric_score
-                best_trial = trial
-
+        index = self._best_index(metric, mode, scope, filter_nan_and_inf)
+        best_trial = None if index is None else self.trials[index]
         if not best_trial:
             logger.warning(
                 "Could not find best trial. Did you pass the correct `metric` "
@@ -63,6 +63,76 @@ def unflatten_dict(dt, delimiter="/"):
     return out
 
 
+def _lookup(result, metric, delimiter="/"):
+    """Look up a (possibly flattened nested) metric in a result dict."""
+    if metric in result:
+        return result[metric]
+    value = result
+    for key in metric.split(delimiter):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+class MetricStats:
+    """Running statistics of one metric in a trial.
+
+    Supports the same keys as the dicts in ray's `Trial.metric_analysis`,
+    i.e., 'max', 'min', 'avg', 'last' and 'last-{n}-avg', and updates all of
+    them in O(1) per result.
+    """
+
+    __slots__ = ("max", "min", "avg", "last", "_windows")
+
+    def __init__(self, value, n_steps=(5, 10)):
+        self.max = self.min = self.avg = self.last = value
+        # n: int -> [recent values: deque, running sum: float]
+        self._windows = {n: [deque([value], maxlen=n), value] for n in n_steps}
+
+    def update(self, value, step=None):
+        step = step or 1
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+        self.avg = (value + (step - 1) * self.avg) / step
+        self.last = value
+        for n, window in self._windows.items():
+            values = window[0]
+            if len(values) == n:
+                window[1] -= values[0]
+            values.append(value)
+            window[1] += value
+
+    def __getitem__(self, key):
+        if key in self.__slots__[:4]:
+            return getattr(self, key)
+        if key.startswith("last-") and key.endswith("-avg"):
+            window = self._windows.get(int(key[5:-4]))
+            if window is not None:
+                return window[1] / len(window[0])
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except (KeyError, ValueError):
+            return False
+        return True
+
+    def keys(self):
+        return list(self.__slots__[:4]) + [
+            "last-{:d}-avg".format(n) for n in self._windows
+        ]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
 class Trial:
     """A trial object holds the state for one model training run.
     Trials are themselves managed by the TrialRunner class, which implements
@@ -82,12 +152,18 @@ class Trial:
         error_file (str): Path to the errors that this trial has raised.
     """
 
+    __slots__ = ()
+
     PENDING = "PENDING"
     RUNNING = "RUNNING"
     PAUSED = "PAUSED"
     TERMINATED = "TERMINATED"
     ERROR = "ERROR"
 
+    # the number of results of the trial, with which the derived data, e.g.,
+    # the columns of ExperimentAnalysis, are refreshed per trial
+    num_results = 0
+
     @classmethod
     def generate_id(cls):
         return str(uuid.uuid1().hex)[:8]
@@ -98,43 +174,21 @@ class Trial:
 
         self.last_result = result
         self.last_update_time = time.time()
-
-        for metric, value in flatten_dict(result).items():
+        self.num_results += 1
+
+        metrics = getattr(self, "metrics_to_track", None)
+        if metrics is None:
+            items = flatten_dict(result).items()
+        else:
+            # only look up the tracked metrics; no need to flatten the result
+            items = ((metric, _lookup(result, metric)) for metric in metrics)
+        for metric, value in items:
             if isinstance(value, Number):
-                if metric not in self.metric_analysis:
-                    self.metric_analysis[metric] = {
-                        "max": value,
-                        "min": value,
-                        "avg": value,
-                        "last": value,
-                    }
-                    self.metric_n_steps[metric] = {}
-                    for n in self.n_steps:
-                        key = "last-{:d}-avg".format(n)
-                        self.metric_analysis[metric][key] = value
-                        # Store n as string for correct restore.
-                        self.metric_n_steps[metric][str(n)] = deque([value], maxlen=n)
+                stats = self.metric_analysis.get(metric)
+                if stats is None:
+                    self.metric_analysis[metric] = MetricStats(value, self.n_steps)
                 else:
-                    step = result["training_iteration"] or 1
-                    self.metric_analysis[metric]["max"] = max(
-                        value, self.metric_analysis[metric]["max"]
-                    )
-                    self.metric_analysis[metric]["min"] = min(
-                        value, self.metric_analysis[metric]["min"]
-                    )
-                    self.metric_analysis[metric]["avg"] = (
-                        1
-                        / step
-                        * (value + (step - 1) * self.metric_analysis[metric]["avg"])
-                    )
-                    self.metric_analysis[metric]["last"] = value
-
-                    for n in self.n_steps:
-                        key = "last-{:d}-avg".format(n)
-                        self.metric_n_steps[metric][str(n)].append(value)
-                        self.metric_analysis[metric][key] = sum(
-                            self.metric_n_steps[metric][str(n)]
-                        ) / len(self.metric_n_steps[metric][str(n)])
+                    stats.update(value, result.get("training_iteration"))
 
     def set_status(self, status):
         """Sets the status of the trial."""
@@ -2,7 +2,7 @@
 #  * Copyright (c) Microsoft Corporation. All rights reserved.
 #  * Licensed under the MIT License. See LICENSE file in the
 #  * project root for license information.
-from typing import Optional
+from typing import Optional, List, Union
 
 # try:
 #     from ray import __version__ as ray_version
@@ -25,7 +25,34 @@ class Nologger:
 class SimpleTrial(Trial):
     """A simple trial class"""
 
-    def __init__(self, config, trial_id=None):
+    __slots__ = (
+        "trial_id",
+        "config",
+        "status",
+        "start_time",
+        "last_result",
+        "last_update_time",
+        "custom_trial_name",
+        "trainable_name",
+        "experiment_tag",
+        "verbose",
+        "result_logger",
+        "metric_analysis",
+        "n_steps",
+        "metrics_to_track",
+        "num_results",
+    )
+
+    def __init__(self, config, trial_id=None, metrics_to_track=None):
+        """Constructor.
+
+        Args:
+            config: A dictionary of the config of the trial.
+            trial_id: A string of the trial id.
+            metrics_to_track: A list of the metric names to keep running
+                statistics for in `metric_analysis`. None means tracking all
+                the numeric metrics in the results.
+        """
         self.trial_id = Trial.generate_id() if trial_id is None else trial_id
         self.config = config or {}
         self.status = Trial.PENDING
@@ -39,7 +66,8 @@ class SimpleTrial(Trial):
         self.result_logger = Nologger()
         self.metric_analysis = {}
         self.n_steps = [5, 10]
-        self.metric_n_steps = {}
+        self.metrics_to_track = metrics_to_track
+        self.num_results = 0
 
 
 class BaseTrialRunner:
@@ -54,12 +82,20 @@ class BaseTrialRunner:
         scheduler=None,
         metric: Optional[str] = None,
         mode: Optional[str] = "min",
+        track_metrics: Optional[Union[List[str], str]] = None,
     ):
         self._search_alg = search_alg
         self._scheduler_alg = scheduler
         self._trials = []
         self._metric = metric
         self._mode = mode
+        if track_metrics == "all" or metric is None:
+            self._metrics_to_track = None
+        else:
+            # the optimized metric is always tracked
+            self._metrics_to_track = [metric] + [
+                m for m in track_metrics or [] if m != metric
+            ]
 
     def get_trials(self):
         """Returns the list of trials managed by this TrialRunner.
@@ -86,7 +122,8 @@ class BaseTrialRunner:
         if self._scheduler_alg:
             decision = self._scheduler_alg.on_trial_result(self, trial, result)
             if decision == "STOP":
-                trial.set_status(Trial.TERMINATED)
+                # early stopped trials are completed with the last result
+                self.stop_trial(trial)
             elif decision == "PAUSE":
                 trial.set_status(Trial.PAUSED)
 
@@ -94,12 +131,10 @@ class BaseTrialRunner:
         """Stops trial."""
         if trial.status not in [Trial.ERROR, Trial.TERMINATED]:
             if self._scheduler_alg:
-                self._scheduler_alg.on_trial_complete(
-                    self, trial.trial_id, trial.last_result
-                )
+                self._scheduler_alg.on_trial_complete(self, trial, trial.last_result)
             self._search_alg.on_trial_complete(trial.trial_id, trial.last_result)
             trial.set_status(Trial.TERMINATED)
-        elif self._scheduler_alg:
+        elif self._scheduler_alg and trial.status == Trial.ERROR:
             self._scheduler_alg.on_trial_remove(self, trial)
 
 
@@ -116,7 +151,7 @@ class SequentialTrialRunner(BaseTrialRunner):
         trial_id = Trial.generate_id()
         config = self._search_alg.suggest(trial_id)
         if config is not None:
-            trial = SimpleTrial(config, trial_id)
+            trial = SimpleTrial(config, trial_id, self._metrics_to_track)
             self.add_trial(trial)
             trial.set_status(Trial.RUNNING)
         else:
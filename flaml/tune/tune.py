@@ -70,6 +70,12 @@ def report(_metric=None, **kwargs):
 
         print(analysis.trials[-1].last_result)
 
+    When ray is not used as the backend and `report_intermediate_result=True`
+    is set in `tune.run`, `report` can be called multiple times in one trial.
+    Once the scheduler decides to stop the trial, `report` returns None and
+    ignores later results, so the training function should return when
+    `report` does not return True.
+
     Args:
         _metric: Optional default anonymous metric for ``tune.report(value)``.
             (For compatibility with ray.tune.report)
@@ -88,6 +94,9 @@ def report(_metric=None, **kwargs):
         if _metric:
             result[DEFAULT_METRIC] = _metric
         trial = _runner.running_trial
+        if trial.is_finished():
+            # the trial has been stopped by the scheduler
+            return None
         if _running_trial == trial:
             _training_iteration += 1
         else:
@@ -97,14 +106,13 @@ def report(_metric=None, **kwargs):
         result["config"] = trial.config
         for key, value in trial.config.items():
             result["config/" + key] = value
-        _runner.process_trial_result(_runner.running_trial, result)
-        result["time_total_s"] = trial.last_update_time - trial.start_time
+        result["time_total_s"] = time.time() - trial.start_time
+        _runner.process_trial_result(trial, result)
         if _verbose > 2:
             logger.info(f"result: {result}")
-        if _runner.running_trial.is_finished():
+        if trial.is_finished():
             return None
-        else:
-            return True
+        return True
 
 
 def run(
@@ -122,6 +130,7 @@ def run(
     max_resource: Optional[float] = None,
     reduction_factor: Optional[float] = None,
     report_intermediate_result: Optional[bool] = False,
+    scheduler=None,
     search_alg=None,
     verbose: Optional[int] = 2,
     local_dir: Optional[str] = None,
@@ -133,6 +142,7 @@ def run(
     metric_constraints: Optional[List[Tuple[str, str, float]]] = None,
     max_failure: Optional[int] = 100,
     use_ray: Optional[bool] = False,
+    track_metrics: Optional[Union[List[str], str]] = None,
 ):
     """The trigger for HPO.
 
@@ -220,6 +230,29 @@ def run(
             pruning.
         report_intermediate_result: A boolean of whether intermediate results
             are reported. If so, early stopping and pruning can be used.
+        scheduler: A string in ['asha', 'median'] or a scheduler instance
+            to decide early stopping of trials when
+            `report_intermediate_result=True`. Defaults to 'asha'.
+            The scheduler compares trials on `prune_attr` if given,
+            otherwise on 'training_iteration'. The strings map to the
+            schedulers of ray.tune when ray is installed, as before, and to
+            those of flaml.scheduler otherwise.
+            e.g.,
+
+            .. code-block:: python
+
+                def train_func(config):
+                    for epoch in range(1, 11):
+                        loss = train_one_epoch(config)
+                        # returns None when the trial is early stopped
+                        if not tune.report(loss=loss, epoch=epoch):
+                            break
+
+                analysis = tune.run(
+                    train_func, config=config, metric='loss', mode='min',
+                    prune_attr='epoch', min_resource=1, max_resource=10,
+                    report_intermediate_result=True, scheduler='median')
+
         search_alg: An instance of BlendSearch as the search algorithm
             to be used. The same instance can be used for iterative tuning.
             e.g.,
@@ -258,6 +291,10 @@ def run(
         max_failure: int | the maximal consecutive number of failures to sample
             a trial before the tuning is terminated.
         use_ray: A boolean of whether to use ray as the backend.
+        track_metrics: A list of metric names or 'all' | The metrics to keep
+            running statistics (max, min, avg, last-n-avg) for in each
+            trial's `metric_analysis`, in addition to `metric`. Only valid
+            when ray is not used. By default only `metric` is tracked.
     """
     global _use_ray
     global _verbose
@@ -334,22 +371,34 @@ def run(
             searcher.set_search_properties(metric, mode, config, setting)
         else:
             searcher.set_search_properties(metric, mode, config)
-    scheduler = None
-    if report_intermediate_result:
+    if not report_intermediate_result:
+        scheduler = None
+    elif scheduler is None or isinstance(scheduler, str):
+        scheduler = scheduler or "asha"
         params = {}
         # scheduler resource_dimension=prune_attr
         if prune_attr:
             params["time_attr"] = prune_attr
-        if max_resource:
-            params["max_t"] = max_resource
         if min_resource:
             params["grace_period"] = min_resource
-        if reduction_factor:
-            params["reduction_factor"] = reduction_factor
+        if scheduler == "asha":
+            if max_resource:
+                params["max_t"] = max_resource
+            if reduction_factor:
+                params["reduction_factor"] = reduction_factor
+        elif scheduler != "median":
+            raise ValueError(
+                f"scheduler must be 'asha', 'median' or an instance, got {scheduler}"
+            )
         if ray_import:
-            from ray.tune.schedulers import ASHAScheduler
-
-            scheduler = ASHAScheduler(**params)
+            from ray.tune.schedulers import ASHAScheduler, MedianStoppingRule
+        else:
+            from ..scheduler import ASHAScheduler, MedianStoppingRule
+        scheduler = (
+            ASHAScheduler(**params)
+            if scheduler == "asha"
+            else MedianStoppingRule(**params)
+        )
     if use_ray:
         try:
             from ray import tune
@@ -376,15 +425,18 @@ def run(
     time_start = time.time()
     _use_ray = False
     if scheduler:
-        scheduler.set_search_properties(metric=metric, mode=mode)
+        scheduler.set_search_properties(
+            metric=metric or DEFAULT_METRIC, mode=mode or "min"
+        )
     from .trial_runner import SequentialTrialRunner
 
     global _runner
     _runner = SequentialTrialRunner(
         search_alg=search_alg,
         scheduler=scheduler,
-        metric=metric,
+        metric=metric or DEFAULT_METRIC,
         mode=mode,
+        track_metrics=track_metrics,
     )
     num_trials = 0
     if time_budget_s is None:
@@ -407,6 +459,8 @@ def run(
                     report(**result)
                 else:
                     report(_metric=result)
+            if verbose and trial_to_run.is_finished():
+                logger.info(f"trial {num_trials} stopped early")
             _runner.stop_trial(trial_to_run)
             fail = 0
         else:
@@ -1,4 +1,5 @@
 import unittest
+import pytest
 import numpy as np
 import scipy.sparse
 from sklearn.datasets import load_breast_cancer
@@ -6,6 +7,7 @@ import pandas as pd
 from datetime import datetime
 from flaml import AutoML
 from flaml.model import LGBMEstimator
+from flaml.training_log import training_log_reader
 from flaml import tune
 
 
@@ -233,6 +235,36 @@ class TestClassification(unittest.TestCase):
         except ImportError:
             return
 
+    def test_parallel_local(self):
+        X, y = load_breast_cancer(return_X_y=True)
+        automl = AutoML()
+        # the trials of NLP tasks run in local worker processes without ray
+        automl._search_parallel = automl._search_parallel_local
+        automl.fit(
+            X,
+            y,
+            task="classification",
+            n_concurrent_trials=2,
+            max_iter=6,
+            estimator_list=["lgbm", "rf"],
+            hpo_method="cfo",
+            log_file_name="test/parallel_local.log",
+            log_type="all",
+            verbose=0,
+        )
+        assert automl.modelcount == 6
+        assert automl.best_loss < 0.2 and (automl.predict(X) == y).mean() > 0.8
+        with training_log_reader("test/parallel_local.log") as reader:
+            intervals = sorted(
+                (record.wall_clock_time - record.trial_time, record.wall_clock_time)
+                for record in reader.records()
+            )
+        # a trial starts in the other worker before the previous one ends
+        assert len(intervals) == 6
+        assert any(
+            start < end for (_, end), (start, _) in zip(intervals, intervals[1:])
+        )
+
     def test_parallel_xgboost(self, hpo_method=None):
         automl_experiment = AutoML()
         automl_settings = {
@@ -318,6 +350,228 @@ class TestClassification(unittest.TestCase):
         print(automl_experiment.best_iteration)
         print(automl_experiment.best_estimator)
 
+    def test_kneighbor_shared_index(self):
+        from sklearn.neighbors import KNeighborsClassifier
+        from flaml.model import KNeighborsEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        X_train, y_train, X_val = X[:400], y[:400], X[400:]
+        models = []
+        for n_neighbors in [20, 5, 1]:
+            estimator = KNeighborsEstimator(task="binary", n_neighbors=n_neighbors)
+            estimator.fit(X_train, y_train)
+            models.append(estimator.model)
+            sklearn_model = KNeighborsClassifier(
+                n_neighbors=n_neighbors, weights="distance"
+            ).fit(X_train, y_train)
+            assert (estimator.predict(X_val) == sklearn_model.predict(X_val)).all()
+            assert np.allclose(
+                estimator.predict_proba(X_val), sklearn_model.predict_proba(X_val)
+            )
+        # the fitted index is shared across n_neighbors
+        assert models[0]._tree is models[2]._tree
+
+    def test_kneighbor_batch_predict(self):
+        from sklearn.neighbors import KNeighborsClassifier
+        from flaml.model import KNeighborsEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        X_train, y_train, X_val = X[:400], y[:400], X[400:]
+        config = {"n_neighbors": 5}
+        estimator = KNeighborsEstimator(task="binary", **config)
+        estimator.fit(X_train, y_train)
+        batch = estimator.batch_predict(config, X_val, proba=True)
+        assert sorted(c["n_neighbors"] for c, _ in batch) == [
+            1, 2, 3, 4, 6, 7, 8, 9, 10
+        ]
+        for batch_config, proba in batch:
+            sklearn_model = KNeighborsClassifier(
+                weights="distance", **batch_config
+            ).fit(X_train, y_train)
+            assert np.allclose(proba, sklearn_model.predict_proba(X_val))
+        # only the batch query of the validation data is cached
+        entry = KNeighborsEstimator._index_cache[estimator._index_key]
+        assert len(entry["queries"]) == 1
+        KNeighborsEstimator.init()
+        assert not KNeighborsEstimator._index_cache
+        from unittest.mock import patch
+        from flaml.searcher.blendsearch import BlendSearch
+
+        automl = AutoML()
+        with patch.object(
+            BlendSearch,
+            "add_evaluated_result",
+            autospec=True,
+            side_effect=BlendSearch.add_evaluated_result,
+        ) as add_evaluated_result:
+            automl.fit(
+                X,
+                y,
+                task="classification",
+                estimator_list=["kneighbor"],
+                eval_method="holdout",
+                max_iter=5,
+            )
+        # the batch results of the trials reach the searcher
+        evaluated = [call.args[1] for call in add_evaluated_result.call_args_list]
+        assert len(evaluated) >= len(batch)
+        assert all(set(config) == {"n_neighbors"} for config in evaluated)
+
+    def test_catboost_pool_cache(self):
+        pytest.importorskip("catboost")
+        from flaml.model import CatBoostEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        CatBoostEstimator.init()
+        cache = CatBoostEstimator._pool_cache
+        for learning_rate in [0.1, 0.05]:
+            estimator = CatBoostEstimator(
+                task="binary", n_estimators=8, learning_rate=learning_rate
+            )
+            estimator.fit(X, y)
+            if learning_rate == 0.1:
+                (pools,) = cache.values()
+        # the second fit on the same data reuses the pools
+        assert len(cache) == 1 and next(iter(cache.values())) is pools
+        CatBoostEstimator.init()
+        assert not cache
+
+    def test_forest_warm_start(self):
+        from sklearn.ensemble import RandomForestClassifier
+        from flaml.model import RandomForestEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        X_train, y_train, X_val = X[:400], y[:400], X[400:]
+        config = {"n_estimators": 8, "max_leaves": 16, "max_features": 0.5}
+        small = RandomForestEstimator(task="binary", random_state=1, **config)
+        small.fit(X_train, y_train)
+        config["n_estimators"] = 20
+        estimator = RandomForestEstimator(task="binary", random_state=1, **config)
+        estimator.fit(X_train, y_train)
+        # the trees of the smaller forest are reused
+        assert estimator.model.estimators_[7] is small.model.estimators_[7]
+        for batch_config, proba in estimator.batch_predict(config, X_val, True):
+            sklearn_model = RandomForestClassifier(
+                n_estimators=batch_config["n_estimators"],
+                max_leaf_nodes=16,
+                max_features=0.5,
+                random_state=1,
+            ).fit(X_train, y_train)
+            assert np.allclose(proba, sklearn_model.predict_proba(X_val))
+        config["n_estimators"] = 100000
+        estimator = RandomForestEstimator(task="binary", **config)
+        estimator.fit(X_train, y_train, budget=1)
+        assert estimator.params["n_estimators"] < 100000
+        RandomForestEstimator.init()
+        assert not RandomForestEstimator._forest_cache
+
+    def test_fit_without_callback(self):
+        from flaml.model import LGBMEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        estimator = LGBMEstimator(task="binary", n_estimators=20, num_leaves=4)
+        estimator.HAS_CALLBACK = False
+        estimator.fit(X, y)
+        reference = LGBMEstimator(task="binary", n_estimators=20, num_leaves=4)
+        reference.fit(X, y)
+        # continued training from the first chunk equals a single pass
+        assert estimator.params["n_estimators"] == 20
+        assert np.allclose(estimator.predict_proba(X), reference.predict_proba(X))
+        estimator = LGBMEstimator(task="binary", n_estimators=10 ** 6, num_leaves=4)
+        estimator.HAS_CALLBACK = False
+        estimator.fit(X, y, budget=1)
+        assert estimator.params["n_estimators"] < 10 ** 6
+        # the time per iteration is shared only by models of similar size on
+        # the same data
+        LGBMEstimator.init()
+        for X_train, num_leaves in [(X, 4), (X, 256), (X + 1, 4), (X, 4)]:
+            estimator = LGBMEstimator(task="binary", n_estimators=8, num_leaves=num_leaves)
+            estimator.HAS_CALLBACK = False
+            estimator.fit(X_train, y)
+        assert len(LGBMEstimator._time_per_iter_by_size) == 3
+        LGBMEstimator.init()
+        assert not LGBMEstimator._time_per_iter_by_size
+
+    def test_cost_model(self):
+        from flaml.automl import CostModel
+        from flaml.model import LGBMEstimator, RandomForestEstimator
+
+        cost_model = CostModel()
+        config = {"n_estimators": 4, "num_leaves": 4}
+        # the prior follows cost_relative2lgbm
+        assert np.isclose(
+            cost_model.predict(RandomForestEstimator, config, 1000)
+            / cost_model.predict(LGBMEstimator, config, 1000),
+            RandomForestEstimator.cost_relative2lgbm(),
+        )
+        for sample_size in [1000, 4000, 16000]:
+            cost_model.update(LGBMEstimator, config, sample_size, sample_size / 1000)
+        assert np.isclose(cost_model.predict(LGBMEstimator, config, 16000), 16, 0.2)
+
+    def test_thread_tuner(self):
+        from flaml.automl import CostModel, ThreadTuner
+        from flaml.model import LGBMEstimator
+
+        tuner = ThreadTuner(8, 20, CostModel())
+        config = {"n_estimators": 4, "num_leaves": 4}
+        # measured scaling curves: small trials are slowed down by threads
+        for sample_size, times in [
+            (2000, {1: 1.0, 2: 0.9, 4: 1.2, 8: 2.0}),
+            (10 ** 6, {1: 8.0, 2: 4.2, 4: 2.3, 8: 1.5}),
+        ]:
+            for _ in range(6):
+                n_threads = tuner.choose(LGBMEstimator, config, sample_size)
+                tuner.update(
+                    LGBMEstimator, config, sample_size, n_threads, times[n_threads]
+                )
+            assert n_threads == min(times, key=times.get)
+        # the thread tuning is opt-in; n_jobs=-1 means all the cores
+        X, y = load_breast_cancer(return_X_y=True)
+        for n_jobs, tuned in [(-1, False), ("auto", True)]:
+            automl = AutoML()
+            automl.fit(
+                X, y, n_jobs=n_jobs, max_iter=2, estimator_list=["lgbm"], verbose=0
+            )
+            assert (automl._state.thread_tuner is not None) == tuned
+            assert automl._state.resources_per_trial["cpu"] > 0
+
+    def test_shared_predictions(self):
+        from flaml.ml import evaluate_metrics, shared_predictions
+        from flaml.model import LGBMEstimator
+
+        X, y = load_breast_cancer(return_X_y=True)
+        estimator = LGBMEstimator(task="binary", n_estimators=4, num_leaves=4)
+        estimator.fit(X, y)
+        expected = estimator.predict(X)
+        calls = []
+        predict_proba = estimator.predict_proba
+        estimator.predict_proba = lambda X: calls.append(1) or predict_proba(X)
+        with shared_predictions(estimator):
+            estimator.predict_proba(X)
+            assert (estimator.predict(X) == expected).all()
+        assert len(calls) == 1
+        losses = evaluate_metrics(
+            ["roc_auc", "log_loss", "accuracy", "ap"], estimator, X, y, "binary"
+        )
+        assert len(calls) == 2 and 0 < losses["accuracy"] < 0.5
+        # the classes are derived from the probabilities computed up front,
+        # whatever the order of the metrics
+        predict_calls = []
+        predict = estimator.predict
+        estimator.predict = lambda X: predict_calls.append(1) or predict(X)
+        losses = evaluate_metrics(["accuracy", "log_loss"], estimator, X, y, "binary")
+        assert len(calls) == 3 and not predict_calls
+        assert np.isclose(losses["accuracy"], 1 - np.mean(expected == y))
+
+    def test_accuracy_column_prediction(self):
+        from flaml.ml import sklearn_metric_loss_score
+
+        y = np.array([0, 1, 2, 1, 0])
+        # a column of predictions, as catboost predicts for multiclass
+        y_pred = np.array([[0], [1], [2], [0], [0]])
+        assert np.isclose(sklearn_metric_loss_score("accuracy", y_pred, y), 0.2)
+        assert np.isclose(sklearn_metric_loss_score("accuracy", y_pred.ravel(), y), 0.2)
+
 
 if __name__ == "__main__":
     unittest.main()
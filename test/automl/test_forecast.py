@@ -1,3 +1,4 @@
+import time
 import numpy as np
 from flaml import AutoML
 
@@ -124,6 +125,86 @@ def test_numpy():
         print(automl.predict(12))
 
 
+def test_arima_batch_predict():
+    import pandas as pd
+    from flaml.model import ARIMA
+
+    rs = np.random.RandomState(0)
+    n = 120
+    y = pd.Series(np.cumsum(rs.randn(n)) + np.sin(np.arange(n) / 2))
+    X = pd.DataFrame({"ds": pd.date_range("2000-01-01", periods=n, freq="MS")})
+    X_train, y_train, X_val = X[:-12], y[:-12], X[-12:]
+    config = {"p": 2.0, "d": 1.0, "q": 1.0}
+    for n_jobs in [1, 2]:
+        ARIMA.init()
+        estimator = ARIMA(n_jobs=n_jobs, **config)
+        estimator.fit(X_train, y_train, budget=60)
+        batch = estimator.batch_predict(config, X_val)
+        assert sorted((c["p"], c["q"]) for c, _ in batch) == [
+            (1, 1),
+            (2, 0),
+            (2, 2),
+            (3, 1),
+        ]
+        # the neighbors share the differencing order and are cached
+        neighbor, pred = batch[0]
+        assert neighbor["d"] == config["d"] and len(pred) == len(X_val)
+        other = ARIMA(**neighbor)
+        start_time = time.time()
+        # a cached order reports the time of its original fit
+        train_time = other.fit(X_train, y_train)
+        assert time.time() - start_time < train_time
+        assert np.allclose(other.predict(X_val), pred)
+        # orders evaluated already are skipped
+        estimator.fit(X_train, y_train, budget=60)
+        assert estimator.batch_predict(config, X_val) == []
+    ARIMA.init()
+    assert not ARIMA._fit_cache
+
+
+def test_global_forecast():
+    import pandas as pd
+    from flaml.forecast import GlobalForecaster, LagFeatureBuilder, RollingOriginSplit
+
+    frames = []
+    for i in range(20):
+        # series of different scales and starts
+        t = pd.date_range("2020-01-01", periods=60, freq="D")[i % 5 :]
+        v = (i + 1) * (2 + np.sin(np.arange(len(t)) * 2 * np.pi / 7 + i))
+        frames.append(pd.DataFrame({"unique_id": i, "ds": t, "y": v}))
+    df = pd.concat(frames, ignore_index=True)
+    horizon = 7
+    builder = LagFeatureBuilder(horizon, windows=[7])
+    X, y = builder.fit_transform(df)
+    assert builder.freq == "D" and X["ds"].is_monotonic_increasing
+    # lag_h is the normalized value h steps before in the same series
+    row = X[(X["unique_id"] == 3) & (X["ds"] == pd.Timestamp("2020-02-20"))]
+    before = df[(df["unique_id"] == 3) & (df["ds"] == pd.Timestamp("2020-02-13"))]
+    assert np.isclose(
+        row["lag_7"].iloc[0], before["y"].iloc[0] / builder.scale_[3]
+    )
+    # the scales are learned from the rows before the cutoff only
+    cutoff = pd.Timestamp("2020-02-09")
+    builder = LagFeatureBuilder(horizon, windows=[7])
+    X_cut, _ = builder.fit_transform(df, scale_until=cutoff)
+    history = df[(df["unique_id"] == 3) & (df["ds"] < cutoff)]
+    assert np.isclose(builder.scale_[3], history["y"].abs().mean())
+    assert X_cut["ds"].equals(X["ds"])
+    split = RollingOriginSplit(X["ds"], n_splits=3, test_size=horizon)
+    for train_index, val_index in split.split(X):
+        assert X["ds"].iloc[train_index].max() < X["ds"].iloc[val_index].min()
+        assert X["ds"].iloc[val_index].nunique() == horizon
+    forecaster = GlobalForecaster(horizon, windows=[7])
+    forecaster.fit(df, max_iter=3, estimator_list=["lgbm"], verbose=0)
+    assert np.allclose(forecaster.features.scale_, builder.scale_)
+    forecast = forecaster.predict(df)
+    assert len(forecast) == 20 * horizon
+    last = df.groupby("unique_id")["ds"].max()
+    first = forecast.groupby("unique_id")["ds"].min()
+    assert (first == last + pd.Timedelta(days=1)).all()
+    assert forecast["y"].notna().all()
+
+
 def load_multi_dataset():
     """multivariate time series forecasting dataset"""
     import pandas as pd
@@ -311,10 +311,41 @@ class TestMultiClass(unittest.TestCase):
             "log_training_metric": True,
             "n_jobs": 1,
             "model_history": True,
+            "auc_sample_size": 100,
         }
         X_train, y_train = load_iris(return_X_y=True)
         automl_experiment.fit(X_train=X_train, y_train=y_train, **automl_settings)
 
+    def test_multiclass_metric_kernels(self):
+        from sklearn.metrics import roc_auc_score, log_loss
+        from flaml import ml
+
+        rs = np.random.RandomState(0)
+        y = rs.randint(5, size=2000)
+        # rounded to have tied scores
+        proba = rs.rand(2000, 5).round(1) + 1e-3
+        proba /= proba.sum(axis=1, keepdims=True)
+        weight = rs.rand(2000)
+        for multi_class in ["ovr", "ovo"]:
+            assert np.isclose(
+                ml.sklearn_metric_loss_score(f"roc_auc_{multi_class}", proba, y),
+                1 - roc_auc_score(y, proba, multi_class=multi_class),
+            )
+        assert np.isclose(
+            ml.sklearn_metric_loss_score("roc_auc_ovr", proba, y, sample_weight=weight),
+            1 - roc_auc_score(y, proba, multi_class="ovr", sample_weight=weight),
+        )
+        assert np.isclose(
+            ml.sklearn_metric_loss_score("log_loss", proba, y, sample_weight=weight),
+            log_loss(y, proba, sample_weight=weight),
+        )
+        auc, bound = ml.sampled_roc_auc(y, proba, "ovo", sample_size=1000)
+        assert abs(auc - roc_auc_score(y, proba, multi_class="ovo")) <= bound < 1
+        assert np.isclose(
+            ml.sklearn_metric_loss_score("roc_auc_ovo", proba, y, auc_sample_size=1000),
+            1 - auc,
+        )
+
     def test_sparse_matrix_classification(self):
         automl_experiment = AutoML()
         automl_settings = {
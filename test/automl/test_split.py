@@ -1,4 +1,5 @@
 import unittest
+import time
 
 from sklearn.datasets import fetch_openml
 from flaml.automl import AutoML
@@ -123,6 +124,82 @@ def test_rank():
     automl.fit(X, y, **automl_settings)
 
 
+def test_rank_metrics():
+    import numpy as np
+    from sklearn.metrics import ndcg_score
+    from flaml.ml import sklearn_metric_loss_score
+
+    rs = np.random.RandomState(0)
+    counts = rs.randint(2, 30, 200)
+    groups = np.repeat(np.arange(len(counts)), counts)
+    y_true = rs.randint(0, 4, len(groups))
+    y_score = np.round(rs.rand(len(groups)), 1)  # with ties
+    starts = np.cumsum(counts) - counts
+    expected = np.mean(
+        [
+            ndcg_score([y_true[i : i + c]], [y_score[i : i + c]], k=5)
+            for i, c in zip(starts, counts)
+        ]
+    )
+    loss = sklearn_metric_loss_score("ndcg@5", y_score, y_true, groups=groups)
+    assert np.isclose(loss, 1 - expected)
+    # a per-group reference; ties keep the order of the instances
+    for metric, k in [("map", None), ("map", 3), ("mrr", None), ("mrr", 3)]:
+        scores = []
+        for i, c in zip(starts, counts):
+            order = np.argsort(-y_score[i : i + c], kind="stable")
+            relevant = y_true[i : i + c][order] > 0
+            hits = np.flatnonzero(relevant[:k])
+            if metric == "mrr":
+                scores.append(1 / (hits[0] + 1) if len(hits) else 0)
+                continue
+            n_relevant = min(relevant.sum(), k or c)
+            precisions = [(hits <= j).sum() / (j + 1) for j in hits]
+            scores.append(sum(precisions) / n_relevant if n_relevant else 0)
+        name = metric if k is None else f"{metric}@{k}"
+        loss = sklearn_metric_loss_score(name, y_score, y_true, groups=groups)
+        assert np.isclose(loss, 1 - np.mean(scores)), name
+    # the relevant instances are ranked 2nd and 4th
+    y_true, y_score = [0, 1, 0, 1], [0.9, 0.8, 0.7, 0.6]
+    assert np.isclose(sklearn_metric_loss_score("map", y_score, y_true), 0.5)
+    assert np.isclose(sklearn_metric_loss_score("map@2", y_score, y_true), 0.75)
+    assert np.isclose(sklearn_metric_loss_score("mrr", y_score, y_true), 0.5)
+
+
+def test_cv_early_stop():
+    import numpy as np
+    from sklearn.datasets import load_breast_cancer
+    from sklearn.model_selection import KFold
+    from flaml.ml import _cannot_beat, evaluate_model_CV
+    from flaml.model import LGBMEstimator
+
+    # the remaining folds at loss 0 can not make the mean better
+    assert _cannot_beat([0.5], 5, 0.1, 0)
+    assert not _cannot_beat([0.5], 5, 0.1)
+    assert not _cannot_beat([0.5], 5, np.inf, 0)
+    # racing
+    assert _cannot_beat([0.30, 0.31, 0.30], 5, 0.2)
+    assert not _cannot_beat([0.30, 0.31, 0.30], 5, 0.2, racing=False)
+    assert not _cannot_beat([0.1, 0.5], 5, 0.2)
+
+    X, y = load_breast_cancer(return_X_y=True)
+    kf = KFold(n_splits=5, shuffle=True, random_state=0)
+    config = {"n_estimators": 4, "num_leaves": 4}
+    val_loss, _, train_time, _ = evaluate_model_CV(
+        config, LGBMEstimator(**config), X, y, 100, kf, "binary", "accuracy", np.inf
+    )
+    # a config far worse than the incumbent stops after the first folds
+    start = time.time()
+    stopped_loss, metric, stopped_time, _ = evaluate_model_CV(
+        config, LGBMEstimator(**config), X, y, 100, kf, "binary", "accuracy", 0.001
+    )
+    assert stopped_loss > 0.001 and time.time() - start < train_time
+    assert abs(stopped_loss - val_loss) < 0.05
+    # the stopped cv is marked and its time is scaled to all the folds
+    assert metric["cv_n_splits"] == 5 and metric["cv_folds_done"] < 5
+    assert stopped_time > 0
+
+
 if __name__ == "__main__":
     # unittest.main()
     test_groups()
@@ -90,6 +90,51 @@ class TestTrainingLog(unittest.TestCase):
             automl = AutoML()
             automl.fit(X_train=X_train, y_train=y_train, max_iter=0, task="regression")
 
+    def test_train_metric_sample(self):
+        import numpy as np
+        from sklearn.datasets import make_classification
+
+        X_train, y_train = make_classification(
+            n_samples=5000, weights=[0.9], random_state=0
+        )
+        for eval_method in ["holdout", "cv"]:
+            automl = AutoML()
+            automl.fit(
+                X_train=X_train,
+                y_train=y_train,
+                task="classification",
+                eval_method=eval_method,
+                estimator_list=["lgbm"],
+                max_iter=3,
+                log_training_metric=True,
+                train_metric_sample_size=500,
+                n_jobs=1,
+                keep_search_state=True,
+            )
+            index = automl._state.train_metric_index
+            y = (
+                automl._state.y_train
+                if eval_method == "holdout"
+                else automl._state.y_train_all
+            )
+            assert len(index) == 500 and len(np.unique(index)) == 500
+            # stratified by the labels
+            assert abs(np.mean(y[index]) - np.mean(y)) < 0.01
+            train_loss = automl._search_states["lgbm"].metric_for_logging["train_loss"]
+            assert 0 <= train_loss <= 1
+            # all the training data by default, and a subsample with 'auto'
+            for train_metric_sample_size in [None, "auto"]:
+                automl.fit(
+                    X_train=X_train,
+                    y_train=y_train,
+                    task="classification",
+                    eval_method=eval_method,
+                    max_iter=1,
+                    train_metric_sample_size=train_metric_sample_size,
+                )
+                index = automl._state.train_metric_index
+                assert (index is None) == (train_metric_sample_size is None)
+
     def test_illfilename(self):
         try:
             self.test_training_log("/")
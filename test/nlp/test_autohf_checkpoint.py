@@ -0,0 +1,59 @@
+import os
+
+
+def test_checkpoint_retention(tmpdir):
+    from flaml.nlp.checkpoint import CheckpointManager
+
+    output_dir = str(tmpdir)
+    orphan = os.path.join(output_dir, "trial_99999999_orphan")
+    os.makedirs(orphan)
+    # the directory of a live process, e.g., a concurrent trial worker
+    parent = os.path.join(output_dir, f"trial_{os.getppid()}_running")
+    os.makedirs(parent)
+    manager = CheckpointManager(output_dir, keep_trials=2)
+    assert not os.path.exists(orphan) and os.path.exists(parent)
+    os.rmdir(parent)
+
+    trial_dirs = []
+    for loss in [0.3, 0.1, 0.2, 0.4]:
+        trial_dir = manager.new_trial_dir()
+        os.makedirs(os.path.join(trial_dir, "checkpoint-1"))
+        retained = manager.retains(loss)
+        manager.register(trial_dir, loss)
+        assert os.path.isdir(trial_dir) == retained
+        trial_dirs.append(trial_dir)
+    assert [os.path.isdir(trial_dir) for trial_dir in trial_dirs] == [
+        False,
+        True,
+        True,
+        False,
+    ]
+
+    failed = manager.new_trial_dir()
+    os.makedirs(failed)
+    manager.remove(failed)
+    assert sorted(os.listdir(output_dir)) == sorted(
+        os.path.basename(trial_dir) for trial_dir in trial_dirs[1:3]
+    )
+
+
+def test_checkpoint_pinning(tmpdir):
+    from flaml.nlp.checkpoint import CheckpointManager
+
+    class Estimator:
+        pass
+
+    manager = CheckpointManager(str(tmpdir), keep_trials=1)
+    pinned = manager.new_trial_dir()
+    os.makedirs(pinned)
+    manager.register(pinned, 0.2)
+    estimator = Estimator()
+    manager.pin(pinned, estimator)
+    better = manager.new_trial_dir()
+    os.makedirs(better)
+    manager.register(better, 0.1)
+    # evicted, but kept while the estimator may still load its checkpoint
+    manager.cleanup_orphans()
+    assert os.path.isdir(pinned)
+    del estimator
+    assert not os.path.isdir(pinned) and os.path.isdir(better)
@@ -0,0 +1,67 @@
+import os
+import pytest
+
+
+@pytest.mark.skipif(os.name == "posix", reason="do not run on mac os")
+def test_concurrent_trials():
+    try:
+        import transformers
+    except ImportError:
+        return
+    from flaml import AutoML
+    from flaml.training_log import training_log_reader
+    from datasets import load_dataset
+
+    train_dataset = (
+        load_dataset("glue", "mrpc", split="train[:1%]").to_pandas().iloc[0:32]
+    )
+    dev_dataset = (
+        load_dataset("glue", "mrpc", split="train[1%:2%]").to_pandas().iloc[0:32]
+    )
+    custom_sent_keys = ["sentence1", "sentence2"]
+    label_key = "label"
+
+    X_train = train_dataset[custom_sent_keys]
+    y_train = train_dataset[label_key]
+    X_val = dev_dataset[custom_sent_keys]
+    y_val = dev_dataset[label_key]
+
+    automl_settings = {
+        "gpu_per_trial": 0,
+        "time_budget": 120,
+        "task": "seq-classification",
+        "metric": "accuracy",
+        "log_file_name": "test/concurrent_trials.log",
+        "log_type": "all",
+        "custom_hpo_args": {
+            "model_path": "google/electra-small-discriminator",
+            "output_dir": "test/data/output/",
+            "ckpt_per_epoch": 1,
+            "fp16": False,
+        },
+    }
+    for n_concurrent_trials in [1, 2]:
+        automl = AutoML()
+        automl.fit(
+            X_train=X_train,
+            y_train=y_train,
+            X_val=X_val,
+            y_val=y_val,
+            n_concurrent_trials=n_concurrent_trials,
+            **automl_settings,
+        )
+        assert automl.modelcount >= n_concurrent_trials
+        assert automl.best_loss < 1 and automl.predict(X_val).shape == y_val.shape
+        with training_log_reader(automl_settings["log_file_name"]) as reader:
+            intervals = sorted(
+                (record.wall_clock_time - record.trial_time, record.wall_clock_time)
+                for record in reader.records()
+            )
+        # with two workers, a trial starts before the previous one ends
+        assert (n_concurrent_trials > 1) == any(
+            start < end for (_, end), (start, _) in zip(intervals, intervals[1:])
+        )
+
+
+if __name__ == "__main__":
+    test_concurrent_trials()
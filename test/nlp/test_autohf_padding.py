@@ -0,0 +1,135 @@
+import os
+import time
+import pytest
+
+
+def _glue_style_data(n=512):
+    import numpy as np
+    import pandas as pd
+
+    rs = np.random.RandomState(0)
+    words = ["flaml", "tune", "fast", "cheap", "model", "data", "text", "test"]
+
+    def sentence():
+        # short sentences of varying length, as in most GLUE tasks
+        return " ".join(rs.choice(words, rs.randint(3, 24)))
+
+    X = pd.DataFrame(
+        {
+            "sentence1": [sentence() for _ in range(n)],
+            "sentence2": [sentence() for _ in range(n)],
+        }
+    )
+    y = pd.Series(rs.randint(0, 2, n))
+    return X, y
+
+
+def _throughput(X, y, **custom_hpo_args):
+    from flaml.model import TransformersEstimator
+
+    X = X.astype("string")
+    estimator = TransformersEstimator(
+        task="seq-classification",
+        learning_rate=1e-5,
+        num_train_epochs=1,
+        per_device_train_batch_size=32,
+        warmup_ratio=0,
+        weight_decay=0,
+        adam_epsilon=1e-6,
+        seed=42,
+        global_max_steps=10 ** 6,
+    )
+    custom_hpo_args.update(
+        {
+            "model_path": "google/electra-small-discriminator",
+            "output_dir": "test/data/output/",
+            "fp16": False,
+            "max_seq_length": 128,
+        }
+    )
+    start_time = time.time()
+    estimator.fit(
+        X, y, metric="accuracy", X_val=X, y_val=y, custom_hpo_args=custom_hpo_args
+    )
+    return len(X) / (time.time() - start_time)
+
+
+@pytest.mark.skipif(os.name == "posix", reason="do not run on mac os")
+def test_dynamic_padding():
+    try:
+        from transformers import DataCollatorWithPadding
+    except ImportError:
+        return
+    from flaml.nlp.utils import HPOArgs, get_tokenizer, tokenize_text_seqclassification
+
+    X, _ = _glue_style_data(64)
+    X = X.astype("string")
+    model_path = "google/electra-small-discriminator"
+    lengths = {}
+    for pad_to_max_length in [True, False]:
+        args = HPOArgs(
+            model_path=model_path,
+            max_seq_length=128,
+            pad_to_max_length=pad_to_max_length,
+        )
+        tokenized = tokenize_text_seqclassification(X, args)
+        lengths[pad_to_max_length] = tokenized["input_ids"].map(len)
+    # padded to max_seq_length when tokenizing, or only truncated
+    assert (lengths[True] == 128).all()
+    assert lengths[False].max() < 128 and lengths[False].nunique() > 1
+    # the collator pads every batch to its longest sequence
+    collator = DataCollatorWithPadding(get_tokenizer(model_path))
+    features = [{"input_ids": ids} for ids in tokenized["input_ids"][:8]]
+    batch = collator(features)
+    assert tuple(batch["input_ids"].shape) == (8, lengths[False][:8].max())
+
+
+def test_tokenization_cache(monkeypatch):
+    import pandas as pd
+    from flaml.nlp import utils
+    from flaml.nlp.utils import HPOArgs, tokenize_text_seqclassification
+
+    calls = []
+
+    def tokenize(X, tokenizer, custom_hpo_args):
+        calls.append(len(X))
+        return pd.DataFrame(
+            {"input_ids": [[len(s)] for s in X.iloc[:, 0]]}, index=X.index
+        )
+
+    monkeypatch.setattr(utils, "get_tokenizer", lambda model_path: None)
+    monkeypatch.setattr(utils, "_tokenize_glue", tokenize)
+    utils.clear_cache()
+    X, _ = _glue_style_data(64)
+    args = HPOArgs(model_path="google/electra-small-discriminator", max_seq_length=128)
+    first = tokenize_text_seqclassification(X, args)
+    # the same frame, even a copy, is tokenized once
+    assert tokenize_text_seqclassification(X.copy(), args) is first
+    assert len(calls) == 1
+    # a different index or max_seq_length is tokenized again
+    reindexed = tokenize_text_seqclassification(X.set_index(X.index + 1), args)
+    assert (reindexed.index == X.index + 1).all()
+    args.max_seq_length = 64
+    tokenize_text_seqclassification(X, args)
+    assert len(calls) == 3
+    utils.clear_cache()
+    tokenize_text_seqclassification(X, args)
+    assert len(calls) == 4
+    utils.clear_cache()
+
+
+def benchmark_padding():
+    """Print the training throughput of the padding strategies."""
+    X, y = _glue_style_data()
+    padded = _throughput(X, y, pad_to_max_length=True)
+    dynamic = _throughput(X, y)
+    grouped = _throughput(X, y, group_by_length=True)
+    print(
+        f"examples/sec: max_length padding {padded:.1f}, "
+        f"dynamic padding {dynamic:.1f}, grouped by length {grouped:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    test_dynamic_padding()
+    benchmark_padding()
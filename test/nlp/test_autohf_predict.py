@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_predict_order(monkeypatch):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from tokenizers import Tokenizer
+    from tokenizers.models import WordLevel
+    from transformers import PreTrainedTokenizerFast
+    from flaml.model import TransformersEstimator
+    from flaml.nlp import utils
+    from flaml.nlp.utils import HPOArgs
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=Tokenizer(WordLevel({"[PAD]": 0, "[UNK]": 1}, "[UNK]")),
+        pad_token="[PAD]",
+    )
+    monkeypatch.setattr(utils, "get_tokenizer", lambda model_path: tokenizer)
+
+    class SumModel(torch.nn.Module):
+        """Logits of the sum and the number of the unpadded input ids."""
+
+        device = torch.device("cpu")
+
+        def forward(self, input_ids, attention_mask, **kwargs):
+            return (
+                torch.stack(
+                    [(input_ids * attention_mask).sum(1), attention_mask.sum(1)], 1
+                ).float(),
+            )
+
+    rs = np.random.RandomState(0)
+    input_ids = [rs.randint(2, 100, rs.randint(1, 20)).tolist() for _ in range(11)]
+    X_test = pd.DataFrame({"input_ids": input_ids})
+    estimator = TransformersEstimator(task="seq-classification")
+    estimator.custom_hpo_args = HPOArgs(eval_batch_size=4)
+    monkeypatch.setattr(estimator, "_load_best_model", lambda: SumModel())
+    # the rows are batched in the order of their lengths
+    for batch_size in [None, 3, 100]:
+        logits = estimator._predict_logits(X_test, batch_size)
+        assert logits.tolist() == [[sum(ids), len(ids)] for ids in input_ids]
+    assert (estimator.predict(X_test) == logits.argmax(axis=1)).all()
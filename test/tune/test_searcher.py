@@ -155,3 +155,130 @@ except (ImportError, AssertionError):
         print(searcher.suggest("t1"))
         print(searcher.suggest("t2"))
         print(searcher.suggest("t3"))
+
+
+def test_surrogate_search():
+    import time
+    from flaml import tune
+    from flaml.searcher.surrogate import SurrogateSearch
+    from flaml.searcher.blendsearch import BlendSearch
+
+    space = {
+        "x": tune.uniform(-5, 5),
+        "y": tune.lograndint(1, 1000),
+        "z": tune.choice(["a", "b", "c"]),
+        "nested": {"q": tune.quniform(0, 1, 0.1), "const": 3},
+    }
+
+    def obj(config):
+        return (
+            config["x"] ** 2
+            + np.log(config["y"])
+            + (config["z"] != "b")
+            + config["nested"]["q"]
+        )
+
+    searcher = SurrogateSearch(
+        space=space, metric="m", mode="min", seed=0, points_to_evaluate=[{"x": 1}]
+    )
+    latency = []
+    for i in range(300):
+        start = time.time()
+        config = searcher.suggest(str(i))
+        latency.append(time.time() - start)
+        assert -5 <= config["x"] <= 5 and 1 <= config["y"] < 1000
+        assert config["nested"]["const"] == 3
+        searcher.on_trial_complete(str(i), {"m": obj(config)})
+    # the latency is bounded as trials accumulate
+    assert np.mean(latency[-50:]) < max(10 * np.mean(latency[20:70]), 0.01)
+    best = searcher._y[: searcher._n].min()
+    assert best < 2
+    configs = searcher.suggest_batch(["b1", "b2", "b3"])
+    assert len(configs) == 3 and len(searcher._pending) == 3
+    searcher.on_trial_complete("b1", None, error=True)
+    searcher.add_evaluated_point({"x": 0, "y": 1, "z": "b", "nested/q": 0}, 0)
+    assert searcher._y[: searcher._n].min() == 0
+    # as the global search of BlendSearch
+    analysis = tune.run(
+        lambda config: {"m": config["x"] ** 2 + np.log(config["y"])},
+        search_alg=BlendSearch(
+            metric="m",
+            mode="min",
+            space={"x": tune.uniform(-5, 5), "y": tune.lograndint(1, 1000)},
+            global_search_alg=SurrogateSearch(
+                space={"x": tune.uniform(-5, 5), "y": tune.lograndint(1, 1000)},
+                metric="m",
+                mode="min",
+            ),
+            low_cost_partial_config={"y": 1},
+        ),
+        metric="m",
+        mode="min",
+        num_samples=50,
+    )
+    assert len(analysis.trials) > 1
+
+
+def test_hierarchical_space_without_optuna(monkeypatch):
+    import sys
+    from flaml import tune
+    from flaml.searcher import blendsearch
+    from flaml.searcher.surrogate import SurrogateSearch
+
+    # the global search bound when optuna can not be imported
+    monkeypatch.setitem(sys.modules, "optuna", None)
+    monkeypatch.setattr(blendsearch, "GlobalSearch", SurrogateSearch)
+    space = {
+        "model": tune.choice(
+            [
+                {"name": "a", "x": tune.uniform(-5, 5)},
+                {"name": "b", "y": tune.uniform(0, 1)},
+            ]
+        ),
+    }
+
+    def obj(config):
+        model = config["model"]
+        return {"m": model["x"] ** 2 if model["name"] == "a" else model["y"]}
+
+    for searcher in [
+        blendsearch.BlendSearch(metric="m", mode="min", space=space),
+        blendsearch.BlendSearch(metric="m", mode="min"),
+    ]:
+        analysis = tune.run(
+            obj,
+            config=space,
+            search_alg=searcher,
+            metric="m",
+            mode="min",
+            num_samples=20,
+        )
+        # only the local search of CFO
+        assert searcher._gs is None
+        assert len(analysis.trials) == 20
+
+
+def test_thread_pool_cap():
+    from flaml import tune
+    from flaml.searcher.blendsearch import BlendSearch
+
+    searcher = BlendSearch(
+        metric="m",
+        mode="min",
+        space={"x": tune.uniform(-10, 10), "y": tune.uniform(-10, 10)},
+        seed=1,
+    )
+    searcher.max_local_thread = 2
+    analysis = tune.run(
+        lambda config: {"m": np.sin(config["x"]) * np.cos(config["y"])},
+        search_alg=searcher,
+        num_samples=300,
+    )
+    assert len(analysis.trials) == 300
+    assert len(searcher._search_thread_pool) <= searcher.max_local_thread + 1
+    # per-trial maps are compacted after completion
+    assert not searcher._trial_proposed_by and not searcher._subspace
+    for id, thread in searcher._search_thread_pool.items():
+        if id:
+            assert not thread._search_alg._configs
+    assert all(len(r) <= 3 for r in searcher._result.values())
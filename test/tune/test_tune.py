@@ -313,6 +313,116 @@ def test_run_training_function_return_value():
     )
 
 
+def test_intermediate_result_pruning():
+    from flaml import tune
+
+    last_epochs = []
+
+    def train_func(config):
+        # a bad config converges to a higher loss
+        for epoch in range(1, 17):
+            loss = config["x"] + 1.0 / epoch
+            if not tune.report(loss=loss, epoch=epoch):
+                # the trial is stopped by the scheduler
+                break
+        # the search can suggest the same config again, e.g., on a bound
+        last_epochs.append((config["x"], epoch))
+
+    for scheduler in ("asha", "median"):
+        last_epochs.clear()
+        analysis = tune.run(
+            train_func,
+            config={"x": tune.uniform(0, 10)},
+            metric="loss",
+            mode="min",
+            prune_attr="epoch",
+            min_resource=1,
+            max_resource=16,
+            reduction_factor=2,
+            report_intermediate_result=True,
+            scheduler=scheduler,
+            num_samples=20,
+        )
+        assert len(analysis.trials) == 20
+        # some trials are stopped before reaching max_resource
+        assert min(epoch for _, epoch in last_epochs) < 16, scheduler
+        # report() returns None from the stopping result on
+        assert sorted(
+            (trial.config["x"], trial.last_result["epoch"]) for trial in analysis.trials
+        ) == sorted(last_epochs)
+        best_trial = analysis.get_best_trial()
+        assert best_trial.last_result["epoch"] == 16
+        logger.info(f"{scheduler} best config: {best_trial.config}")
+
+
+def test_metric_analysis():
+    from flaml import tune
+
+    def train_func(config):
+        for step in range(12):
+            tune.report(loss=config["x"] * step, acc=-step, info={"step": step})
+
+    analysis = tune.run(
+        train_func,
+        config={"x": tune.uniform(1, 2)},
+        metric="loss",
+        mode="min",
+        num_samples=2,
+        track_metrics=["acc", "info/step"],
+    )
+    trial = analysis.trials[0]
+    x = trial.config["x"]
+    stats = trial.metric_analysis["loss"]
+    assert stats["last"] == 11 * x and stats["min"] == 0
+    assert abs(stats["last-5-avg"] - 9 * x) < 1e-9
+    assert abs(stats["last-10-avg"] - 6.5 * x) < 1e-9
+    assert trial.metric_analysis["acc"]["max"] == 0
+    assert trial.metric_analysis["info/step"]["last"] == 11
+    # only the tracked metrics are kept
+    assert "training_iteration" not in trial.metric_analysis
+    assert analysis.get_best_trial(scope="last-5-avg") is not None
+    best_trial = analysis.get_best_trial("loss", "min", "all")
+    assert best_trial.metric_analysis["loss"]["min"] == 0
+    assert analysis.get_best_trial("acc", "max", "last") is not None
+    best_x = min(trial.config["x"] for trial in analysis.trials)
+    assert analysis.get_best_config(scope="last")["x"] == best_x
+    df = analysis.results_df
+    assert len(df) == 2 and "config/x" in df.columns and "info/step" in df.columns
+
+
+def test_analysis_table():
+    import numpy as np
+    from flaml import tune
+    from flaml.tune.trial_runner import SimpleTrial
+
+    def train_func(config):
+        for step in range(4):
+            tune.report(loss=config["x"] + step)
+
+    analysis = tune.run(
+        train_func,
+        config={"x": tune.uniform(1, 2)},
+        metric="loss",
+        mode="min",
+        num_samples=3,
+    )
+    best = min(analysis.trials, key=lambda trial: trial.config["x"])
+    assert analysis.get_best_trial() is best
+    assert [trial.num_results for trial in analysis.trials] == [4] * 3
+    # a new result of an existing trial refreshes its row only
+    worst = max(analysis.trials, key=lambda trial: trial.config["x"])
+    worst.update_last_result({"loss": -1, "training_iteration": 5})
+    assert analysis.get_best_trial() is worst
+    assert analysis._column("loss", "last")[analysis.trials.index(worst)] == -1
+    # the row of a new trial is appended
+    trial = SimpleTrial({"x": 0})
+    trial.update_last_result({"loss": -2, "training_iteration": 1})
+    analysis.trials.append(trial)
+    assert analysis.get_best_trial() is trial
+    assert len(analysis._column("loss", "last")) == 4
+    assert np.isnan(analysis._column("acc", "max")).all()
+
+
 def test_xgboost_bs():
     _test_xgboost()
 